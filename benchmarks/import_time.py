@@ -0,0 +1,91 @@
+"""
+Import-time benchmark of the machathon_judge package
+
+Runs `python -X importtime` in a fresh interpreter and fails (exit code 1) if importing
+the judge takes longer than the budget or loads one of the heavy dependencies
+that should only be imported when they're used.
+
+Usage:
+    python benchmarks/import_time.py [--budget-ms 60] [--repeat 5]
+"""
+import os
+import sys
+import argparse
+import subprocess
+from typing import List, Tuple
+
+HEAVY_MODULES = ["numpy", "zmq", "cbor", "requests", "websockets", "asyncio"]
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_import(module: str) -> Tuple[float, List[str]]:
+    """
+    Imports a module in a fresh interpreter
+
+    Parameters
+    ----------
+    module : str
+        Name of the module to import
+
+    Returns
+    -------
+    float
+        Cumulative import time of the module in milliseconds
+    list
+        The heavy modules that were loaded by the import
+    """
+    code = (
+        f"import sys, {module}\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=REPO_ROOT,
+    )
+
+    cumulative_us = None
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        if name.strip() == module:
+            cumulative_us = int(cumulative)
+    if cumulative_us is None:
+        raise RuntimeError(f"{module} wasn't found in the -X importtime output")
+
+    loaded = [name for name in result.stdout.strip().split(",") if name]
+    return cumulative_us / 1000, loaded
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--budget-ms", type=float, default=60)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    failed = False
+    for module in ("machathon_judge", "machathon_judge.judge"):
+        # The best of a few runs filters out the noise of the machine
+        timings, loaded = [], []
+        for _ in range(args.repeat):
+            elapsed, loaded = measure_import(module)
+            timings.append(elapsed)
+        best = min(timings)
+
+        status = "ok"
+        if best > args.budget_ms:
+            status = f"FAIL: over the {args.budget_ms:.0f} ms budget"
+            failed = True
+        if loaded:
+            status = f"FAIL: loads {', '.join(loaded)}"
+            failed = True
+        print(f"import {module}: {best:.1f} ms ({status})")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+Benchmark of the single-pass ImagePipeline against the usual chain of OpenCV calls
+
+Both produce the same BGR, cropped and resized image from a raw camera frame.
+
+Usage:
+    python benchmarks/preprocessing.py [--n-frames 500]
+"""
+import os
+import sys
+import argparse
+import statistics
+from typing import Dict
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from machathon_judge.preprocessing import ImagePipeline
+
+RESOLUTION = (640, 480)
+# Keep the lower half of the image, where the track is, at a quarter of the resolution
+CROP = (240, 480, 0, 640)
+RESIZE = (160, 60)
+
+
+def naive_chain(raw: np.ndarray) -> np.ndarray:
+    """
+    Un-flip, RGB to BGR, crop and resize, each step being a full pass over the image
+    like in test.py
+    """
+    import cv2  # pylint: disable=import-outside-toplevel,import-error
+
+    image = raw.reshape((RESOLUTION[1], RESOLUTION[0], 3))
+    image = np.flip(image, 1)
+    image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    top, bottom, left, right = CROP
+    image = image[top:bottom, left:right]
+    return cv2.resize(image, RESIZE, interpolation=cv2.INTER_NEAREST)
+
+
+def bench_preprocessing(n_frames: int, naive: bool = True) -> Dict[str, float]:
+    """
+    Median time to preprocess a frame with the pipeline and with the naive chain
+
+    Parameters
+    ----------
+    n_frames : int
+        Number of frames to time
+    naive : bool, default=True
+        Whether to also time the naive chain, which needs OpenCV
+
+    Returns
+    -------
+    dict
+        Milliseconds per frame of each implementation
+    """
+    # Imported here so that the script can be run from anywhere
+    from run_benchmarks import per_call_ms  # pylint: disable=import-outside-toplevel
+
+    raw = np.frombuffer(os.urandom(RESOLUTION[0] * RESOLUTION[1] * 3), dtype=np.uint8)
+    pipeline = ImagePipeline("bgr", crop=CROP, resize=RESIZE)
+    results = {
+        "preprocess_pipeline_ms": statistics.median(
+            per_call_ms(lambda: pipeline(raw, RESOLUTION), n_frames)
+        )
+    }
+    if naive:
+        results["preprocess_naive_ms"] = statistics.median(
+            per_call_ms(lambda: naive_chain(raw), n_frames)
+        )
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--n-frames", type=int, default=500, help="Number of frames to time")
+    args = parser.parse_args()
+
+    results = bench_preprocessing(args.n_frames)
+    for name, value in results.items():
+        print(f"{name:<24} {value:>12.3f}")
+    speedup = results["preprocess_naive_ms"] / results["preprocess_pipeline_ms"]
+    print(f"The pipeline is {speedup:.1f}x faster than the naive chain")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
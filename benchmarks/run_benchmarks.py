@@ -0,0 +1,402 @@
+"""
+Benchmarks of the client and judge hot paths against a local stand-in for CoppeliaSim
+
+Measures the Remote API round-trip, the image fetch and decode throughput, the actuator
+call rate, the latency from a checkpoint event to the judge, the judge start-up time,
+the image preprocessing time, the time to publish a score, the speed of the kinematic backend
+and the package import time. The results are compared to the stored baselines and the
+script fails (exit code 1) if any of them regressed by more than the threshold.
+
+CoppeliaSim must be closed, the stand-in listens on the same ports.
+
+Usage:
+    python benchmarks/run_benchmarks.py            # compare to the baselines
+    python benchmarks/run_benchmarks.py --update   # store the results as the new baselines
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import statistics
+import tracemalloc
+from typing import Callable, Dict, List
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+
+# pylint: disable=wrong-import-position
+from machathon_judge.simulator import Simulator
+from machathon_judge.collision_manager import (
+    CollisionManager,
+    ConnectionClosedException,
+    ConnectionFailedException,
+)
+from machathon_judge.judge import Judge
+from machathon_judge.publisher import ScorePublisher
+from machathon_judge.kinematic import KinematicFleet
+from stand_in import StandInLeaderboard, StandInSimulator
+from import_time import measure_import
+from preprocessing import bench_preprocessing
+
+BASELINES_PATH = os.path.join(BENCHMARKS_DIR, "baselines.json")
+
+
+def per_call_ms(function: Callable, n_calls: int) -> List[float]:
+    """
+    Times every call of a function
+
+    Parameters
+    ----------
+    function : Callable
+        Function to call without arguments
+    n_calls : int
+        Number of calls
+
+    Returns
+    -------
+    list
+        Duration of each call in milliseconds
+    """
+    timings = []
+    for _ in range(n_calls):
+        tic = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - tic) * 1000)
+    return timings
+
+
+def calls_per_second(function: Callable, duration: float) -> float:
+    """
+    Calls a function in a loop for a fixed duration
+
+    Parameters
+    ----------
+    function : Callable
+        Function to call without arguments
+    duration : float
+        Number of seconds to run the loop
+
+    Returns
+    -------
+    float
+        The number of calls per second
+    """
+    n_calls = 0
+    tic = time.perf_counter()
+    while time.perf_counter() - tic < duration:
+        function()
+        n_calls += 1
+    return n_calls / (time.perf_counter() - tic)
+
+
+def image_allocations_kb(simulator: Simulator, n_frames: int) -> float:
+    """
+    Memory allocated by Python on the client side to hold a fetched image
+
+    The stand-in runs in the same process, so only the allocations made
+    from the package's code are counted.
+
+    Parameters
+    ----------
+    simulator : Simulator
+        The simulator connected to the stand-in
+    n_frames : int
+        Number of frames to average on
+
+    Returns
+    -------
+    float
+        Kilobytes allocated per frame
+    """
+    client_code = [tracemalloc.Filter(True, "*machathon_judge*", all_frames=True)]
+    total_size = 0
+    tracemalloc.start(50)
+    for _ in range(n_frames):
+        tracemalloc.clear_traces()
+        image = simulator.get_image()  # pylint: disable=unused-variable
+        snapshot = tracemalloc.take_snapshot().filter_traces(client_code)
+        total_size += sum(stat.size for stat in snapshot.statistics("filename"))
+    tracemalloc.stop()
+    return total_size / n_frames / 1024
+
+
+def bench_client(simulator: Simulator, duration: float) -> Dict[str, float]:
+    """
+    Remote API round-trip, image fetch/decode throughput and allocations and actuator call rate
+    """
+    results = {}
+    client = simulator.client
+
+    # A single p99 depends on a handful of calls, the median of several is steadier
+    repetitions = [
+        per_call_ms(lambda: client.call("sim.getSimulationState", []), 1000) for _ in range(5)
+    ]
+    results["rpc_round_trip_ms"] = statistics.median(
+        timing for timings in repetitions for timing in timings
+    )
+    results["rpc_round_trip_p99_ms"] = statistics.median(
+        statistics.quantiles(timings, n=100)[98] for timings in repetitions
+    )
+
+    results["get_state_ms"] = statistics.median(per_call_ms(simulator.get_state, 500))
+    results["get_image_fps"] = calls_per_second(simulator.get_image, duration)
+
+    results["get_image_alloc_kb"] = image_allocations_kb(simulator, 30)
+
+    # Alternate the commands, the simulator skips the calls that don't change them
+    commands = iter(range(1 << 62))
+    results["actuator_calls_per_s"] = calls_per_second(
+        lambda: simulator.set_car_velocity(next(commands) % 2), duration
+    )
+    return results
+
+
+def bench_checkpoint_latency(stand_in: StandInSimulator, n_events: int) -> Dict[str, float]:
+    """
+    Time between a checkpoint sending its collision event and the judge seeing it
+    """
+    n_connected = stand_in.n_connected(0)
+    collision_manager = CollisionManager()
+    latencies = []
+    for _ in range(n_events):
+        # Wait for the new connection opened after the previous event,
+        # the previous one doesn't listen anymore
+        while stand_in.n_connected(0) == n_connected:
+            time.sleep(0.001)
+        n_connected = stand_in.n_connected(0)
+        tic = time.perf_counter()
+        stand_in.trigger_checkpoint(0)
+        while not collision_manager.is_collision(0):
+            if time.perf_counter() - tic > 1:
+                raise TimeoutError("The collision event never reached the collision manager")
+        latencies.append((time.perf_counter() - tic) * 1000)
+    collision_manager.close()
+    return {"checkpoint_latency_ms": statistics.median(latencies)}
+
+
+class StartupReached(Exception):
+    """
+    Raised by the benchmark hook to stop the judge at its first tick
+    """
+
+
+def bench_judge_startup(n_runs: int) -> Dict[str, float]:
+    """
+    Time from Judge.run_unsafe to the first call of the competitor's code
+    """
+
+    def hook(_):
+        raise StartupReached()
+
+    timings = []
+    for _ in range(n_runs):
+        judge = Judge(team_code="000000000", zip_file_path="", results_db=None)
+        judge.set_run_hook(hook)
+        tic = time.perf_counter()
+        try:
+            judge.run_unsafe(send_score=False, verbose=False)
+        except StartupReached:
+            timings.append(time.perf_counter() - tic)
+        judge.clean_up()
+    return {"judge_startup_s": statistics.median(timings)}
+
+
+def bench_publish(zip_size_mb: int) -> Dict[str, float]:
+    """
+    Time to publish a score with a new solution and again with the same solution,
+    and the number of bytes sent the second time
+    """
+    with StandInLeaderboard() as leaderboard, tempfile.TemporaryDirectory() as tmp_dir:
+        zip_file_path = os.path.join(tmp_dir, "solution.zip")
+        with open(zip_file_path, "wb") as file:
+            file.write(os.urandom(zip_size_mb << 20))
+        publisher = ScorePublisher(
+            endpoint=leaderboard.url,
+            queue_dir=os.path.join(tmp_dir, "outbox"),
+            verbose=False,
+            uploaded_record=os.path.join(tmp_dir, "uploaded.json"),
+        )
+
+        results = {}
+        for name in ("publish_new_solution_s", "publish_same_solution_s"):
+            bytes_received = leaderboard.bytes_received
+            tic = time.perf_counter()
+            publisher.submit("000000000", zip_file_path, 60.0, 60.0)
+            publisher.flush()
+            results[name] = time.perf_counter() - tic
+        results["publish_same_solution_kb"] = (leaderboard.bytes_received - bytes_received) / 1024
+        publisher.close()
+    return results
+
+
+def bench_kinematic(n_cars: int, n_steps: int) -> Dict[str, float]:
+    """
+    Simulated seconds per second of a fleet of cars driven by vectorized commands,
+    and camera frames rendered per second
+    """
+    fleet = KinematicFleet(n_cars)
+    fleet.set_commands(velocity=5, steering=0.1)
+    tic = time.perf_counter()
+    for _ in range(n_steps):
+        fleet.step()
+    realtime_factor = fleet.time / (time.perf_counter() - tic)
+
+    tic = time.perf_counter()
+    for _ in range(n_steps // 100):
+        fleet.render()
+    frames_per_s = n_cars * (n_steps // 100) / (time.perf_counter() - tic)
+    return {"kinematic_realtime_factor": realtime_factor, "kinematic_frames_per_s": frames_per_s}
+
+
+# Whether a higher value of each metric is better
+HIGHER_IS_BETTER = {
+    "rpc_round_trip_ms": False,
+    "rpc_round_trip_p99_ms": False,
+    "get_state_ms": False,
+    "get_image_fps": True,
+    "get_image_alloc_kb": False,
+    "actuator_calls_per_s": True,
+    "checkpoint_latency_ms": False,
+    "judge_startup_s": False,
+    "preprocess_pipeline_ms": False,
+    "publish_new_solution_s": False,
+    "publish_same_solution_s": False,
+    "publish_same_solution_kb": False,
+    "import_judge_ms": False,
+    "kinematic_realtime_factor": True,
+    "kinematic_frames_per_s": True,
+}
+
+# Changes smaller than these are within the noise of the machine and never count as regressions
+NOISE_FLOOR = {
+    "rpc_round_trip_p99_ms": 0.1,
+    "checkpoint_latency_ms": 0.5,
+    "judge_startup_s": 0.01,
+    "preprocess_pipeline_ms": 0.05,
+    "publish_new_solution_s": 0.05,
+    "publish_same_solution_s": 0.05,
+    "publish_same_solution_kb": 1,
+    "import_judge_ms": 5,
+    "get_image_alloc_kb": 4,
+}
+
+
+def run_benchmarks(duration: float) -> Dict[str, float]:
+    """
+    Runs all the benchmarks against a fresh stand-in
+
+    Parameters
+    ----------
+    duration : float
+        Number of seconds of each throughput benchmark
+
+    Returns
+    -------
+    dict
+        The value of each metric
+    """
+    results = {}
+    with StandInSimulator() as stand_in:
+        simulator = Simulator()
+        simulator.start()
+        results.update(bench_client(simulator, duration))
+        results.update(bench_checkpoint_latency(stand_in, 20))
+        results.update(bench_judge_startup(5))
+    results.update(bench_preprocessing(500, naive=False))
+    results.update(bench_publish(16))
+    results.update(bench_kinematic(256, 1000))
+
+    results["import_judge_ms"] = min(
+        measure_import("machathon_judge.judge")[0] for _ in range(5)
+    )
+    return results
+
+
+def compare(
+    results: Dict[str, float], baselines: Dict[str, float], threshold: float
+) -> List[str]:
+    """
+    Finds the metrics that regressed compared to the baselines
+
+    Parameters
+    ----------
+    results : dict
+        The value of each metric
+    baselines : dict
+        The baseline value of each metric
+    threshold : float
+        Relative change tolerated before a metric counts as a regression, e.g. 0.2 for 20%
+
+    Returns
+    -------
+    list
+        Names of the regressed metrics
+    """
+    regressions = []
+    for name, value in results.items():
+        baseline = baselines.get(name)
+        if not baseline or abs(value - baseline) < NOISE_FLOOR.get(name, 0):
+            continue
+        change = (value - baseline) / baseline
+        if not HIGHER_IS_BETTER[name]:
+            change = -change
+        if change < -threshold:
+            regressions.append(name)
+    return regressions
+
+
+def ignore_stand_in_shutdown(args: threading.ExceptHookArgs) -> None:
+    """
+    Thread exception hook hiding the errors of the collision managers' listening threads,
+    which can't be stopped and fail once the stand-in is gone. The other errors are reported.
+    """
+    from websockets.exceptions import ConnectionClosed  # pylint: disable=import-outside-toplevel
+
+    expected = (ConnectionClosed, ConnectionClosedException, ConnectionFailedException)
+    if issubclass(args.exc_type, expected):
+        return
+    threading.__excepthook__(args)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--update", action="store_true", help="Store the results as the baselines")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Tolerated relative regression")
+    parser.add_argument("--duration", type=float, default=2, help="Seconds per throughput benchmark")
+    parser.add_argument("--baselines", default=BASELINES_PATH, help="Path of the baselines file")
+    args = parser.parse_args()
+
+    threading.excepthook = ignore_stand_in_shutdown
+    try:
+        results = run_benchmarks(args.duration)
+    finally:
+        threading.excepthook = threading.__excepthook__
+
+    baselines = {}
+    if os.path.isfile(args.baselines):
+        with open(args.baselines, encoding="utf-8") as file:
+            baselines = json.load(file)
+    regressions = compare(results, baselines, args.threshold)
+
+    for name, value in results.items():
+        baseline = baselines.get(name)
+        line = f"{name:<24} {value:>12.3f}"
+        if baseline:
+            line += f"   baseline {baseline:>12.3f} ({(value - baseline) / baseline:+.0%})"
+        if name in regressions:
+            line += "   REGRESSION"
+        print(line)
+
+    if args.update or not baselines:
+        with open(args.baselines, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print(f"Baselines stored in {args.baselines}")
+        return 0
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
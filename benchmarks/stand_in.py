@@ -0,0 +1,477 @@
+"""
+Local stand-ins for CoppeliaSim and the leaderboard, used to benchmark the client
+and the judge without the simulator or the network
+
+The simulator's stand-in answers the ZMQ Remote API requests used by the Simulator class
+with canned values, publishes the simulation step count (and the car's state once the
+state publisher script is installed) and runs the checkpoints'
+websocket servers, whose collision events are triggered on demand.
+The leaderboard's stand-in accepts the submissions of the ScorePublisher.
+"""
+import os
+import time
+import struct
+import asyncio
+import hashlib
+import logging
+import threading
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl
+
+# pylint: disable=import-error
+import cbor
+import zmq
+
+
+class StandInSimulator:
+    """
+    Fake CoppeliaSim listening on the same ports as the real one
+
+    Parameters
+    ----------
+    port: int, default=23000
+        Port of the ZMQ Remote API, the step count is published on port + 1
+    ckpt_ports: list, default=(9000, 9001)
+        Ports of the checkpoints' websocket servers
+    camera_resolution: tuple, default=(640, 480)
+        Resolution of the images returned by getVisionSensorImg
+    step_interval: float, default=0.05
+        Seconds between two simulation steps, like CoppeliaSim's default time step
+    state_port: int, default=23010
+        Port the car's state is published on while a script is installed, see StateSubscriber
+    """
+
+    SIMULATION_STOPPED = 0
+    SIMULATION_ADVANCING = 0x10
+    SIMULATION_ADVANCING_RUNNING = 0x11
+
+    def __init__(
+        self,
+        port: int = 23000,
+        ckpt_ports: Sequence[int] = (9000, 9001),
+        camera_resolution: tuple = (640, 480),
+        step_interval: float = 0.05,
+        state_port: int = 23010,
+    ):
+        self.port = port
+        self.state_port = state_port
+        self.ckpt_ports = list(ckpt_ports)
+        self.step_interval = step_interval
+        self.image = os.urandom(camera_resolution[0] * camera_resolution[1] * 3)
+        self.camera_resolution = list(camera_resolution)
+
+        self.running = False
+        self.step_count = 0
+        self.n_calls = 0
+        self.handles: Dict[str, int] = {}
+        self.joint_positions: Dict[int, float] = {}
+        self.joint_velocities: Dict[int, float] = {}
+        self.position = [0.0, 0.0, 0.0]
+        self.orientation = [0.0, 0.0, 0.0]
+        self.scripts: List[int] = []
+
+        self.functions = {
+            "getObject": self.get_object,
+            "startSimulation": self.start_simulation,
+            "stopSimulation": self.stop_simulation,
+            "getSimulationState": self.get_simulation_state,
+            "getSimulationTime": lambda: self.step_count * self.step_interval,
+            "getSimulationStepCount": lambda: self.step_count,
+            "setJointTargetForce": lambda handle, force: None,
+            "setJointTargetVelocity": self.joint_velocities.__setitem__,
+            "setJointTargetPosition": self.joint_positions.__setitem__,
+            "getJointPosition": lambda handle: self.joint_positions.get(handle, 0.0),
+            "getObjectFloatParam": lambda handle, param: 0.0,
+            "getVisionSensorImg": lambda handle, *args: (self.image, self.camera_resolution),
+            "setObjectPosition": lambda handle, rel, position: setattr(self, "position", position),
+            "setObjectOrientation": lambda handle, rel, angles: setattr(
+                self, "orientation", angles
+            ),
+            "getObjectPosition": lambda handle, rel: self.position,
+            "getObjectOrientation": lambda handle, rel: self.orientation,
+            "resetDynamicObject": lambda handle: None,
+            "createScript": self.create_script,
+            "setObjectParent": lambda handle, parent, keep_in_place: None,
+            "removeObjects": self.remove_objects,
+        }
+        self.constants = {
+            "handle_world": -1,
+            "handleflag_model": 0x800000,
+            "jointfloatparam_velocity": 2012,
+            "scripttype_customization": 6,
+            "simulation_stopped": self.SIMULATION_STOPPED,
+            "simulation_advancing": self.SIMULATION_ADVANCING,
+            "simulation_advancing_running": self.SIMULATION_ADVANCING_RUNNING,
+        }
+
+        self.stopped = threading.Event()
+        self.context = None
+        self.threads: List[threading.Thread] = []
+        self.loop = None
+        self.ws_clients: Dict[int, set] = {port: set() for port in self.ckpt_ports}
+        self.n_connections: Dict[int, int] = {port: 0 for port in self.ckpt_ports}
+
+    # Remote API functions
+
+    def get_object(self, path: str, *_) -> int:
+        """
+        Returns a stable handle for every object path
+        """
+        return self.handles.setdefault(path, len(self.handles) + 1)
+
+    def start_simulation(self) -> int:
+        """
+        Starts the simulation
+        """
+        self.running = True
+        return 1
+
+    def stop_simulation(self) -> int:
+        """
+        Stops the simulation
+        """
+        self.running = False
+        return 1
+
+    def get_simulation_state(self) -> int:
+        """
+        Returns the simulation state constant
+        """
+        return self.SIMULATION_ADVANCING_RUNNING if self.running else self.SIMULATION_STOPPED
+
+    def create_script(self, script_type: int, code: str, *_) -> int:
+        """
+        Adds a script, the car's state is published while one is installed
+        """
+        handle = self.get_object(f"script{len(self.scripts)}:{script_type}:{hash(code)}")
+        self.scripts.append(handle)
+        return handle
+
+    def remove_objects(self, handles: List[int], *_) -> None:
+        """
+        Removes scripts
+        """
+        self.scripts = [handle for handle in self.scripts if handle not in handles]
+
+    def handle_request(self, request: Dict) -> Dict:
+        """
+        Answers a single Remote API request
+
+        Parameters
+        ----------
+        request : dict
+            The decoded request with "func" and "args"
+
+        Returns
+        -------
+        dict
+            The response to encode
+        """
+        func, args = request["func"], request.get("args", [])
+        self.n_calls += 1
+        if func == "zmqRemoteApi.info":
+            info = {name: {"func": {}} for name in self.functions}
+            info.update({name: {"const": value} for name, value in self.constants.items()})
+            return {"success": True, "ret": [info]}
+        if func in ("setStepping", "step"):
+            return {"success": True, "ret": [0]}
+
+        function = self.functions.get(func.split(".", 1)[-1])
+        if function is None:
+            return {"success": False, "error": f"Unknown function {func}"}
+        ret = function(*args)
+        # Functions with several return values return a tuple
+        return {"success": True, "ret": list(ret) if isinstance(ret, tuple) else [ret]}
+
+    # Servers
+
+    def serve_remote_api(self, context: "zmq.Context") -> None:
+        """
+        Loop answering the Remote API requests
+        """
+        socket = context.socket(zmq.REP)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.bind(f"tcp://127.0.0.1:{self.port}")
+        while not self.stopped.is_set():
+            if not socket.poll(50):
+                continue
+            request = cbor.loads(socket.recv())
+            socket.send(cbor.dumps(self.handle_request(request)))
+        socket.close()
+
+    def publish_steps(self, context: "zmq.Context") -> None:
+        """
+        Loop publishing the step count, and the car's state if a script is installed,
+        while the simulation is running
+        """
+        socket = context.socket(zmq.PUB)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.bind(f"tcp://127.0.0.1:{self.port + 1}")
+        state_socket = context.socket(zmq.PUB)
+        state_socket.setsockopt(zmq.LINGER, 0)
+        state_socket.bind(f"tcp://127.0.0.1:{self.state_port}")
+        while not self.stopped.wait(self.step_interval):
+            if self.running:
+                self.step_count += 1
+                socket.send(self.step_count.to_bytes(4, "little"))
+                if self.scripts:
+                    steering = self.joint_positions.get(self.handles.get("/Manta/steer_joint"), 0.0)
+                    state_socket.send(
+                        struct.pack(
+                            "<10d",
+                            self.step_count * self.step_interval,
+                            steering,
+                            0.0,
+                            0.0,
+                            *self.position,
+                            *self.orientation,
+                        )
+                    )
+        socket.close()
+        state_socket.close()
+
+    def serve_checkpoints(self) -> None:
+        """
+        Runs the websocket servers of the checkpoints
+        """
+        import websockets  # pylint: disable=import-outside-toplevel
+
+        # The readiness probes open raw TCP connections, don't log them as failed handshakes
+        logging.getLogger("websockets").setLevel(logging.CRITICAL)
+
+        async def serve():
+            servers = []
+            for port in self.ckpt_ports:
+
+                async def handler(websocket, *_, port=port):
+                    self.n_connections[port] += 1
+                    self.ws_clients[port].add(websocket)
+                    try:
+                        await websocket.wait_closed()
+                    finally:
+                        self.ws_clients[port].discard(websocket)
+
+                servers.append(await websockets.serve(handler, "localhost", port))
+            while not self.stopped.is_set():
+                await asyncio.sleep(0.05)
+            for server in servers:
+                server.close()
+                await server.wait_closed()
+
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(serve())
+        self.loop.close()
+
+    def trigger_checkpoint(self, ckpt_id: int) -> int:
+        """
+        Sends a collision event to the clients listening to a checkpoint
+
+        Parameters
+        ----------
+        ckpt_id : int
+            Index of the checkpoint in ckpt_ports
+
+        Returns
+        -------
+        int
+            The number of clients the event was sent to
+        """
+        clients = list(self.ws_clients[self.ckpt_ports[ckpt_id]])
+
+        async def broadcast():
+            n_sent = 0
+            for client in clients:
+                try:
+                    await client.send("collision")
+                    n_sent += 1
+                except Exception:  # pylint: disable=broad-except
+                    # The client disconnected in the meantime
+                    pass
+            return n_sent
+
+        return asyncio.run_coroutine_threadsafe(broadcast(), self.loop).result()
+
+    def n_listeners(self, ckpt_id: int) -> int:
+        """
+        Number of clients connected to a checkpoint
+        """
+        return len(self.ws_clients[self.ckpt_ports[ckpt_id]])
+
+    def n_connected(self, ckpt_id: int) -> int:
+        """
+        Number of connections a checkpoint has received since the start
+        """
+        return self.n_connections[self.ckpt_ports[ckpt_id]]
+
+    def start(self) -> None:
+        """
+        Starts all the servers in background threads
+        """
+        self.context = zmq.Context()
+        for target, args in (
+            (self.serve_remote_api, (self.context,)),
+            (self.publish_steps, (self.context,)),
+            (self.serve_checkpoints, ()),
+        ):
+            thread = threading.Thread(target=target, args=args, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        while self.loop is None or not self.loop.is_running():
+            time.sleep(0.01)
+
+    def stop(self) -> None:
+        """
+        Stops all the servers
+        """
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join()
+        self.context.term()
+
+    def __enter__(self) -> "StandInSimulator":
+        self.start()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.stop()
+
+
+class StandInLeaderboard:
+    """
+    Fake leaderboard storing the submissions and the uploaded solutions by their hash
+
+    Submissions with a zip store it and acknowledge its SHA-256 in the X-Solution-Sha256
+    header, submissions with only the hash are accepted if the solution is known
+    and answered 412 otherwise.
+
+    Parameters
+    ----------
+    port: int, default=23200
+        Port the HTTP server listens on
+    acknowledge_hashes: bool, default=True
+        Whether to acknowledge the stored solutions, False behaves like a server
+        that doesn't deduplicate them
+    """
+
+    def __init__(self, port: int = 23200, acknowledge_hashes: bool = True):
+        self.port = port
+        self.acknowledge_hashes = acknowledge_hashes
+        self.solutions: Dict[str, bytes] = {}
+        self.submissions: List[Dict[str, str]] = []
+        self.bytes_received = 0
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        """
+        The endpoint to give to the ScorePublisher
+        """
+        return f"http://localhost:{self.port}/saveData.php"
+
+    @staticmethod
+    def parse_form(content_type: str, body: bytes) -> Tuple[Dict[str, str], Optional[bytes]]:
+        """
+        Decodes a multipart or url-encoded form
+
+        Returns
+        -------
+        fields : dict
+            The text fields
+        file : bytes or None
+            Content of the uploaded file, if any
+        """
+        if not content_type.startswith("multipart/form-data"):
+            return dict(parse_qsl(body.decode("utf-8"))), None
+
+        message = BytesParser().parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body
+        )
+        fields, file = {}, None
+        for part in message.get_payload():
+            payload = part.get_payload(decode=True)
+            if part.get_filename() is not None:
+                file = payload
+            else:
+                fields[part.get_param("name", header="content-disposition")] = payload.decode(
+                    "utf-8"
+                )
+        return fields, file
+
+    def handle_submission(self, fields: Dict[str, str], file: Optional[bytes]) -> Tuple[int, Dict]:
+        """
+        Answers a submission
+
+        Returns
+        -------
+        status : int
+            The HTTP status code
+        headers : dict
+            The additional response headers
+        """
+        solution_hash = fields.get("solution_sha256")
+        headers = {}
+        if file is not None:
+            digest = hashlib.sha256(file).hexdigest()
+            if solution_hash is not None and solution_hash != digest:
+                return 400, headers
+            self.solutions[digest] = file
+            if self.acknowledge_hashes:
+                headers["X-Solution-Sha256"] = digest
+        elif solution_hash not in self.solutions or not self.acknowledge_hashes:
+            return 412, headers
+        self.submissions.append(fields)
+        return 200, headers
+
+    def start(self) -> None:
+        """
+        Starts the HTTP server in a background thread
+        """
+        leaderboard = self
+
+        class SubmissionHandler(BaseHTTPRequestHandler):
+            """
+            Handles the POST requests of the publisher
+            """
+
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):  # pylint: disable=invalid-name
+                """
+                Handles a submission
+                """
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                leaderboard.bytes_received += len(body)
+                status, headers = leaderboard.handle_submission(
+                    *leaderboard.parse_form(self.headers.get("Content-Type", ""), body)
+                )
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):  # pylint: disable=arguments-differ
+                pass
+
+        self.server = ThreadingHTTPServer(("localhost", self.port), SubmissionHandler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops the HTTP server
+        """
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def __enter__(self) -> "StandInLeaderboard":
+        self.start()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.stop()
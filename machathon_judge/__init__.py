@@ -1,2 +1,28 @@
-from .judge import Judge
-from .simulator import Simulator
+"""
+The machathon judge package
+
+Judge and Simulator are imported on first access, so importing the package stays cheap
+and the heavy dependencies (numpy, zmq, requests, websockets, ...) are only loaded
+by the parts of the package that use them.
+"""
+import importlib
+
+__all__ = ["Judge", "Simulator"]
+
+_LAZY_ATTRIBUTES = {
+    "Judge": ".judge",
+    "Simulator": ".simulator",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module(_LAZY_ATTRIBUTES[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -3,12 +3,20 @@ Module containing the CollisionManager class to manage the collision events from
 multiple checkpoints in CoppeliaSim
 """
 import time
-import asyncio
+import socket
+import functools
 import threading
-from typing import Callable
+from typing import TYPE_CHECKING, Callable, Sequence
 
-# pylint: disable=import-error
-import websockets
+from .data import Data
+from .utils import wait_until
+
+if TYPE_CHECKING:
+    import asyncio
+
+# asyncio and websockets are imported once a CollisionManager is created,
+# so that importing the judge stays cheap
+# pylint: disable=import-outside-toplevel
 
 
 class ConnectionFailedException(Exception):
@@ -56,6 +64,8 @@ class WebSocketManager:
         Exception
             Connection to CoppeliaSim closed
         """
+        import websockets  # pylint: disable=import-error
+
         try:
             async with websockets.connect(self.address) as websocket:
                 await websocket.recv()
@@ -68,7 +78,7 @@ class WebSocketManager:
             raise ConnectionClosedException("Connection to CoppeliaSim closed") from exp
 
     def run_async_in_thread(
-        self, loop: asyncio.AbstractEventLoop, callback: Callable
+        self, loop: "asyncio.AbstractEventLoop", callback: Callable
     ) -> None:
         """
         Runs the await_collision function in a new thread
@@ -80,6 +90,8 @@ class WebSocketManager:
         callback : Callable
             A function to be called when a collision event is received
         """
+        import asyncio
+
         asyncio.set_event_loop(loop)
         loop.run_until_complete(self.await_collision(callback))
 
@@ -93,6 +105,8 @@ class WebSocketManager:
         callback : Callable
             A function to be called when a collision event is received
         """
+        import asyncio
+
         new_loop = asyncio.new_event_loop()
         self.thread = threading.Thread(
             target=self.run_async_in_thread, args=(new_loop, callback)
@@ -110,15 +124,78 @@ class WebSocketManager:
 class CollisionManager:
     """
     Class used to manage the collision events from multiple checkpoints in CoppeliaSim
+
+    Parameters
+    ----------
+    ports: sequence of int, default=CollisionManager.PORTS
+        Ports of the checkpoints' websocket servers, the id of a checkpoint being its index
     """
 
-    def __init__(self):
-        self.ckpt_managers = [WebSocketManager(port=9000), WebSocketManager(port=9001)]
+    PORTS = tuple(Data.CHECKPOINT_PORTS)
 
-        self.ckpts_collided = [False, False]
+    def __init__(self, ports: Sequence[int] = PORTS):
+        self.ports = list(ports)
+        self.ckpt_managers = [WebSocketManager(port=port) for port in self.ports]
 
-        self.ckpt_managers[0].set_callback(lambda: self.ckpt_callback(0))
-        self.ckpt_managers[1].set_callback(lambda: self.ckpt_callback(1))
+        self.ckpts_collided = [False] * len(self.ports)
+        # Tracer recording the arrival of the collision events, see Tracer
+        self.tracer = None
+
+        for ckpt_id, manager in enumerate(self.ckpt_managers):
+            manager.set_callback(functools.partial(self.ckpt_callback, ckpt_id))
+
+    @staticmethod
+    def is_listening(host: str, port: int) -> bool:
+        """
+        Checks whether a checkpoint's websocket server accepts connections
+
+        Parameters
+        ----------
+        host : str
+            Host address of the websocket server
+        port : int
+            Port number of the websocket server
+
+        Returns
+        -------
+        bool
+            True if a TCP connection could be opened
+        """
+        try:
+            with socket.create_connection((host, port), timeout=0.1):
+                return True
+        except OSError:
+            return False
+
+    @classmethod
+    def wait_until_ready(
+        cls,
+        host: str = "localhost",
+        ports: Sequence[int] = PORTS,
+        timeout: float = Data.READY_TIMEOUT,
+    ) -> float:
+        """
+        Waits until the websocket servers of all the checkpoints accept connections
+
+        Parameters
+        ----------
+        host : str, default="localhost"
+            Host address of the websocket servers
+        ports : list, default=CollisionManager.PORTS
+            Port numbers of the checkpoints' websocket servers
+        timeout : float, default=Data.READY_TIMEOUT
+            Maximum number of seconds to wait
+
+        Returns
+        -------
+        float
+            The number of seconds it took for the checkpoints to be ready
+        """
+        return wait_until(
+            lambda: all(cls.is_listening(host, port) for port in ports),
+            timeout,
+            "the checkpoints' websockets to start",
+        )
 
     def ckpt_callback(self, ckpt_id: int) -> None:
         """
@@ -130,7 +207,9 @@ class CollisionManager:
             The id of the checkpoint that received the collision event
         """
         self.ckpts_collided[ckpt_id] = True
-        self.ckpt_managers[ckpt_id] = WebSocketManager(port=9000 + ckpt_id)
+        if self.tracer is not None:
+            self.tracer.instant(f"checkpoint {ckpt_id} event", "collision")
+        self.ckpt_managers[ckpt_id] = WebSocketManager(port=self.ports[ckpt_id])
 
         # Sleep to ensure the judge has time to read the collision event
         time.sleep(0.1)
@@ -139,6 +218,12 @@ class CollisionManager:
         self.ckpts_collided[ckpt_id] = False
         self.ckpt_managers[ckpt_id].set_callback(lambda: self.ckpt_callback(ckpt_id))
 
+    def clear(self) -> None:
+        """
+        Forgets the collision events that have been received so far
+        """
+        self.ckpts_collided = [False] * len(self.ckpts_collided)
+
     def is_collision(self, ckpt_id: int) -> bool:
         """
         Checks if a collision event has been received from any checkpoint
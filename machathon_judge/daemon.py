@@ -0,0 +1,648 @@
+"""
+Module containing the JudgeDaemon class, a long-lived judge that keeps the connection
+to CoppeliaSim and the checkpoints' websockets open between evaluations
+
+Start the daemon once:
+
+    python -m machathon_judge.daemon serve
+
+Then evaluate solutions against it, each evaluation skips the simulator set-up:
+
+    python -m machathon_judge.daemon run my_solution.py:run_car --team 123456789 --zip my_solution.zip
+
+The daemon runs the code it is sent, so it only listens on the loopback interface unless told
+otherwise, and every request must carry the token it writes to Data.DAEMON_TOKEN_PATH.
+"""
+import os
+import sys
+import hmac
+import json
+import time
+import uuid
+import socket
+import secrets
+import ipaddress
+import argparse
+import threading
+import socketserver
+import importlib.util
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+from .data import Data
+from .judge import Judge
+from .simulator import Simulator
+from .collision_manager import CollisionManager
+from .stall_detector import RunAbortedError, StallDetector
+from .tracing import Tracer
+from .publisher import ScorePublisher
+
+
+def is_loopback(host: str) -> bool:
+    """
+    Whether an address only accepts connections from the local machine
+
+    Parameters
+    ----------
+    host : str
+        Host name or IP address
+
+    Returns
+    -------
+    bool
+        True if every address the host resolves to is a loopback address
+    """
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None)}
+    except socket.gaierror:
+        return False
+    # An empty host listens on every interface
+    return bool(host) and all(
+        ipaddress.ip_address(address.split("%")[0]).is_loopback for address in addresses
+    )
+
+
+def token_path(port: int) -> str:
+    """
+    Path of the file where the daemon listening on a port writes its token
+    """
+    return Data.DAEMON_TOKEN_PATH.format(port=port)
+
+
+def load_hook(hook_spec: str) -> Callable:
+    """
+    Loads the competitor's function from a Python file
+
+    Parameters
+    ----------
+    hook_spec : str
+        "path/to/module.py:function_name", the function defaults to "run_car"
+
+    Returns
+    -------
+    Callable
+        The hook function
+    """
+    module_path, _, function_name = hook_spec.partition(":")
+    module_name = f"machathon_hook_{uuid.uuid4().hex}"
+    spec = importlib.util.spec_from_file_location(module_name, module_path)
+    if spec is None:
+        raise ImportError(f"Couldn't load the hook module {module_path}")
+    module = importlib.util.module_from_spec(spec)
+
+    # Let the hook import the modules sitting next to it
+    sys.path.insert(0, os.path.dirname(os.path.abspath(module_path)))
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.pop(0)
+    return getattr(module, function_name or "run_car")
+
+
+class StreamingJudge(Judge):
+    """
+    Judge that reports every lap as soon as it is completed
+
+    Parameters
+    ----------
+    send_event: Callable
+        Function called with a dict for every event of the evaluation
+    *args, **kwargs
+        The parameters of the Judge
+    """
+
+    def __init__(self, send_event: Callable[[Dict], None], *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.send_event = send_event
+        self.n_laps = 0
+
+    def lap_completed(self, lap: Dict) -> None:
+        self.n_laps += 1
+        self.send_event(
+            {
+                "event": "lap",
+                "lap": self.n_laps,
+                "lap_time": lap["lap_time"],
+                "sectors": lap["sectors"],
+                "profile": lap.get("profile"),
+            }
+        )
+
+
+class JudgeDaemon:
+    """
+    Class to evaluate solutions one after the other on a simulation that is kept running
+
+    The simulator, its remote API connection, the collision manager and the score publisher
+    are created once.
+    Between evaluations the car is only stopped and placed back at the start of the track.
+
+    Parameters
+    ----------
+    host: str, default="localhost"
+        Address the daemon listens on
+    port: int, default=Data.DAEMON_PORT
+        Port the daemon listens on
+    results_db: str, optional
+        Path to the results database, default is Data.RESULTS_DB_PATH
+    stall_detector: StallDetector, optional
+        Ends the evaluations whose car is stuck early instead of waiting for the timeout
+    frame_ring: str, optional
+        Name of a shared-memory ring to publish the camera frames into, see FrameRing
+    result_cache: str, optional
+        Path to a ResultCache database, the evaluations found in it aren't run again
+    scene: str, optional
+        Path to the scene loaded in CoppeliaSim, or any name identifying it, see Judge.
+        Required with result_cache.
+    step_sync: bool, default=False
+        Whether the hooks are only called once per simulation step, see Judge
+    state_subscription: bool, default=False
+        Whether the car's state is pushed by the scene instead of pulled,
+        see Simulator.subscribe_state
+    low_jitter: bool, default=False
+        Whether the laps are run in low-jitter mode, see LowJitter
+    cpus: list, optional
+        In low-jitter mode, CPUs the daemon and the hooks are pinned to during the laps
+    trace_dir: str, optional
+        Directory where a Chrome trace of every evaluation is written, see Tracer
+    allocation_sampling: int, optional
+        Trace the allocations of one call of the hooks out of this many, see HookProfiler
+    checkpoint_ports: list, default=Data.CHECKPOINT_PORTS
+        Ports of the checkpoints' websocket servers, in the order of the forward track
+    allow_remote: bool, default=False
+        Whether host may be reachable from other machines. The daemon runs the code it is
+        sent, so it is refused by default. Remote clients need the daemon's token.
+    """
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = Data.DAEMON_PORT,
+        results_db: Optional[str] = Data.RESULTS_DB_PATH,
+        stall_detector: Optional[StallDetector] = None,
+        frame_ring: Optional[str] = None,
+        result_cache: Optional[str] = None,
+        scene: Optional[str] = None,
+        step_sync: bool = False,
+        state_subscription: bool = False,
+        low_jitter: bool = False,
+        cpus: Optional[List[int]] = None,
+        trace_dir: Optional[str] = None,
+        allocation_sampling: Optional[int] = None,
+        checkpoint_ports: Sequence[int] = tuple(Data.CHECKPOINT_PORTS),
+        allow_remote: bool = False,
+    ):
+        if not allow_remote and not is_loopback(host):
+            raise ValueError(
+                f"The daemon runs the code it is sent, listening on {host} needs allow_remote"
+            )
+        self.host = host
+        self.port = port
+        self.results_db = results_db
+        self.stall_detector = stall_detector
+        self.frame_ring = frame_ring
+        self.result_cache = result_cache
+        # Checked now rather than failing every evaluation
+        if result_cache is not None:
+            if scene is None:
+                raise ValueError("The result cache needs the scene loaded in CoppeliaSim")
+            Judge.scene_key(scene)
+        self.scene = scene
+        self.step_sync = step_sync
+        self.state_subscription = state_subscription
+        self.low_jitter = low_jitter
+        self.cpus = cpus
+        self.trace_dir = trace_dir
+        self.allocation_sampling = allocation_sampling
+        self.checkpoint_ports = list(checkpoint_ports)
+        self.simulator = None
+        self.collision_manager = None
+        # Started by the first evaluation publishing its score
+        self.publisher = None
+        # A single simulation can only run one evaluation at a time
+        self.lock = threading.Lock()
+        self.server = None
+        # Secret every request must carry, see serve_forever
+        self.token = None
+
+    def warm_up(self) -> float:
+        """
+        Connects to CoppeliaSim, restarts the simulation and waits for the checkpoints
+
+        Returns
+        -------
+        float
+            The number of seconds the set-up took
+        """
+        tic = time.monotonic()
+        self.simulator = Simulator(len(self.checkpoint_ports))
+        self.simulator.stop()
+        self.simulator.wait_until_stopped()
+        self.simulator.start()
+        self.simulator.wait_until_running()
+        CollisionManager.wait_until_ready(ports=self.checkpoint_ports)
+        self.collision_manager = CollisionManager(self.checkpoint_ports)
+        if self.frame_ring is not None:
+            self.simulator.publish_frames(self.frame_ring)
+        if self.state_subscription:
+            self.simulator.subscribe_state()
+        return time.monotonic() - tic
+
+    def cool_down(self) -> None:
+        """
+        Closes the collision manager and the score publisher and stops the simulation
+        """
+        if self.publisher is not None:
+            # The undelivered scores stay in the queue for the next publisher
+            self.publisher.close()
+            self.publisher = None
+        if self.collision_manager is not None:
+            self.collision_manager.close()
+            self.collision_manager = None
+        if self.simulator is not None:
+            self.simulator.close_frames()
+            try:
+                self.simulator.unsubscribe_state()
+                self.simulator.stop()
+            except Exception:  # pylint: disable=broad-except
+                pass
+            self.simulator = None
+
+    def evaluate(self, request: Dict, send_event: Callable[[Dict], None]) -> None:
+        """
+        Runs a single evaluation and reports its events
+
+        Parameters
+        ----------
+        request : dict
+            "hook" ("path/to/module.py:function"), "team_code", "zip_file_path"
+            and optionally "send_score" (default False), "seed" (default random),
+            "force" to ignore the result cache (default False) and "laps" to run
+            in each direction (default 1)
+        send_event : Callable
+            Function called with a dict for every event of the evaluation
+        """
+        with self.lock:
+            if self.simulator is None:
+                send_event({"event": "warm_up", "seconds": self.warm_up()})
+
+            tracer = Tracer() if self.trace_dir is not None else None
+            try:
+                hook = load_hook(request["hook"])
+                if request.get("send_score", False) and self.publisher is None:
+                    self.publisher = ScorePublisher(verbose=False)
+                judge = StreamingJudge(
+                    send_event,
+                    team_code=request.get("team_code", ""),
+                    zip_file_path=request.get("zip_file_path", ""),
+                    results_db=self.results_db,
+                    simulator=self.simulator,
+                    collision_manager=self.collision_manager,
+                    stall_detector=self.stall_detector,
+                    seed=request.get("seed"),
+                    result_cache=self.result_cache,
+                    scene=self.scene,
+                    step_sync=self.step_sync,
+                    tracer=tracer,
+                    allocation_sampling=self.allocation_sampling,
+                    publisher=self.publisher,
+                )
+                judge.set_run_hook(hook)
+                send_event({"event": "started"})
+                forward_laptime, backward_laptime = judge.run_unsafe(
+                    send_score=request.get("send_score", False),
+                    verbose=False,
+                    force=request.get("force", False),
+                    low_jitter=self.low_jitter,
+                    cpus=self.cpus,
+                    laps=request.get("laps", 1),
+                )
+                send_event(
+                    {
+                        "event": "result",
+                        "forward_laptime": forward_laptime,
+                        "backward_laptime": backward_laptime,
+                        "cached": judge.from_cache,
+                        "duplicates_avoided": judge.step_stats["duplicates_avoided"],
+                        "jitter": judge.jitter_stats,
+                        "hook_profile": judge.hook_profiles,
+                        "splits": judge.split_stats,
+                        "trace": self.save_trace(tracer),
+                    }
+                )
+            except RunAbortedError as exp:
+                # The simulation itself is fine, the next evaluation only resets the car
+                send_event(
+                    {
+                        "event": "aborted",
+                        "status": exp.status,
+                        "message": str(exp),
+                        "trace": self.save_trace(tracer),
+                    }
+                )
+            except Exception as exp:  # pylint: disable=broad-except
+                send_event(
+                    {
+                        "event": "error",
+                        "message": f"{type(exp).__name__}: {exp}",
+                        "trace": self.save_trace(tracer),
+                    }
+                )
+                # The simulation may be in any state, start from scratch next time
+                self.cool_down()
+
+    def save_trace(self, tracer: Optional[Tracer]) -> Optional[str]:
+        """
+        Writes the trace of an evaluation to the trace directory
+
+        Parameters
+        ----------
+        tracer : Tracer, optional
+            The tracer of the evaluation, None if tracing is disabled
+
+        Returns
+        -------
+        str or None
+            Path of the trace file, None if tracing is disabled
+        """
+        if tracer is None:
+            return None
+        os.makedirs(self.trace_dir, exist_ok=True)
+        file_path = os.path.join(
+            self.trace_dir, time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:8] + ".json"
+        )
+        tracer.save(file_path)
+        return file_path
+
+    def serve_forever(self) -> None:
+        """
+        Warms up the simulator and serves the evaluation requests until interrupted
+        """
+        daemon = self
+
+        class RequestHandler(socketserver.StreamRequestHandler):
+            """
+            Reads one JSON request per connection and streams back JSON events
+            """
+
+            def handle(self):
+                line = self.rfile.readline()
+                if not line:
+                    return
+
+                def send_event(event: Dict) -> None:
+                    self.wfile.write(json.dumps(event).encode("utf-8") + b"\n")
+                    self.wfile.flush()
+
+                try:
+                    request = json.loads(line)
+                except ValueError as exp:
+                    send_event({"event": "error", "message": f"Invalid request: {exp}"})
+                    return
+                token = request.get("token") if isinstance(request, dict) else None
+                if not isinstance(token, str) or not hmac.compare_digest(token, daemon.token):
+                    send_event({"event": "error", "message": "Invalid or missing token"})
+                    return
+                daemon.evaluate(request, send_event)
+
+        print(f"Warming up the simulator took {self.warm_up():.2f}s")
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer((self.host, self.port), RequestHandler)
+        self.server.daemon_threads = True
+        self.token = self.write_token()
+        print(f"Judge daemon listening on {self.host}:{self.port}")
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            print("The daemon has received a keyboard interrupt. Shutting down safely....")
+        finally:
+            self.server.server_close()
+            try:
+                os.remove(token_path(self.port))
+            except OSError:
+                pass
+            self.cool_down()
+
+    def write_token(self) -> str:
+        """
+        Generates a new token and writes it to a file only readable by the current user
+
+        Returns
+        -------
+        str
+            The token
+        """
+        token = secrets.token_hex(16)
+        path = token_path(self.port)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Replaced rather than rewritten, the permissions of an existing file could be wider
+        temp_path = f"{path}.{os.getpid()}"
+        descriptor = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, "w") as file:
+            file.write(token)
+        os.replace(temp_path, path)
+        return token
+
+
+def submit(
+    hook: str,
+    team_code: str = "",
+    zip_file_path: str = "",
+    send_score: bool = False,
+    host: str = "localhost",
+    port: int = Data.DAEMON_PORT,
+    seed: Optional[int] = None,
+    force: bool = False,
+    laps: int = 1,
+    token: Optional[str] = None,
+) -> Iterator[Dict]:
+    """
+    Sends an evaluation request to a running daemon
+
+    Parameters
+    ----------
+    hook : str
+        "path/to/module.py:function_name" of the competitor's function
+    team_code : str
+        The 9-digit team code
+    zip_file_path : str
+        Path to the zip file containing the solution
+    send_score : bool, default=False
+        Whether the daemon publishes the score to the leaderboard
+    host : str, default="localhost"
+        Address of the daemon
+    port : int, default=Data.DAEMON_PORT
+        Port of the daemon
+    seed : int, optional
+        Seed choosing the starting direction of the track, random by default
+    force : bool, default=False
+        Whether to run the laps even if their results are in the daemon's result cache
+    laps : int, default=1
+        Number of consecutive laps run in each direction
+    token : str, optional
+        The daemon's token, read from the file it writes on this machine by default
+
+    Yields
+    ------
+    dict
+        The events of the evaluation, the last one being "result", "aborted" or "error"
+    """
+    if token is None:
+        try:
+            with open(token_path(port), encoding="utf-8") as file:
+                token = file.read().strip()
+        except OSError as exp:
+            raise RuntimeError(
+                f"The daemon's token wasn't found, is it running on port {port}?"
+            ) from exp
+
+    request = {
+        "token": token,
+        "hook": os.path.abspath(hook.partition(":")[0]) + ":" + hook.partition(":")[2],
+        "team_code": team_code,
+        "zip_file_path": os.path.abspath(zip_file_path) if zip_file_path else "",
+        "send_score": send_score,
+        "seed": seed,
+        "force": force,
+        "laps": laps,
+    }
+    with socket.create_connection((host, port)) as connection:
+        connection.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        with connection.makefile("rb") as stream:
+            for line in stream:
+                yield json.loads(line)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Command line interface to start the daemon or submit evaluations to it
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m machathon_judge.daemon",
+        description="Evaluate solutions on a simulator that is kept warm",
+    )
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=Data.DAEMON_PORT)
+    parser.add_argument(
+        "--token", help="Token of a daemon on another machine, see serve --allow-remote"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="Start the daemon")
+    serve_parser.add_argument(
+        "--stall-detection",
+        action="store_true",
+        help="Abort the laps where the car is stuck or makes no progress",
+    )
+    serve_parser.add_argument(
+        "--publish-frames",
+        nargs="?",
+        const=Data.FRAME_RING_NAME,
+        help="Share the camera frames with other processes through a shared-memory ring",
+    )
+    serve_parser.add_argument(
+        "--result-cache",
+        nargs="?",
+        const=Data.RESULT_CACHE_PATH,
+        help="Reuse the results of the evaluations already run with the same solution and seed",
+    )
+    serve_parser.add_argument(
+        "--scene",
+        help="With --result-cache, path to the scene loaded in CoppeliaSim",
+    )
+    serve_parser.add_argument(
+        "--step-sync",
+        action="store_true",
+        help="Call the hooks once per simulation step instead of as fast as possible",
+    )
+    serve_parser.add_argument(
+        "--state-subscription",
+        action="store_true",
+        help="Receive the car's state pushed by the scene instead of requesting it",
+    )
+    serve_parser.add_argument(
+        "--low-jitter",
+        action="store_true",
+        help="Keep the garbage collector and the scheduler from adding noise to the lap times",
+    )
+    serve_parser.add_argument(
+        "--cpus",
+        type=lambda value: [int(cpu) for cpu in value.split(",")],
+        help='With --low-jitter, CPUs to pin the daemon to, e.g. "2,3"',
+    )
+    serve_parser.add_argument(
+        "--trace",
+        metavar="DIR",
+        help="Write a Chrome trace of every evaluation to this directory",
+    )
+    serve_parser.add_argument(
+        "--allocation-sampling",
+        type=int,
+        metavar="N",
+        help="Trace the allocations of one call of the hooks out of N",
+    )
+    serve_parser.add_argument(
+        "--checkpoints",
+        type=lambda value: [int(port) for port in value.split(",")],
+        default=Data.CHECKPOINT_PORTS,
+        help='Ports of the checkpoints in the order of the forward track, e.g. "9000,9002,9001"',
+    )
+    serve_parser.add_argument(
+        "--allow-remote",
+        action="store_true",
+        help="Allow listening on a host reachable from other machines, "
+        "anyone with the token can then run code on this one",
+    )
+    run_parser = commands.add_parser("run", help="Evaluate a solution on the daemon")
+    run_parser.add_argument("hook", help='"path/to/module.py:function_name"')
+    run_parser.add_argument("--team", default="", help="The 9-digit team code")
+    run_parser.add_argument("--zip", default="", help="Path to the solution's zip file")
+    run_parser.add_argument(
+        "--send-score", action="store_true", help="Publish the score to the leaderboard"
+    )
+    run_parser.add_argument("--seed", type=int, help="Seed choosing the track's direction")
+    run_parser.add_argument(
+        "--force", action="store_true", help="Run the laps even if their results are cached"
+    )
+    run_parser.add_argument(
+        "--laps", type=int, default=1, help="Number of consecutive laps in each direction"
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        if args.result_cache is not None and args.scene is None:
+            serve_parser.error("--result-cache requires --scene")
+        stall_detector = StallDetector() if args.stall_detection else None
+        JudgeDaemon(
+            args.host,
+            args.port,
+            stall_detector=stall_detector,
+            frame_ring=args.publish_frames,
+            result_cache=args.result_cache,
+            scene=args.scene,
+            step_sync=args.step_sync,
+            state_subscription=args.state_subscription,
+            low_jitter=args.low_jitter,
+            cpus=args.cpus,
+            trace_dir=args.trace,
+            allocation_sampling=args.allocation_sampling,
+            checkpoint_ports=args.checkpoints,
+            allow_remote=args.allow_remote,
+        ).serve_forever()
+        return
+
+    for event in submit(
+        args.hook,
+        args.team,
+        args.zip,
+        args.send_score,
+        args.host,
+        args.port,
+        seed=args.seed,
+        force=args.force,
+        laps=args.laps,
+        token=args.token,
+    ):
+        print(json.dumps(event))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ Module containing the Data class to store all the data required for judge to run
 """
 from dataclasses import dataclass
 import math
+import os
 
 
 @dataclass
@@ -25,3 +26,81 @@ class Data:
     BTRACK_STARTING_ORIENTATION = [0, 0, 30 * math.pi / 180]
 
     TIMEOUT_DURATION = 900  # 15 minutes
+
+    # Ports of the checkpoints' websocket servers, in the order the car crosses them on the
+    # forward track, the first one being the start line. More /ckptN objects serving their
+    # collision events on other ports can be appended to split the laps into more sectors.
+    CHECKPOINT_PORTS = [9000, 9001]
+
+    # With step synchronization, the hook is called anyway if the simulation
+    # doesn't advance within this many seconds
+    STEP_WAIT_TIMEOUT = 0.5
+
+    # In low-jitter runs, seconds between two aggregations of the telemetry during the laps
+    LOW_JITTER_TELEMETRY_INTERVAL = 10
+
+    # Early abort of the laps where the car is stuck, see StallDetector
+    STALL_MIN_VELOCITY = 0.05  # m/s, slower than that the car is considered stopped
+    STALL_DURATION = 10  # seconds the car may stay stopped
+    CHECKPOINT_BUDGET = 180  # seconds allowed to reach the next checkpoint
+    STALL_CHECK_INTERVAL = 0.5
+
+    # Port the warm judge daemon listens on
+    DAEMON_PORT = 23100
+
+    # Seconds to wait for each reply of CoppeliaSim and number of times a call is retried
+    # on a new socket before failing with a RemoteAPITimeoutError
+    RPC_TIMEOUT = 10
+    RPC_RETRIES = 2
+
+    # Port the scene's helper script publishes the car's state on, see StateSubscriber,
+    # and maximum age in seconds of a published state returned by get_state
+    STATE_PORT = 23010
+    STATE_MAX_AGE = 0.2
+
+    # Kinematic backend simulating many cars at once without CoppeliaSim, see KinematicFleet
+    KINEMATIC_DT = 0.05  # seconds per step, CoppeliaSim's default time step
+    KINEMATIC_WHEEL_BASE = 0.5  # m between the front and rear axles
+    KINEMATIC_MAX_ACCELERATION = 5  # m/s^2
+    KINEMATIC_STEER_RATE = 3  # rad/s
+    KINEMATIC_TRACK_WIDTH = 4  # m
+    KINEMATIC_RASTER_RESOLUTION = 0.05  # m per pixel of the track's top-down map
+    KINEMATIC_CAMERA_RESOLUTION = (160, 120)
+    KINEMATIC_VIEW = (0.5, 8)  # m ahead of the car at the bottom and top of the frame
+
+    # Maximum number of spans kept by a Tracer, about 30 MB
+    TRACE_CAPACITY = 200000
+
+    # Maximum time to wait for the simulation to stop/start and the checkpoints to listen
+    READY_TIMEOUT = 10
+
+    # Shared-memory ring the camera frames are published into, see FrameRing
+    FRAME_RING_NAME = "machathon_frames"
+    FRAME_RING_SLOTS = 8
+
+    # Local directory where the judge keeps its state between runs
+    JUDGE_HOME = os.path.join(os.path.expanduser("~"), ".machathon_judge")
+
+    # Token every request to the judge daemon must carry, written when the daemon starts,
+    # formatted with the daemon's port
+    DAEMON_TOKEN_PATH = os.path.join(JUDGE_HOME, "daemon-{port}.token")
+
+    # Submissions that couldn't be delivered yet are kept here and retried
+    PUBLISH_QUEUE_DIR = os.path.join(JUDGE_HOME, "outbox")
+    PUBLISH_TIMEOUT = (10, 1000)  # (connect, read) in seconds
+    PUBLISH_RETRY_BACKOFF = 5  # seconds before the first retry, doubled after each failure
+    PUBLISH_RETRY_MAX_BACKOFF = 600  # 10 minutes
+    # Seconds to wait for pending uploads at exit, the others stay queued for the next start
+    PUBLISH_FLUSH_TIMEOUT = 5
+    # Solutions already stored by the leaderboard, only their hash is sent again
+    UPLOADED_RECORD_PATH = os.path.join(JUDGE_HOME, "uploaded.json")
+
+    # Local database where the judge records the lap times of every run
+    RESULTS_DB_PATH = os.path.join(JUDGE_HOME, "results.db")
+
+    # Scene the track is loaded from, part of the key of the cached results
+    SCENE_NAME = "filteration_scene.ttt"
+    # Lap times of the evaluations already run, see ResultCache
+    RESULT_CACHE_PATH = os.path.join(JUDGE_HOME, "result_cache.db")
+    RESULT_CACHE_MAX_ENTRIES = 10000
+    RESULT_CACHE_TTL = 30 * 24 * 3600  # 30 days
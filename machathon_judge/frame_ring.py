@@ -0,0 +1,341 @@
+"""
+Module containing the FrameRing class to share the camera frames with other local processes
+
+The simulator publishes every frame it fetches once into a ring of slots in shared memory.
+Other processes, e.g. a visualizer or a recorder, attach to the ring by its name and read
+the frames without any remote API call or copy:
+
+    ring = FrameRing.attach("machathon_frames")
+    seq, image = ring.latest()
+"""
+import os
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .data import Data
+from .utils import pid_alive
+
+
+class FrameRing:
+    """
+    Ring of camera frames in shared memory, written by one process and read by many
+
+    Every slot holds a frame, the time it was published and its sequence number.
+    The writer marks a slot as being written before copying a frame into it, so a reader
+    can tell whether the frame it is looking at was overwritten in the meantime (seqlock).
+
+    Use FrameRing.create in the process that owns the simulator and FrameRing.attach
+    in the other processes.
+
+    Parameters
+    ----------
+    memory: SharedMemory
+        The shared memory block of the ring
+    owner: bool
+        Whether this process created the ring, only the owner can publish and unlink it
+    """
+
+    MAGIC = 0x4D414348  # "MACH"
+    # Header fields, stored as int64
+    N_HEADER = 7
+    H_MAGIC, H_SLOTS, H_HEIGHT, H_WIDTH, H_CHANNELS, H_LATEST, H_OWNER = range(N_HEADER)
+    # Sequence number of a slot while a frame is copied into it
+    WRITING = -1
+    # Names of the rings created by this process
+    created = set()
+
+    def __init__(self, memory: shared_memory.SharedMemory, owner: bool):
+        self.memory = memory
+        self.owner = owner
+
+        self.header = np.ndarray((self.N_HEADER,), dtype=np.int64, buffer=memory.buf)
+        if self.header[self.H_MAGIC] != self.MAGIC:
+            raise ValueError(f"{memory.name} isn't a frame ring")
+        self.n_slots, height, width, channels = (
+            int(value) for value in self.header[self.H_SLOTS : self.H_LATEST]
+        )
+        self.shape = (height, width, channels)
+
+        offset = self.header.nbytes
+        self.seqs = np.ndarray((self.n_slots,), dtype=np.int64, buffer=memory.buf, offset=offset)
+        offset += self.seqs.nbytes
+        self.timestamps = np.ndarray(
+            (self.n_slots,), dtype=np.float64, buffer=memory.buf, offset=offset
+        )
+        offset += self.timestamps.nbytes
+        # The frames are stored the way the camera sends them, reflected along the width
+        self.frames = np.ndarray(
+            (self.n_slots, height * width * channels),
+            dtype=np.uint8,
+            buffer=memory.buf,
+            offset=offset,
+        )
+        if not owner:
+            for array in (self.header, self.seqs, self.timestamps, self.frames):
+                array.flags.writeable = False
+
+    @classmethod
+    def size(cls, resolution: Tuple[int, int], n_slots: int, channels: int = 3) -> int:
+        """
+        Number of bytes of the shared memory block of a ring
+        """
+        frame_size = resolution[0] * resolution[1] * channels
+        return 8 * cls.N_HEADER + n_slots * (8 + 8 + frame_size)
+
+    @classmethod
+    def create(
+        cls,
+        name: str = Data.FRAME_RING_NAME,
+        resolution: Tuple[int, int] = (640, 480),
+        n_slots: int = Data.FRAME_RING_SLOTS,
+        channels: int = 3,
+    ) -> "FrameRing":
+        """
+        Creates a ring to publish frames into
+
+        Parameters
+        ----------
+        name : str, default=Data.FRAME_RING_NAME
+            Name the other processes attach with
+        resolution : tuple, default=(640, 480)
+            (width, height) of the camera
+        n_slots : int, default=Data.FRAME_RING_SLOTS
+            Number of frames kept, a reader has n_slots - 1 frames of time to use a frame
+            before it gets overwritten
+        channels : int, default=3
+            Number of channels of the frames
+
+        Returns
+        -------
+        FrameRing
+            The ring, owned by this process
+
+        Raises
+        ------
+        FileExistsError
+            If a ring with this name is used by a running process, or the name is taken
+            by shared memory that isn't a frame ring
+        """
+        try:
+            memory = shared_memory.SharedMemory(
+                name, create=True, size=cls.size(resolution, n_slots, channels)
+            )
+        except FileExistsError:
+            cls.remove_stale(name)
+            memory = shared_memory.SharedMemory(
+                name, create=True, size=cls.size(resolution, n_slots, channels)
+            )
+
+        header = np.ndarray((cls.N_HEADER,), dtype=np.int64, buffer=memory.buf)
+        header[:] = (cls.MAGIC, n_slots, resolution[1], resolution[0], channels, -1, os.getpid())
+        np.ndarray((n_slots,), dtype=np.int64, buffer=memory.buf, offset=header.nbytes)[:] = -1
+        del header
+        cls.created.add(name)
+        return cls(memory, owner=True)
+
+    @classmethod
+    def remove_stale(cls, name: str) -> None:
+        """
+        Removes a ring left behind by a process that was killed
+
+        Parameters
+        ----------
+        name : str
+            Name of the ring
+
+        Raises
+        ------
+        FileExistsError
+            If the ring's owner is still running, or the shared memory isn't a frame ring
+        """
+        existing = shared_memory.SharedMemory(name)
+        owner = None
+        if existing.size >= 8 * cls.N_HEADER:
+            header = np.ndarray((cls.N_HEADER,), dtype=np.int64, buffer=existing.buf)
+            if header[cls.H_MAGIC] == cls.MAGIC:
+                owner = int(header[cls.H_OWNER])
+            del header
+        if owner is not None and not pid_alive(owner):
+            # Nobody can be writing to it anymore
+            existing.close()
+            existing.unlink()
+            return
+
+        # Leave it to its owner, the resource tracker would destroy it when this process exits
+        resource_tracker.unregister(
+            existing._name, "shared_memory"  # pylint: disable=protected-access
+        )
+        existing.close()
+        if owner is None:
+            raise FileExistsError(f"The shared memory {name} isn't a frame ring")
+        raise FileExistsError(
+            f"The frame ring {name} is used by the process {owner}, give this one another name"
+        )
+
+    @classmethod
+    def attach(cls, name: str = Data.FRAME_RING_NAME) -> "FrameRing":
+        """
+        Attaches read-only to a ring created by another process
+
+        Parameters
+        ----------
+        name : str, default=Data.FRAME_RING_NAME
+            Name of the ring
+
+        Returns
+        -------
+        FrameRing
+            The ring, the frames it returns are read-only views into the shared memory
+        """
+        memory = shared_memory.SharedMemory(name)
+        if name not in cls.created:
+            # The resource tracker would destroy the ring when this process exits,
+            # while the owner and the other readers are still using it
+            resource_tracker.unregister(
+                memory._name, "shared_memory"  # pylint: disable=protected-access
+            )
+        return cls(memory, owner=False)
+
+    @property
+    def latest_seq(self) -> int:
+        """
+        Sequence number of the latest frame, -1 until the first frame is published
+        """
+        return int(self.header[self.H_LATEST])
+
+    def publish(self, raw: np.ndarray) -> int:
+        """
+        Copies a frame into the next slot
+
+        Parameters
+        ----------
+        raw : np.ndarray
+            Flat uint8 buffer of the frame, as returned by the vision sensor
+
+        Returns
+        -------
+        int
+            Sequence number of the frame
+        """
+        seq = self.latest_seq + 1
+        slot = seq % self.n_slots
+        self.seqs[slot] = self.WRITING
+        self.frames[slot] = raw
+        self.timestamps[slot] = time.time()
+        self.seqs[slot] = seq
+        self.header[self.H_LATEST] = seq
+        return seq
+
+    def get(self, seq: int, copy: bool = False) -> Optional[np.ndarray]:
+        """
+        A frame by its sequence number
+
+        Parameters
+        ----------
+        seq : int
+            Sequence number of the frame
+        copy : bool, default=False
+            Whether to return a private copy of the frame instead of a view
+            into the shared memory. The copy is checked to be consistent.
+
+        Returns
+        -------
+        np.ndarray or None
+            The un-flipped (height, width, channels) image like Simulator.get_image returns,
+            None if the frame isn't in the ring (not published yet or overwritten).
+            Without copy, check is_valid(seq) once done with the view.
+        """
+        slot = seq % self.n_slots
+        if seq < 0 or self.seqs[slot] != seq:
+            return None
+        frame = self.frames[slot]
+        if copy:
+            frame = frame.copy()
+            if self.seqs[slot] != seq:
+                return None
+        return np.flip(frame.reshape(self.shape), 1)
+
+    def latest(self, copy: bool = False) -> Tuple[int, Optional[np.ndarray]]:
+        """
+        The latest published frame
+
+        Parameters
+        ----------
+        copy : bool, default=False
+            See get
+
+        Returns
+        -------
+        seq : int
+            Sequence number of the frame, -1 if no frame was published yet
+        image : np.ndarray or None
+            The frame, see get
+        """
+        while True:
+            seq = self.latest_seq
+            if seq < 0:
+                return seq, None
+            image = self.get(seq, copy)
+            if image is not None:
+                return seq, image
+            # The writer lapped the whole ring since latest_seq was read, try again
+
+    def is_valid(self, seq: int) -> bool:
+        """
+        Whether a frame is still in the ring, i.e. a view returned for it wasn't overwritten
+        """
+        return seq >= 0 and self.seqs[seq % self.n_slots] == seq
+
+    def timestamp(self, seq: int) -> Optional[float]:
+        """
+        time.time() at which a frame was published, None if it isn't in the ring anymore
+        """
+        timestamp = float(self.timestamps[seq % self.n_slots])
+        return timestamp if self.is_valid(seq) else None
+
+    def wait(
+        self, after_seq: int, timeout: Optional[float] = None
+    ) -> Tuple[int, Optional[np.ndarray]]:
+        """
+        Waits for a frame newer than after_seq and returns the latest one
+
+        Parameters
+        ----------
+        after_seq : int
+            Sequence number of the last frame seen, -1 to wait for the first frame
+        timeout : float, optional
+            Maximum number of seconds to wait, forever by default
+
+        Returns
+        -------
+        tuple
+            (seq, image) like latest, (after_seq, None) on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = 0.0005
+        while self.latest_seq <= after_seq:
+            if deadline is not None and time.monotonic() >= deadline:
+                return after_seq, None
+            time.sleep(delay)
+            delay = min(delay * 2, 0.005)
+        return self.latest()
+
+    def close(self) -> None:
+        """
+        Detaches from the ring, the owner also destroys it
+        """
+        # The views have to be released before the memory can be closed
+        self.header = self.seqs = self.timestamps = self.frames = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+            self.created.discard(self.memory.name)
+
+    def __enter__(self) -> "FrameRing":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
@@ -0,0 +1,203 @@
+"""
+Module containing the HookProfiler class to account for the CPU time and memory
+used by the competitor's code during each lap
+"""
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# tracemalloc imports pickle, it is only imported when the allocations are sampled
+# pylint: disable=import-outside-toplevel
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+_MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+class HookProfiler:
+    """
+    Accumulates the resources used by the calls of the hook during a lap
+
+    Around every call, the CPU time of the calling thread and the number of memory blocks
+    allocated by Python are read, which costs a few microseconds. The growth of the process'
+    peak resident memory is measured over the whole lap. Optionally, one call out of
+    allocation_sampling is traced with tracemalloc to measure the bytes it allocates, so that
+    the cost of tracing is only paid on the sampled calls.
+
+    Parameters
+    ----------
+    allocation_sampling: int, optional
+        Trace the allocations of one call out of this many, not traced by default
+    """
+
+    def __init__(self, allocation_sampling: Optional[int] = None):
+        self.allocation_sampling = allocation_sampling
+        self.thread_rusage = resource is not None and hasattr(resource, "RUSAGE_THREAD")
+        # Whether tracemalloc was started by someone else, it is then left running
+        self.external_tracing = False
+
+        self.calls = 0
+        self.wall = 0.0
+        self.user = 0.0
+        self.sys = 0.0
+        self.blocks = 0
+        self.maxrss_start = 0
+        self.sampled_calls = 0
+        self.alloc_peak = 0
+        self.alloc_retained = 0
+
+        self.call_start = None
+        self.tracing_call = False
+        self.traced_start = 0
+
+    def cpu_times(self):
+        """
+        User and system CPU seconds of the calling thread, or of the process
+        where the platform can't tell the threads apart
+        """
+        if self.thread_rusage:
+            usage = resource.getrusage(resource.RUSAGE_THREAD)
+            return usage.ru_utime, usage.ru_stime
+        times = os.times()
+        return times.user, times.system
+
+    @staticmethod
+    def max_rss() -> Optional[int]:
+        """
+        Peak resident memory of the process in bytes, None where it isn't available
+        """
+        if resource is None:
+            return None
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT
+
+    def start_lap(self) -> None:
+        """
+        Forgets the previous lap
+        """
+        self.calls = 0
+        self.wall = self.user = self.sys = 0.0
+        self.blocks = 0
+        self.sampled_calls = self.alloc_peak = self.alloc_retained = 0
+        if self.allocation_sampling:
+            import tracemalloc
+
+            self.external_tracing = tracemalloc.is_tracing()
+        self.maxrss_start = self.max_rss()
+
+    def before_call(self) -> None:
+        """
+        Called right before the hook
+        """
+        self.tracing_call = bool(self.allocation_sampling) and (
+            self.calls % self.allocation_sampling == 0
+        )
+        if self.tracing_call:
+            import tracemalloc
+
+            if self.external_tracing:
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+            self.traced_start = tracemalloc.get_traced_memory()[0]
+        user, system = self.cpu_times()
+        self.call_start = (time.perf_counter(), user, system, sys.getallocatedblocks())
+
+    def after_call(self) -> None:
+        """
+        Called right after the hook
+        """
+        blocks = sys.getallocatedblocks()
+        user, system = self.cpu_times()
+        now = time.perf_counter()
+        wall_start, user_start, system_start, blocks_start = self.call_start
+        self.calls += 1
+        self.wall += now - wall_start
+        self.user += user - user_start
+        self.sys += system - system_start
+        self.blocks += blocks - blocks_start
+        if self.tracing_call:
+            import tracemalloc
+
+            current, peak = tracemalloc.get_traced_memory()
+            if not self.external_tracing:
+                tracemalloc.stop()
+            self.sampled_calls += 1
+            self.alloc_peak = max(self.alloc_peak, peak - self.traced_start)
+            self.alloc_retained += current - self.traced_start
+
+    def stop_lap(self) -> Dict[str, float]:
+        """
+        The resources used by the hook since start_lap
+
+        Returns
+        -------
+        dict
+            Number of calls, their wall-clock, user and system CPU seconds, the growth in
+            bytes of the process' peak resident memory during the lap (None where it isn't
+            available) and the net number of memory blocks the calls left allocated.
+            With allocation sampling, also the number of traced calls, the largest number
+            of bytes allocated at once by one of them and the mean bytes they left allocated.
+        """
+        maxrss = self.max_rss()
+        profile = {
+            "calls": self.calls,
+            "wall_s": self.wall,
+            "user_s": self.user,
+            "sys_s": self.sys,
+            "max_rss_growth": None if maxrss is None else maxrss - self.maxrss_start,
+            "blocks_retained": self.blocks,
+        }
+        if self.allocation_sampling:
+            profile["sampled_calls"] = self.sampled_calls
+            profile["alloc_peak"] = self.alloc_peak
+            profile["alloc_retained_mean"] = (
+                self.alloc_retained / self.sampled_calls if self.sampled_calls else 0
+            )
+        return profile
+
+    @staticmethod
+    def combine(profiles: List[Dict[str, float]]) -> Dict[str, float]:
+        """
+        Profile of consecutive laps from the profiles of each lap returned by stop_lap
+        """
+        if len(profiles) == 1:
+            return profiles[0]
+        combined = {
+            key: sum(profile[key] for profile in profiles)
+            for key in ("calls", "wall_s", "user_s", "sys_s", "blocks_retained")
+        }
+        # The peak resident memory only grows, so the growths of consecutive laps add up
+        growths = [profile["max_rss_growth"] for profile in profiles]
+        combined["max_rss_growth"] = None if None in growths else sum(growths)
+        if "alloc_peak" in profiles[0]:
+            sampled_calls = sum(profile["sampled_calls"] for profile in profiles)
+            combined["sampled_calls"] = sampled_calls
+            combined["alloc_peak"] = max(profile["alloc_peak"] for profile in profiles)
+            combined["alloc_retained_mean"] = (
+                sum(p["alloc_retained_mean"] * p["sampled_calls"] for p in profiles)
+                / sampled_calls
+                if sampled_calls
+                else 0
+            )
+        return combined
+
+    @staticmethod
+    def describe(profile: Dict[str, float]) -> str:
+        """
+        One-line summary of a profile returned by stop_lap
+        """
+        text = (
+            f"hook: {profile['calls']} calls, {profile['wall_s']:.3f} s, "
+            f"CPU user {profile['user_s']:.3f} s sys {profile['sys_s']:.3f} s, "
+            f"{profile['blocks_retained']:+d} memory blocks"
+        )
+        if profile["max_rss_growth"] is not None:
+            text += f", peak RSS {profile['max_rss_growth'] / 2**20:+.1f} MiB"
+        if "alloc_peak" in profile:
+            text += f", up to {profile['alloc_peak'] / 2**10:.1f} KiB allocated per call"
+        return text
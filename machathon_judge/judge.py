@@ -2,16 +2,29 @@
 Module containing the Judge class to run the competition's tracks and
 publish the scores to the leaderboard
 """
+import os
+import math
 import time
 import random
-from typing import Callable, List
+import contextlib
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence, Tuple
 
-# pylint: disable=import-error
-import requests
-from requests.exceptions import ConnectionError
 from .data import Data
 from .simulator import Simulator
 from .collision_manager import CollisionManager
+from .stall_detector import RunAbortedError
+from .low_jitter import LowJitter
+
+if TYPE_CHECKING:
+    from .stall_detector import StallDetector
+    from .telemetry import Telemetry
+    from .tracing import Tracer
+    from .hook_profiler import HookProfiler
+    from .publisher import ScorePublisher
+
+# The publisher and the results store are imported by the functions using them,
+# so that importing the judge doesn't load their dependencies
+# pylint: disable=import-outside-toplevel
 
 
 class Judge:
@@ -24,17 +37,143 @@ class Judge:
         The new 9-digit team code
     zip_file_path: string
         Path to a zip file containing all your code files that represent your solution. e.g. "mysolution.zip"
+    results_db: string, optional
+        Path to the local SQLite database where the lap times are recorded,
+        default is Data.RESULTS_DB_PATH. Set it to None to disable recording.
+    telemetry: Telemetry, optional
+        Exporter of live metrics about the control loop, disabled by default
+    simulator: Simulator, optional
+        An already connected simulator to reuse, with the simulation running.
+        By default the judge connects a new simulator and restarts the simulation.
+    collision_manager: CollisionManager, optional
+        An already listening collision manager to reuse across laps.
+        By default a new one is created for every lap.
+    stall_detector: StallDetector, optional
+        Ends a lap early with a RunAbortedError when the car is stuck, makes no progress
+        or leaves the track, instead of waiting for the timeout. Disabled by default.
+    frame_ring: string, optional
+        Name of a shared-memory ring to publish the camera frames into, so that other local
+        processes can read them with FrameRing.attach. Disabled by default.
+    seed: int, optional
+        Seed choosing the starting direction of the track, random by default.
+        Scores can't be sent with a fixed seed.
+    result_cache: string, optional
+        Path to a ResultCache database. Evaluations of the same solution zip with the same
+        seed, scene and parameters are then read from it instead of being run again,
+        unless the score is sent or several laps are run.
+        Disabled by default, e.g. Data.RESULT_CACHE_PATH.
+    scene: string, optional
+        Path to the scene loaded in CoppeliaSim, identified by its content, or any name
+        identifying it in the result cache. A relative path is looked up from the working
+        directory, then from the repository. Default is Data.SCENE_NAME.
+    step_sync: bool, optional
+        Wait for the simulation to advance before calling the hook again, instead of calling
+        it on the same camera frame and state several times per step. Default is False.
+    state_subscription: bool, optional
+        Install a helper script in the scene pushing the car's state every step, so that
+        Simulator.get_state needs no remote API call. Default is False.
+    tracer: Tracer, optional
+        Records spans of the loop iterations, the hook, the simulator's methods, the remote API
+        calls and the checkpoint events, export them with tracer.save. Disabled by default.
+    profile_hook: bool, optional
+        Account for the CPU time, memory and calls of the hook during each lap, see HookProfiler.
+        The profiles are printed with the lap times and stored with them. Default is True.
+    allocation_sampling: int, optional
+        With profile_hook, trace the allocations of one call of the hook out of this many
+        with tracemalloc. Disabled by default.
+    publisher: ScorePublisher, optional
+        An already running publisher to send the scores with, kept open as it is owned
+        by the caller. By default one is started when the first score is published.
     """
 
-    def __init__(self, team_code: str, zip_file_path: str):
+    def __init__(
+        self,
+        team_code: str,
+        zip_file_path: str,
+        results_db: Optional[str] = Data.RESULTS_DB_PATH,
+        telemetry: Optional["Telemetry"] = None,
+        simulator: Optional[Simulator] = None,
+        collision_manager: Optional[CollisionManager] = None,
+        stall_detector: Optional["StallDetector"] = None,
+        frame_ring: Optional[str] = None,
+        seed: Optional[int] = None,
+        result_cache: Optional[str] = None,
+        scene: Optional[str] = None,
+        step_sync: bool = False,
+        state_subscription: bool = False,
+        tracer: Optional["Tracer"] = None,
+        profile_hook: bool = True,
+        allocation_sampling: Optional[int] = None,
+        publisher: Optional["ScorePublisher"] = None,
+    ):
         self.data = Data()
         self.team_code = team_code
         self.zip_file_path = zip_file_path
         self.track_starting_position = None
         self.track_starting_orientation = None
-        self.simulator = None
-        self.collision_manager = None
+        self.simulator = simulator
+        self.collision_manager = collision_manager
+        # Objects passed by the caller are kept open, they're owned by the caller
+        self.owns_simulator = simulator is None
+        self.owns_collision_manager = collision_manager is None
         self.hook = None
+        self.publisher = publisher
+        self.results_db = results_db
+        self.telemetry = telemetry
+        self.stall_detector = stall_detector
+        self.frame_ring = frame_ring
+        # (size, modification time, SHA-256) of the zip file, see solution_hash
+        self.zip_hash = None
+        self.seed = seed
+        self.result_cache = result_cache
+        self.scene = scene if scene is not None else Data.SCENE_NAME
+        # Whether the last results were read from the result cache
+        self.from_cache = False
+        self.step_sync = step_sync
+        # Simulation steps waited for and estimated number of hook calls that would have
+        # run on an already seen step without step_sync
+        self.step_stats = {"steps": 0, "duplicates_avoided": 0, "step_timeouts": 0}
+        self.state_subscription = state_subscription
+        self.tracer = tracer
+        # Quiets the process during the laps of a low-jitter run, see LowJitter,
+        # and the loop-interval statistics of the last such run
+        self.low_jitter: Optional[LowJitter] = None
+        self.jitter_stats = None
+        self.hook_profiler: Optional["HookProfiler"] = None
+        if profile_hook:
+            from .hook_profiler import HookProfiler
+
+            self.hook_profiler = HookProfiler(allocation_sampling)
+        # Resources used by the hook during each lap of the last run, in the order of the laps,
+        # and those of the last run's forward and backward laps
+        self.lap_profiles: List[Dict] = []
+        self.hook_profiles = {"forward": {}, "backward": {}}
+        # Laps of the last run in each direction, see run_laps, and their split statistics
+        self.laps = {"forward": [], "backward": []}
+        self.split_stats = {"forward": None, "backward": None}
+
+    def trace(self, tracer: Optional["Tracer"]) -> None:
+        """
+        Starts or stops recording the spans of the simulator, its remote API client
+        and the collision manager
+
+        Parameters
+        ----------
+        tracer : Tracer or None
+            The tracer recording the spans, None to stop recording
+        """
+        from .tracing import Tracer
+
+        if tracer is not None:
+            tracer.name_thread("judge")
+            tracer.instrument(self.simulator, "simulator")
+        else:
+            Tracer.uninstrument(self.simulator)
+        # The kinematic backend has no remote API client
+        if getattr(self.simulator, "client", None) is not None:
+            self.simulator.client.tracer = tracer
+        if self.collision_manager is not None:
+            self.collision_manager.tracer = tracer
 
     def set_run_hook(self, hook_func: Callable) -> None:
         """
@@ -51,17 +190,137 @@ class Judge:
         """
         Closes the simulator and collision manager object.
         """
-        if self.collision_manager is not None:
+        if self.collision_manager is not None and self.owns_collision_manager:
             self.collision_manager.close()
 
-        if self.simulator is not None:
+        if self.simulator is not None and self.owns_simulator:
+            self.simulator.unsubscribe_state()
             self.simulator.stop()
+            self.simulator.close_frames()
+
+        if self.telemetry is not None:
+            self.telemetry.stop()
+
+    def solution_hash(self) -> Optional[str]:
+        """
+        SHA-256 of the solution's zip file, only recomputed when the file changes
+
+        Returns
+        -------
+        str or None
+            The hex digest, None if the file doesn't exist
+        """
+        from .utils import hash_file
+
+        try:
+            stat = os.stat(self.zip_file_path)
+        except OSError:
+            return None
+        if self.zip_hash is None or self.zip_hash[:2] != (stat.st_size, stat.st_mtime_ns):
+            self.zip_hash = (stat.st_size, stat.st_mtime_ns, hash_file(self.zip_file_path))
+        return self.zip_hash[2]
+
+    def result_key(
+        self, seed: int, low_jitter: bool = False, cpus: Optional[Sequence[int]] = None
+    ) -> Optional[str]:
+        """
+        Key of the evaluation of the solution with a seed in the result cache
+
+        Parameters
+        ----------
+        seed : int
+            The seed choosing the starting direction of the track
+        low_jitter : bool, default=False
+            Whether the laps are run in low-jitter mode
+        cpus : sequence of int, optional
+            With low_jitter, CPUs the judge is pinned to
+
+        Returns
+        -------
+        str or None
+            The key, None if the solution's zip file doesn't exist. Besides the solution, the seed,
+            the scene and Data's parameters, it depends on every option changing the timing of
+            the control loop: step_sync, state_subscription, low-jitter mode, the stall detector's
+            settings and whether frames are published, the hook is profiled, traced or reported
+            by the telemetry.
+        """
+        from .result_cache import ResultCache
+
+        solution_hash = self.solution_hash()
+        if solution_hash is None:
+            return None
+        stall_detector = self.stall_detector
+        options = {
+            "step_sync": self.step_sync,
+            "state_subscription": self.state_subscription,
+            "low_jitter": low_jitter,
+            "cpus": sorted(cpus) if low_jitter and cpus is not None else None,
+            "stall_detector": None
+            if stall_detector is None
+            else {
+                "min_velocity": stall_detector.min_velocity,
+                "stall_duration": stall_detector.stall_duration,
+                "checkpoint_budget": stall_detector.checkpoint_budget,
+                "track_bounds": stall_detector.track_bounds,
+                "check_interval": stall_detector.check_interval,
+            },
+            "frame_ring": self.frame_ring is not None,
+            "profile_hook": self.hook_profiler is not None,
+            "allocation_sampling": None
+            if self.hook_profiler is None
+            else self.hook_profiler.allocation_sampling,
+            "tracing": self.tracer is not None,
+            "telemetry": self.telemetry is not None,
+        }
+        return ResultCache.make_key(
+            solution_hash, seed, self.scene_key(self.scene), self.data, options
+        )
+
+    @staticmethod
+    def scene_key(scene: str) -> str:
+        """
+        Identifies a scene in the result cache
+
+        Parameters
+        ----------
+        scene : str
+            Path to the scene file, or any name identifying it
+
+        Returns
+        -------
+        str
+            SHA-256 of the scene file, or the scene itself when it is a name and not a path
+
+        Raises
+        ------
+        FileNotFoundError
+            If the scene is a path to a file that doesn't exist
+        """
+        from .utils import hash_file
+
+        if not scene.endswith(".ttt") and not os.path.dirname(scene):
+            return scene
+        # Relative paths are looked up from the working directory, then from the repository,
+        # so that the key doesn't depend on where the judge is run from
+        paths = [os.path.abspath(scene)]
+        if not os.path.isabs(scene):
+            repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            paths.append(os.path.join(repository, scene))
+        for path in paths:
+            digest = hash_file(path)
+            if digest is not None:
+                return digest
+        raise FileNotFoundError(
+            f"The scene {scene} wasn't found, pass its path as scene to use the result cache"
+        )
 
     def publish_score(
         self, forward_laptime: float, backward_laptime: float, verbose: bool = True
     ) -> None:
         """
-        Send the current submission score to the competition's leaderboard
+        Send the current submission score to the competition's leaderboard.
+        The submission is queued on disk and uploaded by a background thread,
+        so this function returns immediately.
 
         Parameters
         ----------
@@ -72,35 +331,85 @@ class Judge:
         verbose : boolean, default True
             Flag to print messages about the submission status.
         """
+        from .publisher import ScorePublisher
 
-        file = [("solution_code", open(self.zip_file_path, "rb"))]
+        if self.publisher is None:
+            self.publisher = ScorePublisher(
+                endpoint=self.data.LEADERBOARD_ENDPOINT, verbose=verbose
+            )
 
-        data = {
-            "team_9digit_code": self.team_code,
-            "forward_laptime": forward_laptime,
-            "backward_laptime": backward_laptime,
-        }
+        self.publisher.submit(
+            self.team_code,
+            self.zip_file_path,
+            forward_laptime,
+            backward_laptime,
+            solution_hash=self.solution_hash(),
+        )
 
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.12; \
-                            rv:55.0) Gecko/20100101 Firefox/55.0"
-        }
+    def record_laps(self, seed: int, laps: List[Tuple[int, Dict]]) -> None:
+        """
+        Stores the lap times of a run in the local results database.
+        The local history is optional, so a database that can't be written only prints a warning.
 
-        # sending post request to STP's leaderboard
-        response = requests.post(
-            url=self.data.LEADERBOARD_ENDPOINT,
-            files=file,
-            data=data,
-            headers=headers,
-            timeout=1000,
-        )
+        Parameters
+        ----------
+        seed : int
+            The seed used to choose the starting direction of the track
+        laps : list
+            (track_id, lap) of each lap, lap being returned by run_laps
+        """
+        import sqlite3
 
-        # extracting response status code
-        if verbose:
-            if response.status_code == 200:
-                print("Your score has been published on the leaderboard successfully!")
-            else:
-                print("Submission Failure, ", response.text)
+        from .results_store import LapRecord, ResultsStore
+
+        solution_hash = self.solution_hash()
+        try:
+            store = ResultsStore(self.results_db)
+            try:
+                store.add_laps(
+                    LapRecord(
+                        team_code=self.team_code,
+                        solution_hash=solution_hash,
+                        direction="forward" if track_id == self.data.FORWARD_TRACK else "backward",
+                        lap_time=lap["lap_time"],
+                        seed=seed,
+                        started_at=lap["finished_at"] - lap["lap_time"],
+                        finished_at=lap["finished_at"],
+                        profile=lap.get("profile", {}),
+                        sectors=lap["sectors"],
+                    )
+                    for track_id, lap in laps
+                )
+            finally:
+                store.close()
+        except (sqlite3.Error, OSError) as exp:
+            print(f"Warning: the lap times couldn't be recorded in {self.results_db}: {exp}")
+
+    def wait_for_step(self, simulator: Simulator, hook_duration: float) -> None:
+        """
+        Waits for a new simulation step before the next call of the hook
+
+        Parameters
+        ----------
+        simulator: Simulator
+            The simulation environment object.
+        hook_duration: float
+            Seconds taken by the previous call of the hook, used to estimate how many
+            calls the wait avoided, 0 before the first call
+        """
+        if simulator.wait_for_step(0) is None:
+            tic = time.monotonic()
+            if simulator.wait_for_step(self.data.STEP_WAIT_TIMEOUT) is None:
+                self.step_stats["step_timeouts"] += 1
+                return
+            if hook_duration > 0:
+                # Without waiting, the hook would have been called again on the same step
+                # until the simulation advanced
+                n_avoided = math.ceil((time.monotonic() - tic) / hook_duration)
+                self.step_stats["duplicates_avoided"] += n_avoided
+                if self.telemetry is not None:
+                    self.telemetry.event("duplicates_avoided", n_avoided)
+        self.step_stats["steps"] += 1
 
     def run_track(self, simulator: Simulator) -> float:
         """
@@ -118,33 +427,221 @@ class Judge:
         -------
         float
             The lap time taken to complete a single lap of the track in seconds.
+
+        Raises:
+        -------
+        RunAbortedError
+            If the stall detector ended the lap early
+        TimeoutError
+            If the lap took longer than Data.TIMEOUT_DURATION
         """
-        next_ckpt_id = 0
-        tic = time.monotonic()
-        start_time = 0
+        return self.run_laps(simulator)[0]["lap_time"]
+
+    def lap_completed(self, lap: Dict) -> None:
+        """
+        Called by run_laps as soon as a lap is completed, does nothing by default
+
+        Parameters
+        ----------
+        lap : dict
+            The lap, see run_laps
+        """
+
+    def run_laps(
+        self, simulator: Simulator, n_laps: int = 1, backward: bool = False
+    ) -> List[Dict]:
+        """
+        Runs the competitor's code for several consecutive laps without stopping the car,
+        the checkpoints being the boundaries of the laps' sectors
 
-        self.collision_manager = CollisionManager()
+        The first lap starts when the car crosses the starting checkpoint, every lap ends
+        when it crosses it again after all the other checkpoints, which starts the next lap.
 
+        Parameters
+        ----------
+        simulator: Simulator
+            The simulation environment object.
+        n_laps: int, default=1
+            Number of laps to run
+        backward: bool, default=False
+            Whether the car drives the track backward, crossing the checkpoints after
+            the starting one in the reverse order
+
+        Returns
+        -------
+        list of dict
+            For every lap, its "lap_time" and the times of its "sectors" in seconds,
+            "finished_at" as a Unix timestamp and, when the hook is profiled, the "profile"
+            of the resources it used, see HookProfiler
+
+        Raises
+        ------
+        RunAbortedError
+            If the stall detector ended the laps early
+        TimeoutError
+            If a lap took longer than Data.TIMEOUT_DURATION
+        """
+        if self.owns_collision_manager:
+            self.collision_manager = CollisionManager(self.data.CHECKPOINT_PORTS)
+            self.collision_manager.tracer = self.tracer
+        else:
+            # Forget about the crossings that happened before these laps
+            self.collision_manager.clear()
+
+        # Ids of the checkpoints in the order they are crossed during a lap
+        n_ckpts = len(self.collision_manager.ckpts_collided)
+        order = [0] + (list(range(n_ckpts - 1, 0, -1)) if backward else list(range(1, n_ckpts)))
+        next_index = 0
+        next_ckpt_id = order[next_index]
+        # time.monotonic() when the checkpoints of the current lap were crossed
+        crossings = []
+        laps = []
+
+        tic = time.monotonic()
+        if self.stall_detector is not None:
+            self.stall_detector.reset(tic)
+
+        hook_duration = 0.0
+        if self.step_sync:
+            # Forget about the steps that happened before this lap
+            simulator.wait_for_step(0)
+
+        tracer = self.tracer
+        profiler = self.hook_profiler
+        if profiler is not None:
+            profiler.start_lap()
         while (time.monotonic() - tic) < self.data.TIMEOUT_DURATION:
+            if tracer is not None:
+                tick_start = tracer.now()
+            if self.step_sync:
+                self.wait_for_step(simulator, hook_duration)
             # calculate the start and finish time when the vehicle crosses the starting checkpoint
             if self.collision_manager.ckpts_collided[next_ckpt_id]:
-                if start_time == 0:
-                    start_time = time.monotonic()
-                elif next_ckpt_id == 0:
-                    finish_time = time.monotonic()
-                    self.collision_manager.close()
-
-                    # return the time taken to complete 1 lap through the track
-                    return finish_time - start_time
-                # switch between the starting checkpoint and the middle-track checkpoint
-                next_ckpt_id = 1 - next_ckpt_id
+                crossed_at = time.monotonic()
+                if tracer is not None:
+                    tracer.instant(f"checkpoint {next_ckpt_id} crossed", "judge")
+                if self.telemetry is not None:
+                    self.telemetry.event("checkpoint", next_ckpt_id)
+                if self.stall_detector is not None:
+                    self.stall_detector.progress(crossed_at)
+                if next_index == 0 and crossings:
+                    crossings.append(crossed_at)
+                    lap = {
+                        "lap_time": crossed_at - crossings[0],
+                        "sectors": [end - start for start, end in zip(crossings, crossings[1:])],
+                        "finished_at": time.time(),
+                    }
+                    if self.telemetry is not None:
+                        self.telemetry.event("lap", lap["lap_time"])
+                    if profiler is not None:
+                        lap["profile"] = profiler.stop_lap()
+                        self.lap_profiles.append(lap["profile"])
+                        profiler.start_lap()
+                    laps.append(lap)
+                    self.lap_completed(lap)
+                    if len(laps) == n_laps:
+                        if self.owns_collision_manager:
+                            self.collision_manager.close()
+                        return laps
+                    # The timeout applies to every lap
+                    tic = crossed_at
+                    crossings = []
+                crossings.append(crossed_at)
+                # move on to the next checkpoint of the lap
+                next_index = (next_index + 1) % n_ckpts
+                next_ckpt_id = order[next_index]
             # Calling the competitior's code
-            self.hook(simulator)
+            hook_start = time.monotonic()
+            if self.low_jitter is not None:
+                self.low_jitter.tick(hook_start)
+            if tracer is not None:
+                hook_traced = tracer.now()
+            if profiler is None:
+                self.hook(simulator)
+            else:
+                profiler.before_call()
+                try:
+                    self.hook(simulator)
+                finally:
+                    profiler.after_call()
+            hook_duration = time.monotonic() - hook_start
+            if tracer is not None:
+                tracer.complete("hook", "judge", hook_traced)
+            if self.telemetry is not None:
+                self.telemetry.tick(simulator, next_ckpt_id)
+            if self.stall_detector is not None:
+                try:
+                    self.stall_detector.check(simulator, time.monotonic())
+                except RunAbortedError:
+                    self.clean_up()
+                    raise
+            if tracer is not None:
+                tracer.complete("tick", "judge", tick_start)
 
         self.clean_up()
         raise TimeoutError("Simulation timeout exceeded!")
 
-    def run_unsafe(self, send_score: bool = True, verbose: bool = True) -> None:
+    @staticmethod
+    def split_statistics(laps: List[Dict]) -> Dict:
+        """
+        Best and mean times of the laps returned by run_laps and of their sectors
+
+        Parameters
+        ----------
+        laps : list of dict
+            The laps, see run_laps
+
+        Returns
+        -------
+        dict
+            Number of "laps", "best" and "mean" lap times, "best" and "mean" time of each
+            of the "sectors" and "best_possible", the sum of the best sector times
+        """
+        lap_times = [lap["lap_time"] for lap in laps]
+        sectors = [
+            {"best": min(times), "mean": sum(times) / len(times)}
+            for times in zip(*(lap["sectors"] for lap in laps))
+        ]
+        return {
+            "laps": len(laps),
+            "best": min(lap_times),
+            "mean": sum(lap_times) / len(lap_times),
+            "sectors": sectors,
+            "best_possible": sum(sector["best"] for sector in sectors),
+        }
+
+    @staticmethod
+    def print_splits(laps: List[Dict], stats: Dict) -> None:
+        """
+        Prints the lap and sector times of several laps and their statistics
+
+        Parameters
+        ----------
+        laps : list of dict
+            The laps, see run_laps
+        stats : dict
+            Their statistics, see split_statistics
+        """
+        for index, lap in enumerate(laps):
+            sectors = ", ".join(f"{sector:.3f}" for sector in lap["sectors"])
+            print(f"    Lap {index + 1}: {lap['lap_time']:.3f} (sectors {sectors})")
+        sectors = ", ".join(
+            f"{sector['best']:.3f}/{sector['mean']:.3f}" for sector in stats["sectors"]
+        )
+        print(
+            f"    Best lap: {stats['best']:.3f}, mean: {stats['mean']:.3f}, "
+            f"sectors best/mean: {sectors}, best possible: {stats['best_possible']:.3f}"
+        )
+
+    def run_unsafe(
+        self,
+        send_score: bool = True,
+        verbose: bool = True,
+        force: bool = False,
+        low_jitter: bool = False,
+        cpus: Optional[Sequence[int]] = None,
+        laps: int = 1,
+    ) -> Tuple[float, float]:
         """
         This function calls the competitor's code twice. It then caluclates the laptime taken
         for each run and, if specified, publishes the laptime to the leaderboard.
@@ -155,78 +652,233 @@ class Judge:
             Determine whether send the score to the leaderboard, default is True.
         verbose: bool, optional
             Flag to print messages about the lap time values, default is True.
+        force: bool, optional
+            Run the laps even if their results are in the result cache, default is False.
+            The cache is never used when the score is sent or several laps are run.
+        low_jitter: bool, optional
+            Keep the garbage collector and the scheduler from adding noise to the lap times,
+            see LowJitter. The loop-interval statistics are then kept in jitter_stats.
+            Default is False.
+        cpus: sequence of int, optional
+            With low_jitter, CPUs to pin the judge and the hook to, not pinned by default.
+        laps: int, optional
+            Number of consecutive laps run in each direction, see run_laps. The lap times and
+            the statistics of their sectors are kept in laps and split_stats. Default is 1.
+            Several laps can't be run when the score is sent.
+
+        Returns
+        -------
+        forward_laptime : float
+            Time taken to finish the track by moving in the track's forward direction,
+            the mean lap time when several laps are run.
+        backward_laptime : float
+            Time taken to finish the track by moving in the track's backward direction,
+            the mean lap time when several laps are run.
         """
-        self.simulator = Simulator()
+        from .result_cache import ResultCache
 
-        self.simulator.stop()
-        time.sleep(0.5)  # Ensure the simulator has stopped
-        self.simulator.start()
-        time.sleep(2)  # Ensure the websockets have started
+        if send_score and self.seed is not None:
+            raise ValueError(
+                "A score can't be sent with a fixed seed, the starting direction must be random"
+            )
+        # The leaderboard ranks single laps, a mean over several laps isn't comparable
+        if send_score and laps != 1:
+            raise ValueError("A score can only be sent for a single lap in each direction")
 
         # Randomly choosing which direction of the track to start the navigation with
         # Your code should run autonomously given any track
         # This is why the process of choosing the starting direction of the track is done randomly,
         # so you don't control flow your code on a specific track.
-        track_id = random.randint(0, 1)
-        self.track_starting_orientation = (
-            self.data.FTRACK_STARTING_ORIENTATION
-            if track_id == self.data.FORWARD_TRACK
-            else self.data.BTRACK_STARTING_ORIENTATION
-        )
-        self.track_starting_position = (
-            self.data.FTRACK_STARTING_POSITION
-            if track_id == self.data.FORWARD_TRACK
-            else self.data.BTRACK_STARTING_POSITION
-        )
+        # The seed is recorded with the results so the run can be traced back
+        seed = self.seed if self.seed is not None else random.randrange(2**32)
+        track_id = random.Random(seed).randint(0, 1)
+
+        self.from_cache = False
+        self.step_stats = {"steps": 0, "duplicates_avoided": 0, "step_timeouts": 0}
+        self.jitter_stats = None
+        self.lap_profiles = []
+        self.hook_profiles = {"forward": {}, "backward": {}}
+        self.laps = {"forward": [], "backward": []}
+        self.split_stats = {"forward": None, "backward": None}
+
+        # Only the lap times are cached, not the laps and sectors of multi-lap runs
+        result_key = None
+        if self.result_cache is not None and laps == 1:
+            result_key = self.result_key(seed, low_jitter, cpus)
+        # The published scores always come from laps driven now
+        if result_key is not None and not force and not send_score:
+            cache = ResultCache(self.result_cache)
+            cached = cache.get(result_key)
+            cache.close()
+            if cached is not None:
+                self.from_cache = True
+                forward_laptime, backward_laptime = cached
+                if verbose:
+                    print(
+                        "This solution was already evaluated with the same seed, "
+                        "lap times (forward, backward): ",
+                        forward_laptime,
+                        backward_laptime,
+                    )
+                return forward_laptime, backward_laptime
+
+        if self.telemetry is not None:
+            self.telemetry.start()
+
+        # Whatever was changed is restored by the finally block, and the simulator, the frame
+        # ring, the state subscription and the telemetry are released, even if the run fails
+        try:
+            if self.owns_simulator:
+                self.simulator = Simulator(len(self.data.CHECKPOINT_PORTS))
+                self.simulator.stop()
+                self.simulator.wait_until_stopped(self.data.READY_TIMEOUT)
+                self.simulator.start()
+                self.simulator.wait_until_running(self.data.READY_TIMEOUT)
+                CollisionManager.wait_until_ready(
+                    ports=self.data.CHECKPOINT_PORTS, timeout=self.data.READY_TIMEOUT
+                )
+            else:
+                # The simulation is kept running, only bring the car to a halt
+                # before it gets placed at the start of the track
+                self.simulator.stop_car()
 
-        # position the car at the start of the track
-        self.simulator.reset_car_pose(
-            self.track_starting_position, self.track_starting_orientation
-        )
+            if self.frame_ring is not None and self.simulator.frame_ring is None:
+                self.simulator.publish_frames(self.frame_ring)
 
-        # execute the competitor's code on the track first direction
-        lap_time1 = self.run_track(self.simulator)
-        # re-position the car to start the track with the opposite direction
-        self.track_starting_orientation = (
-            self.data.BTRACK_STARTING_ORIENTATION
-            if track_id == self.data.FORWARD_TRACK
-            else self.data.FTRACK_STARTING_ORIENTATION
-        )
-        self.track_starting_position = (
-            self.data.BTRACK_STARTING_POSITION
-            if track_id == self.data.FORWARD_TRACK
-            else self.data.FTRACK_STARTING_POSITION
-        )
-        self.simulator.reset_car_pose(
-            self.track_starting_position, self.track_starting_orientation
-        )
+            if self.state_subscription and self.simulator.state_subscriber is None:
+                if not self.simulator.subscribe_state(timeout=self.data.READY_TIMEOUT) and verbose:
+                    print("The car's state isn't published by the scene, using the remote API")
 
-        # execute the competitor's code on the track's opposite direction
-        lap_time2 = self.run_track(self.simulator)
+            self.track_starting_orientation = (
+                self.data.FTRACK_STARTING_ORIENTATION
+                if track_id == self.data.FORWARD_TRACK
+                else self.data.BTRACK_STARTING_ORIENTATION
+            )
+            self.track_starting_position = (
+                self.data.FTRACK_STARTING_POSITION
+                if track_id == self.data.FORWARD_TRACK
+                else self.data.BTRACK_STARTING_POSITION
+            )
 
-        # publish the laptime of the 2 runs to the leaderboard
-        forward_laptime, backward_laptime = (
-            (lap_time1, lap_time2)
-            if track_id == self.data.FORWARD_TRACK
-            else (lap_time2, lap_time1)
-        )
+            lap_context = contextlib.nullcontext
+            if low_jitter:
+                # The telemetry and the uploads of previous scores wait for the end of the laps
+                background = [
+                    worker for worker in (self.telemetry, self.publisher) if worker is not None
+                ]
+                self.low_jitter = LowJitter(cpus, background)
+                lap_context = self.low_jitter.lap
+
+            if self.low_jitter is not None:
+                if not self.low_jitter.start() and cpus is not None and verbose:
+                    print("The judge can't be pinned to CPUs on this platform")
+
+            if self.tracer is not None:
+                self.trace(self.tracer)
+
+            # position the car at the start of the track
+            self.simulator.reset_car_pose(
+                self.track_starting_position, self.track_starting_orientation
+            )
 
-        if verbose:
-            print(
-                "Time taken to finish the track starting from its forward orientation: ",
-                forward_laptime,
+            # execute the competitor's code on the track first direction
+            with lap_context():
+                laps1 = self.run_laps(
+                    self.simulator, laps, backward=track_id == self.data.BACKWARD_TRACK
+                )
+            # re-position the car to start the track with the opposite direction
+            self.track_starting_orientation = (
+                self.data.BTRACK_STARTING_ORIENTATION
+                if track_id == self.data.FORWARD_TRACK
+                else self.data.FTRACK_STARTING_ORIENTATION
             )
-            print(
-                "Time taken to finish the track starting from its backward orientation: ",
-                backward_laptime,
+            self.track_starting_position = (
+                self.data.BTRACK_STARTING_POSITION
+                if track_id == self.data.FORWARD_TRACK
+                else self.data.FTRACK_STARTING_POSITION
             )
+            self.simulator.reset_car_pose(
+                self.track_starting_position, self.track_starting_orientation
+            )
+
+            # execute the competitor's code on the track's opposite direction
+            with lap_context():
+                laps2 = self.run_laps(
+                    self.simulator, laps, backward=track_id == self.data.FORWARD_TRACK
+                )
+        finally:
+            if self.tracer is not None:
+                self.trace(None)
+            if self.low_jitter is not None:
+                self.low_jitter.stop()
+                self.jitter_stats = self.low_jitter.stats()
+                self.low_jitter = None
+            self.clean_up()
+
+        self.laps = (
+            {"forward": laps1, "backward": laps2}
+            if track_id == self.data.FORWARD_TRACK
+            else {"forward": laps2, "backward": laps1}
+        )
+        for direction, direction_laps in self.laps.items():
+            self.split_stats[direction] = self.split_statistics(direction_laps)
+            if self.hook_profiler is not None:
+                self.hook_profiles[direction] = self.hook_profiler.combine(
+                    [lap["profile"] for lap in direction_laps]
+                )
 
+        # publish the laptime of the 2 runs to the leaderboard
+        forward_laptime = self.split_stats["forward"]["mean"]
+        backward_laptime = self.split_stats["backward"]["mean"]
+
+        if verbose:
+            laptimes = {"forward": forward_laptime, "backward": backward_laptime}
+            for direction, laptime in laptimes.items():
+                print(
+                    f"Time taken to finish the track starting from its {direction} orientation: ",
+                    laptime,
+                )
+                if laps > 1:
+                    self.print_splits(self.laps[direction], self.split_stats[direction])
+                if self.hook_profiles[direction]:
+                    print("    " + self.hook_profiler.describe(self.hook_profiles[direction]))
+            if self.step_sync:
+                print(
+                    "Hook calls on an already seen simulation step avoided: ",
+                    self.step_stats["duplicates_avoided"],
+                )
+            if self.jitter_stats is not None:
+                print(
+                    "Loop interval (ms) mean: {mean_ms:.3f}, jitter (std): {std_ms:.3f}, "
+                    "p99: {p99_ms:.3f}, max: {max_ms:.3f}".format(**self.jitter_stats)
+                )
+
+        # The score is queued first, the local records can't keep it from being sent
         if send_score:
             self.publish_score(forward_laptime, backward_laptime, verbose)
 
-        self.simulator.stop()
+        if self.results_db is not None:
+            self.record_laps(
+                seed,
+                [(track_id, lap) for lap in laps1] + [(1 - track_id, lap) for lap in laps2],
+            )
 
-    def run(self, send_score: bool = True, verbose: bool = True) -> None:
+        if result_key is not None:
+            cache = ResultCache(self.result_cache)
+            cache.put(result_key, self.solution_hash(), seed, forward_laptime, backward_laptime)
+            cache.close()
+
+        return forward_laptime, backward_laptime
+
+    def run(
+        self,
+        send_score: bool = True,
+        verbose: bool = True,
+        force: bool = False,
+        low_jitter: bool = False,
+        cpus: Optional[Sequence[int]] = None,
+        laps: int = 1,
+    ) -> Optional[Tuple[float, float]]:
         """
         This function is a wrapper for the run_unsafe function
 
@@ -236,19 +888,39 @@ class Judge:
             Determine whether send the score to the leaderboard, default is True.
         verbose: bool, optional
             Flag to print messages about the lap time values, default is True.
+        force: bool, optional
+            Run the laps even if their results are in the result cache, default is False.
+        low_jitter: bool, optional
+            Keep the garbage collector and the scheduler from adding noise to the lap times,
+            default is False.
+        cpus: sequence of int, optional
+            With low_jitter, CPUs to pin the judge and the hook to, not pinned by default.
+        laps: int, optional
+            Number of consecutive laps run in each direction, default is 1.
+            Several laps can't be run when the score is sent.
+
+        Returns
+        -------
+        tuple or None
+            The forward and backward lap times, None if the run was interrupted,
+            aborted by the stall detector or timed out
         """
         # The following try-except block handles any keyboard interruptions
-        # that occur during the run, such as pressing "ctrl+c" in the terminal.
+        # that occur during the run, such as pressing "ctrl+c" in the terminal,
+        # and the runs ended early by the stall detector or a timeout.
         # It closes any opened collision manager and simulator objects.
         try:
-            self.run_unsafe(send_score, verbose)
+            return self.run_unsafe(send_score, verbose, force, low_jitter, cpus, laps)
         except KeyboardInterrupt:
             print(
                 "The program has received a keyboard interrupt. Shutting down safely...."
             )
             self.clean_up()
-        except ConnectionError:
-            print(
-                "Something went wrong! \nYour score hasn't been submitted, please check your internet connection."
-            )
+        except RunAbortedError as exp:
+            print(f"The run was aborted ({exp.status}): {exp}")
+            self.clean_up()
+        except TimeoutError as exp:
+            # The lap took too long or CoppeliaSim stopped answering
+            print(f"The run timed out: {exp}")
             self.clean_up()
+        return None
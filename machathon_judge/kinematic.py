@@ -0,0 +1,680 @@
+"""
+Module containing the KinematicFleet class to simulate many cars at once with a kinematic
+bicycle model, to tune controllers headless and much faster than real time
+
+The fleet steps all its cars together with NumPy, each car is driven either by vectorized
+commands or through a KinematicSimulator, which has the interface of Simulator:
+
+    fleet = KinematicFleet(n_cars=256)
+    lap_times = fleet.run(solution.run_car, timeout=300)
+"""
+import math
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .data import Data
+from .simulator import Simulator
+
+
+class Track:
+    """
+    Closed track described by its centerline, its width and its checkpoint gates
+
+    The track is rasterized once into a top-down map, which the camera frames are
+    sampled from and which tells whether a car is on the road.
+
+    Parameters
+    ----------
+    centerline: array-like, shape = (M, 2)
+        X, Y points of the closed centerline in the world frame, in the forward direction
+    checkpoints: array-like, shape = (K, 2)
+        X, Y positions of the checkpoints, checkpoint 0 being the start and finish line.
+        Each one is moved to the nearest centerline point and spans the width of the track.
+    width: float, default=Data.KINEMATIC_TRACK_WIDTH
+        Width of the road in m
+    resolution: float, default=Data.KINEMATIC_RASTER_RESOLUTION
+        Size in m of a pixel of the top-down map
+    """
+
+    # Labels of the top-down map and their RGB colour
+    GRASS, ROAD, GATE = range(3)
+    PALETTE = np.array([[60, 130, 50], [90, 90, 90], [220, 40, 40]], dtype=np.uint8)
+    # Grass around the road in the map, in m. The points outside of the map are
+    # clipped to its border, so they're seen as grass too.
+    MARGIN = 1.0
+    # Thickness of the painted gates in m
+    GATE_THICKNESS = 0.2
+
+    def __init__(
+        self,
+        centerline: Sequence[Sequence[float]],
+        checkpoints: Sequence[Sequence[float]],
+        width: float = Data.KINEMATIC_TRACK_WIDTH,
+        resolution: float = Data.KINEMATIC_RASTER_RESOLUTION,
+    ):
+        self.centerline = np.asarray(centerline, dtype=np.float64)[:, :2]
+        self.width = width
+        self.resolution = resolution
+
+        tangents = np.roll(self.centerline, -1, axis=0) - np.roll(self.centerline, 1, axis=0)
+        tangents /= np.linalg.norm(tangents, axis=1, keepdims=True)
+        checkpoints = np.asarray(checkpoints, dtype=np.float64)[:, :2]
+        nearest = np.argmin(
+            np.linalg.norm(checkpoints[:, None] - self.centerline[None], axis=2), axis=1
+        )
+        self.gate_centers = self.centerline[nearest]
+        self.gate_tangents = tangents[nearest]
+
+        self.origin = self.centerline.min(axis=0) - width / 2 - self.MARGIN
+        extent = self.centerline.max(axis=0) + width / 2 + self.MARGIN - self.origin
+        self.shape = (
+            int(math.ceil(extent[1] / resolution)),
+            int(math.ceil(extent[0] / resolution)),
+        )
+        self.map = self.rasterize()
+        # RGB colour of every cell of the map, flattened, the frames are gathered from it
+        self.colors = self.PALETTE[self.map].reshape(-1, 3)
+
+    @classmethod
+    def stadium(
+        cls,
+        straight_length: float = 30,
+        radius: float = 8,
+        start: Optional[Sequence[float]] = None,
+        heading: float = Data.FTRACK_STARTING_ORIENTATION[2],
+        n_points: int = 256,
+        **kwargs,
+    ) -> "Track":
+        """
+        A stadium-shaped track whose start line lies between the judge's starting positions,
+        so that the cars can be placed like on the competition's track
+
+        Parameters
+        ----------
+        straight_length : float, default=30
+            Length in m of the two straights
+        radius : float, default=8
+            Radius in m of the two turns
+        start : sequence, optional
+            X, Y of the start line, default is between Data's forward and backward
+            starting positions
+        heading : float, default=Data.FTRACK_STARTING_ORIENTATION[2]
+            Direction of the track's forward direction at the start line in radians
+        n_points : int, default=256
+            Number of points of the centerline
+        **kwargs
+            Passed to Track
+
+        Returns
+        -------
+        Track
+            The track, turning left in its forward direction
+        """
+        if start is None:
+            start = (
+                np.add(Data.FTRACK_STARTING_POSITION[:2], Data.BTRACK_STARTING_POSITION[:2]) / 2
+            )
+        half = straight_length / 2
+        perimeter = 2 * straight_length + 2 * math.pi * radius
+        # Distance along the centerline from the start line, which is in the middle of a straight
+        distance = np.linspace(0, perimeter, n_points, endpoint=False)
+        # (length of the piece, function of the distance into the piece)
+        pieces = [
+            (half, lambda d: (d, 0 * d)),
+            (
+                math.pi * radius,
+                lambda d: (
+                    half + radius * np.sin(d / radius),
+                    radius - radius * np.cos(d / radius),
+                ),
+            ),
+            (straight_length, lambda d: (half - d, 0 * d + 2 * radius)),
+            (
+                math.pi * radius,
+                lambda d: (
+                    -half - radius * np.sin(d / radius),
+                    radius + radius * np.cos(d / radius),
+                ),
+            ),
+            (half, lambda d: (d - half, 0 * d)),
+        ]
+        local = np.empty((n_points, 2))
+        begin = 0.0
+        for length, position in pieces:
+            inside = (distance >= begin) & (distance < begin + length)
+            local[inside, 0], local[inside, 1] = position(distance[inside] - begin)
+            begin += length
+
+        forward = np.array([math.cos(heading), math.sin(heading)])
+        left = np.array([-forward[1], forward[0]])
+        centerline = np.asarray(start) + local[:, :1] * forward + local[:, 1:] * left
+        checkpoints = [start, np.asarray(start) + 2 * radius * left]
+        return cls(centerline, checkpoints, **kwargs)
+
+    def rasterize(self) -> np.ndarray:
+        """
+        Draws the top-down map of the track
+
+        Returns
+        -------
+        np.ndarray, shape = (rows, columns)
+            uint8 labels of the map, row i and column j covering
+            origin + (j, i) * resolution to origin + (j + 1, i + 1) * resolution
+        """
+        labels = np.full(self.shape, self.GRASS, dtype=np.uint8)
+        half_width = self.width / 2
+        reach = half_width + self.resolution
+
+        # Each centerline segment paints the cells closer than half the width to it
+        for start, end in zip(self.centerline, np.roll(self.centerline, -1, axis=0)):
+            (rows, columns), (x, y) = self.window(
+                np.minimum(start, end) - reach, np.maximum(start, end) + reach
+            )
+            segment = end - start
+            along = np.clip(
+                ((x - start[0]) * segment[0] + (y - start[1]) * segment[1]) / segment.dot(segment),
+                0,
+                1,
+            )
+            distance = np.hypot(
+                x - start[0] - along * segment[0], y - start[1] - along * segment[1]
+            )
+            labels[rows, columns][distance <= half_width] = self.ROAD
+
+        for center, tangent in zip(self.gate_centers, self.gate_tangents):
+            (rows, columns), (x, y) = self.window(center - reach, center + reach)
+            along = (x - center[0]) * tangent[0] + (y - center[1]) * tangent[1]
+            across = (x - center[0]) * -tangent[1] + (y - center[1]) * tangent[0]
+            labels[rows, columns][
+                (np.abs(along) <= self.GATE_THICKNESS / 2) & (np.abs(across) <= half_width)
+            ] = self.GATE
+        return labels
+
+    def window(
+        self, lower: np.ndarray, upper: np.ndarray
+    ) -> Tuple[Tuple[slice, slice], Tuple[np.ndarray, np.ndarray]]:
+        """
+        The cells of the map between two corners and the world coordinates of their centers
+        """
+        first = np.maximum(((lower - self.origin) / self.resolution).astype(int), 0)
+        last = np.minimum(
+            ((upper - self.origin) / self.resolution).astype(int) + 1, self.shape[::-1]
+        )
+        x = self.origin[0] + (np.arange(first[0], last[0]) + 0.5) * self.resolution
+        y = self.origin[1] + (np.arange(first[1], last[1]) + 0.5) * self.resolution
+        return (slice(first[1], last[1]), slice(first[0], last[0])), (x[None, :], y[:, None])
+
+    def lookup(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """
+        Labels of the map at world coordinates, GRASS outside of the map
+
+        Parameters
+        ----------
+        x, y : np.ndarray
+            World coordinates of the same shape
+
+        Returns
+        -------
+        np.ndarray
+            uint8 labels of the same shape
+        """
+        columns = ((x - self.origin[0]) * (1 / self.resolution)).astype(np.intp)
+        rows = ((y - self.origin[1]) * (1 / self.resolution)).astype(np.intp)
+        np.clip(columns, 0, self.shape[1] - 1, out=columns)
+        np.clip(rows, 0, self.shape[0] - 1, out=rows)
+        return self.map[rows, columns]
+
+
+class KinematicFleet:
+    """
+    Simulates N cars on a track with a kinematic bicycle model, all of them at once
+
+    Every step, the steering of each car turns towards its command at a limited rate,
+    its velocity changes towards its command with a limited acceleration and the car
+    moves along the arc given by its steering around its rear axle. The cars don't
+    collide with each other or with anything else, they can leave the road.
+
+    The lap of each car is timed like the judge does, in simulated time: the timer starts
+    when the car crosses checkpoint 0 and stops when it crosses it again after all the
+    other checkpoints in order.
+
+    Parameters
+    ----------
+    n_cars: int, default=1
+        Number of cars
+    track: Track, optional
+        The track the cars drive on, default is Track.stadium()
+    dt: float, default=Data.KINEMATIC_DT
+        Simulated seconds per step
+    wheel_base: float, default=Data.KINEMATIC_WHEEL_BASE
+        Distance in m between the front and rear axles
+    max_acceleration: float, default=Data.KINEMATIC_MAX_ACCELERATION
+        Maximum change of velocity in m/s^2
+    steer_rate: float, default=Data.KINEMATIC_STEER_RATE
+        Maximum change of steering in rad/s
+    camera_resolution: tuple, default=Data.KINEMATIC_CAMERA_RESOLUTION
+        (width, height) of the rendered camera frames
+    view: tuple, default=Data.KINEMATIC_VIEW
+        Distance in m ahead of the car seen at the bottom and at the top of the frames
+    """
+
+    def __init__(
+        self,
+        n_cars: int = 1,
+        track: Optional[Track] = None,
+        dt: float = Data.KINEMATIC_DT,
+        wheel_base: float = Data.KINEMATIC_WHEEL_BASE,
+        max_acceleration: float = Data.KINEMATIC_MAX_ACCELERATION,
+        steer_rate: float = Data.KINEMATIC_STEER_RATE,
+        camera_resolution: Tuple[int, int] = Data.KINEMATIC_CAMERA_RESOLUTION,
+        view: Tuple[float, float] = Data.KINEMATIC_VIEW,
+    ):
+        self.n_cars = n_cars
+        self.track = track if track is not None else Track.stadium()
+        self.dt = dt
+        self.wheel_base = wheel_base
+        self.max_acceleration = max_acceleration
+        self.steer_rate = steer_rate
+        self.camera_resolution = tuple(camera_resolution)
+
+        # State of the cars, the pose being the one of the rear axle
+        self.position = np.zeros((n_cars, 2))
+        self.height = np.zeros(n_cars)
+        self.yaw = np.zeros(n_cars)
+        self.velocity = np.zeros(n_cars)
+        self.steering = np.zeros(n_cars)
+        self.target_velocity = np.zeros(n_cars)
+        self.target_steering = np.zeros(n_cars)
+        self.time = 0.0
+        self.n_steps = 0
+
+        # Lap timing, see update_laps
+        self.next_ckpt = np.zeros(n_cars, dtype=np.intp)
+        self.lap_start = np.full(n_cars, np.nan)
+        self.lap_time = np.full(n_cars, np.nan)
+        self.gate_side = np.zeros((n_cars, len(self.track.gate_centers)), dtype=bool)
+
+        # Position in the car's frame, in map cells, of the ground seen by every pixel of the
+        # raw frames, which are reflected along their width like the vision sensor's
+        width, height = self.camera_resolution
+        near, far = np.divide(view, self.track.resolution)
+        scale = (far - near) / height
+        self.view_forward = np.repeat(far - (np.arange(height) + 0.5) * scale, width)
+        self.view_left = np.tile((np.arange(width) + 0.5 - width / 2) * scale, height)
+        # Single precision is plenty for a few hundred cells and twice as fast
+        self.view_forward = self.view_forward.astype(np.float32)
+        self.view_left = self.view_left.astype(np.float32)
+
+        self.simulators: List["KinematicSimulator"] = []
+        self.reset()
+
+    def reset(
+        self, track_ids: Optional[Sequence[int]] = None, cars: Optional[Sequence[int]] = None
+    ) -> None:
+        """
+        Places cars at the start of the track, stopped, and restarts their lap
+
+        Parameters
+        ----------
+        track_ids : sequence, optional
+            Data.FORWARD_TRACK or Data.BACKWARD_TRACK for each car, forward by default
+        cars : sequence, optional
+            Indices of the cars, all of them by default
+        """
+        cars = np.arange(self.n_cars) if cars is None else np.asarray(cars)
+        backward = (
+            np.zeros(len(cars), dtype=bool)
+            if track_ids is None
+            else np.asarray(track_ids) == Data.BACKWARD_TRACK
+        )
+        positions = np.where(
+            backward[:, None], Data.BTRACK_STARTING_POSITION, Data.FTRACK_STARTING_POSITION
+        )
+        orientations = np.where(
+            backward[:, None], Data.BTRACK_STARTING_ORIENTATION, Data.FTRACK_STARTING_ORIENTATION
+        )
+        self.place(cars, positions, orientations)
+
+    def place(
+        self,
+        cars: Sequence[int],
+        positions: Sequence[Sequence[float]],
+        orientations: Sequence[Sequence[float]],
+    ) -> None:
+        """
+        Places cars at a pose, stopped, and restarts their lap
+
+        Parameters
+        ----------
+        cars : sequence
+            Indices of the cars
+        positions : sequence
+            X, Y, Z location of each car
+        orientations : sequence
+            Euler angles of each car, only the last one (yaw) is used
+        """
+        positions = np.asarray(positions, dtype=np.float64)
+        self.position[cars] = positions[:, :2]
+        self.height[cars] = positions[:, 2]
+        self.yaw[cars] = np.asarray(orientations, dtype=np.float64)[:, 2]
+        for state in (self.velocity, self.steering, self.target_velocity, self.target_steering):
+            state[cars] = 0
+        self.next_ckpt[cars] = 0
+        self.lap_start[cars] = np.nan
+        self.lap_time[cars] = np.nan
+        self.gate_side[cars] = self.gate_offsets(cars)[0] >= 0
+
+    def set_commands(
+        self,
+        velocity: Optional[np.ndarray] = None,
+        steering: Optional[np.ndarray] = None,
+        cars: Optional[Sequence[int]] = None,
+    ) -> None:
+        """
+        Sets the velocity and/or steering commands of cars, clamped like Simulator does
+
+        Parameters
+        ----------
+        velocity : np.ndarray, optional
+            Velocity of each car in m/s
+        steering : np.ndarray, optional
+            Steering angle of each car in radians
+        cars : sequence, optional
+            Indices of the cars, all of them by default
+        """
+        cars = slice(None) if cars is None else cars
+        if velocity is not None:
+            self.target_velocity[cars] = np.minimum(velocity, Simulator.max_velocity)
+        if steering is not None:
+            self.target_steering[cars] = np.clip(
+                steering, -Simulator.max_steer_angle, Simulator.max_steer_angle
+            )
+
+    def step(self) -> None:
+        """
+        Advances all the cars by dt
+        """
+        dt = self.dt
+        max_turn = self.steer_rate * dt
+        self.steering += np.clip(self.target_steering - self.steering, -max_turn, max_turn)
+        max_change = self.max_acceleration * dt
+        self.velocity += np.clip(self.target_velocity - self.velocity, -max_change, max_change)
+
+        distance = self.velocity * dt
+        self.yaw += distance * np.tan(self.steering) / self.wheel_base
+        self.position[:, 0] += distance * np.cos(self.yaw)
+        self.position[:, 1] += distance * np.sin(self.yaw)
+
+        self.time += dt
+        self.n_steps += 1
+        self.update_laps()
+
+    def gate_offsets(self, cars: Optional[Sequence[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Position of cars relative to the checkpoint gates
+
+        Parameters
+        ----------
+        cars : sequence, optional
+            Indices of the cars, all of them by default
+
+        Returns
+        -------
+        along : np.ndarray, shape = (n_cars, K)
+            Signed distance of each car to each gate's line, along the track
+        across : np.ndarray, shape = (n_cars, K)
+            Distance of each car to each gate's center, across the track
+        """
+        position = self.position if cars is None else self.position[cars]
+        offset = position[:, None, :] - self.track.gate_centers[None]
+        tangents = self.track.gate_tangents
+        along = offset[..., 0] * tangents[:, 0] + offset[..., 1] * tangents[:, 1]
+        across = np.abs(offset[..., 1] * tangents[:, 0] - offset[..., 0] * tangents[:, 1])
+        return along, across
+
+    def update_laps(self) -> None:
+        """
+        Detects the cars that crossed their next checkpoint since the previous step
+        """
+        along, across = self.gate_offsets()
+        side = along >= 0
+        crossed = (side != self.gate_side) & (across <= self.track.width / 2)
+        self.gate_side = side
+
+        hit = crossed[np.arange(self.n_cars), self.next_ckpt] & np.isnan(self.lap_time)
+        at_start = hit & (self.next_ckpt == 0)
+        finishing = at_start & ~np.isnan(self.lap_start)
+        starting = at_start & np.isnan(self.lap_start)
+        self.lap_time[finishing] = self.time - self.lap_start[finishing]
+        self.lap_start[starting] = self.time
+        advancing = hit & ~finishing
+        self.next_ckpt[advancing] = (self.next_ckpt[advancing] + 1) % len(self.track.gate_centers)
+
+    @property
+    def finished(self) -> np.ndarray:
+        """
+        Whether each car completed its lap
+        """
+        return ~np.isnan(self.lap_time)
+
+    def on_track(self) -> np.ndarray:
+        """
+        Whether each car is on the road
+        """
+        return self.track.lookup(self.position[:, 0], self.position[:, 1]) != Track.GRASS
+
+    def render(self, cars: Optional[Sequence[int]] = None) -> np.ndarray:
+        """
+        Draws the top-down view of the ground ahead of cars
+
+        Parameters
+        ----------
+        cars : sequence, optional
+            Indices of the cars, all of them by default
+
+        Returns
+        -------
+        np.ndarray, shape = (n_cars, height * width * 3)
+            Flat uint8 RGB buffer of each car's frame, reflected along its width
+            like the vision sensor sends it
+        """
+        cars = slice(None) if cars is None else cars
+        track = self.track
+        # Everything in map cells, so that the pixels are gathered with a single flat index
+        cos = np.cos(self.yaw[cars]).astype(np.float32)[:, None]
+        sin = np.sin(self.yaw[cars]).astype(np.float32)[:, None]
+        origin = ((self.position[cars] - track.origin) / track.resolution).astype(np.float32)
+        forward, left = self.view_forward, self.view_left
+        columns = (origin[:, 0:1] + cos * forward - sin * left).astype(np.int32)
+        rows = (origin[:, 1:2] + sin * forward + cos * left).astype(np.int32)
+        np.clip(columns, 0, track.shape[1] - 1, out=columns)
+        np.clip(rows, 0, track.shape[0] - 1, out=rows)
+        rows *= track.shape[1]
+        rows += columns
+        return np.take(track.colors, rows, axis=0).reshape(len(rows), -1)
+
+    def car(self, index: int) -> "KinematicSimulator":
+        """
+        The Simulator interface of a car
+
+        Parameters
+        ----------
+        index : int
+            Index of the car
+
+        Returns
+        -------
+        KinematicSimulator
+            The simulator driving the car
+        """
+        if not self.simulators:
+            self.simulators = [KinematicSimulator(self, i) for i in range(self.n_cars)]
+        return self.simulators[index]
+
+    def run(
+        self,
+        hook: Callable[[Simulator], None],
+        track_ids: Optional[Sequence[int]] = None,
+        timeout: float = Data.TIMEOUT_DURATION,
+    ) -> np.ndarray:
+        """
+        Drives a lap with every car, calling the competitor's function for each car once
+        per step, like the judge does with step synchronization
+
+        Parameters
+        ----------
+        hook : Callable
+            The competitor's function, called with the KinematicSimulator of a car
+        track_ids : sequence, optional
+            Data.FORWARD_TRACK or Data.BACKWARD_TRACK for each car, forward by default
+        timeout : float, default=Data.TIMEOUT_DURATION
+            Maximum simulated seconds of the laps
+
+        Returns
+        -------
+        np.ndarray, shape = (n_cars,)
+            Simulated lap time of each car in seconds, NaN for the cars that didn't finish
+        """
+        self.reset(track_ids)
+        simulators = [self.car(index) for index in range(self.n_cars)]
+        for _ in range(int(math.ceil(timeout / self.dt))):
+            driving = np.flatnonzero(~self.finished)
+            if not driving.size:
+                break
+            for index in driving:
+                hook(simulators[index])
+            self.step()
+        return self.lap_time.copy()
+
+
+class KinematicSimulator(Simulator):
+    """
+    One car of a KinematicFleet, with the interface of Simulator
+
+    The simulation only advances when the fleet steps, get_image renders the synthetic
+    top-down frame of the car.
+
+    Parameters
+    ----------
+    fleet: KinematicFleet, optional
+        The fleet the car belongs to, default is a new fleet of a single car
+    index: int, default=0
+        Index of the car in the fleet
+    """
+
+    # pylint: disable=super-init-not-called
+    def __init__(self, fleet: Optional[KinematicFleet] = None, index: int = 0):
+        # There is no connection to CoppeliaSim, the car is a row of the fleet's arrays
+        self.fleet = fleet if fleet is not None else KinematicFleet()
+        self.index = index
+        self.running = True
+
+        self.steer_angle = 0
+        self.motor_velocity = 0
+        self.last_state = None
+        self.last_state_time = None
+        self.state_subscriber = None
+        self.state_max_age = Data.STATE_MAX_AGE
+
+        self.camera_resolution = self.fleet.camera_resolution
+        self.frame_ring = None
+
+    def start(self) -> None:
+        """
+        Start the simulation, the car is only driven while the fleet steps
+        """
+        self.running = True
+
+    def stop(self) -> None:
+        """
+        Stop the simulation
+        """
+        self.running = False
+
+    def is_running(self) -> bool:
+        """
+        Checks whether the simulation was started
+        """
+        return self.running
+
+    def is_stopped(self) -> bool:
+        """
+        Checks whether the simulation was stopped
+        """
+        return not self.running
+
+    def set_car_velocity(self, velocity: float) -> None:
+        """
+        Send a velocity command to the car, in m/s
+        """
+        velocity = min(velocity, self.max_velocity)
+        self.motor_velocity = velocity / self.wheel_radius
+        self.fleet.target_velocity[self.index] = velocity
+
+    def set_car_steering(self, steering: float) -> None:
+        """
+        Send a steering command to the car, in radians
+        """
+        steering = min(max(steering, -self.max_steer_angle), self.max_steer_angle)
+        self.steer_angle = steering
+        self.fleet.target_steering[self.index] = steering
+
+    def get_raw_image(self) -> np.ndarray:
+        """
+        Renders the synthetic frame of the car, reflected along its width like the vision sensor's
+        """
+        return self.fleet.render([self.index])[0]
+
+    def wait_for_step(self, timeout: Optional[float] = None) -> Optional[int]:
+        """
+        The fleet's step count, the steps are driven by the fleet so there is none to wait for
+        """
+        return self.fleet.n_steps
+
+    def get_state(self) -> Tuple[float, float]:
+        """
+        Gets the current steering angle in radians and linear velocity in m/s of the car
+        """
+        self.last_state = (
+            float(self.fleet.steering[self.index]),
+            float(self.fleet.velocity[self.index]),
+        )
+        self.last_state_time = time.monotonic()
+        return self.last_state
+
+    def known_state(self) -> Optional[Tuple[float, float]]:
+        """
+        The state is always known, it is read from the fleet's arrays
+        """
+        return self.get_state()
+
+    def subscribe_state(self, *_, **__) -> bool:
+        """
+        There is no scene to install the helper script in, the state is always read locally
+        """
+        return False
+
+    def get_car_position(self) -> List[float]:
+        """
+        Gets the X, Y, Z location of the car's rear axle in the world
+        """
+        x, y = self.fleet.position[self.index]
+        return [float(x), float(y), float(self.fleet.height[self.index])]
+
+    def stop_car(self) -> None:
+        """
+        Brings the car to a halt immediately
+        """
+        self.set_car_velocity(0)
+        self.set_car_steering(0)
+        self.fleet.velocity[self.index] = 0
+
+    def reset_car_pose(self, position: List[float], orientation: List[float]):
+        """
+        Place the car, stopped, at an X, Y, Z location and euler angles and restart its lap
+        """
+        self.fleet.place([self.index], [position], [orientation])
+        self.steer_angle = 0
+        self.motor_velocity = 0
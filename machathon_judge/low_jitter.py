@@ -0,0 +1,184 @@
+"""
+Module containing the LowJitter class to keep the Python runtime and the OS scheduler
+from adding noise to the timed laps
+"""
+import gc
+import os
+import math
+import time
+import contextlib
+from typing import Dict, Iterator, Optional, Sequence
+
+
+class LowJitter:
+    """
+    Quiets the judge's process while the laps are timed and measures the loop-interval jitter
+
+    During a lap the cyclic garbage collector is disabled and the objects alive at its start
+    are frozen, the garbage is collected between the laps instead. The background workers,
+    such as the telemetry aggregation and the score uploads, are paused so that they wake up
+    less often. The judge can be pinned to chosen CPUs so that it isn't migrated.
+
+    On Linux, the CPU affinity is a property of each thread: only the thread calling start,
+    which runs the hook, and the threads it starts afterwards are pinned, e.g. those of a
+    collision manager created for the lap. The threads already running keep their CPUs.
+
+    Parameters
+    ----------
+    cpus: sequence of int, optional
+        CPUs the judge and the hook are pinned to during the run (Linux only), not pinned by default
+    background: sequence, optional
+        Workers paused during the laps, with pause and resume methods, e.g. Telemetry
+        and ScorePublisher
+    """
+
+    # Width in seconds of the bins of the loop-interval histogram, the last bin
+    # counts every interval longer than N_BINS * BIN_WIDTH
+    BIN_WIDTH = 1e-4
+    N_BINS = 10000
+
+    def __init__(
+        self,
+        cpus: Optional[Sequence[int]] = None,
+        background: Sequence = (),
+    ):
+        self.cpus = sorted(cpus) if cpus is not None else None
+        self.background = list(background)
+
+        # State of the process before start, restored by stop
+        self.saved_affinity = None
+        self.saved_gc_enabled = None
+        self.pinned = False
+        self.gc_seconds = 0.0
+
+        self.last_tick = None
+        self.n_intervals = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.max = 0.0
+        self.histogram = [0] * self.N_BINS
+
+    def start(self) -> bool:
+        """
+        Pins the calling thread until stop is called
+
+        Returns
+        -------
+        bool
+            Whether the process was pinned to the CPUs, False if no CPUs were given
+            or the platform doesn't support it
+
+        Raises
+        ------
+        OSError
+            If the thread can't be pinned to the CPUs, e.g. one of them doesn't exist,
+            the process is then left unchanged
+        """
+        # Pinned first, so that nothing needs to be restored if the CPUs are invalid
+        if self.cpus is not None and hasattr(os, "sched_setaffinity"):
+            saved_affinity = os.sched_getaffinity(0)
+            os.sched_setaffinity(0, self.cpus)
+            self.saved_affinity = saved_affinity
+            self.pinned = True
+
+        self.saved_gc_enabled = gc.isenabled()
+        return self.pinned
+
+    def stop(self) -> None:
+        """
+        Restores the garbage collector and the CPU affinity
+        """
+        if self.saved_gc_enabled is None:
+            return
+        gc.unfreeze()
+        if self.saved_gc_enabled:
+            gc.enable()
+        if self.saved_affinity is not None:
+            os.sched_setaffinity(0, self.saved_affinity)
+            self.saved_affinity = None
+        self.pinned = False
+        self.saved_gc_enabled = None
+
+    @contextlib.contextmanager
+    def lap(self) -> Iterator[None]:
+        """
+        Context of a timed lap, the garbage is collected before and after it
+        and the background workers are paused during it
+        """
+        tic = time.perf_counter()
+        gc.disable()
+        gc.collect()
+        # The surviving objects are left out of the next collection
+        gc.freeze()
+        self.gc_seconds += time.perf_counter() - tic
+        self.last_tick = None
+        for worker in self.background:
+            worker.pause()
+        try:
+            yield
+        finally:
+            for worker in self.background:
+                worker.resume()
+            tic = time.perf_counter()
+            gc.unfreeze()
+            gc.collect()
+            self.gc_seconds += time.perf_counter() - tic
+
+    def tick(self, now: float) -> None:
+        """
+        Records an iteration of the control loop
+
+        Parameters
+        ----------
+        now : float
+            time.monotonic() at the start of the iteration
+        """
+        last_tick, self.last_tick = self.last_tick, now
+        if last_tick is None:
+            return
+        interval = now - last_tick
+        # Welford's online mean and variance
+        self.n_intervals += 1
+        delta = interval - self.mean
+        self.mean += delta / self.n_intervals
+        self.m2 += delta * (interval - self.mean)
+        if interval > self.max:
+            self.max = interval
+        self.histogram[min(int(interval / self.BIN_WIDTH), self.N_BINS - 1)] += 1
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Loop interval under which a fraction of the intervals are, in seconds,
+        accurate to BIN_WIDTH
+        """
+        if self.n_intervals == 0:
+            return math.nan
+        rank = fraction * self.n_intervals
+        seen = 0
+        for index, count in enumerate(self.histogram):
+            seen += count
+            if seen >= rank:
+                return min((index + 1) * self.BIN_WIDTH, self.max)
+        return self.max
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Statistics of the loop intervals of the laps run so far
+
+        Returns
+        -------
+        dict
+            Number of intervals, their mean, standard deviation (the jitter), median,
+            99th percentile and maximum in milliseconds, and the milliseconds spent
+            collecting the garbage between the laps
+        """
+        std = math.sqrt(self.m2 / self.n_intervals) if self.n_intervals else math.nan
+        return {
+            "intervals": self.n_intervals,
+            "mean_ms": self.mean * 1000 if self.n_intervals else math.nan,
+            "std_ms": std * 1000,
+            "p50_ms": self.percentile(0.5) * 1000,
+            "p99_ms": self.percentile(0.99) * 1000,
+            "max_ms": self.max * 1000 if self.n_intervals else math.nan,
+            "gc_ms": self.gc_seconds * 1000,
+        }
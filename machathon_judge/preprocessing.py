@@ -0,0 +1,140 @@
+"""
+Module containing the ImagePipeline class to preprocess the camera images in a single pass
+"""
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class ImagePipeline:
+    """
+    Declarative preprocessing of the raw camera image
+
+    Un-flipping, channel reordering, cropping and resizing are folded into a single
+    precomputed gather index, so the whole spec is applied in one vectorized pass
+    over the raw image, straight into a reusable output buffer.
+
+    Parameters
+    ----------
+    channel_order: str, default="rgb"
+        "rgb", "bgr" (OpenCV's order) or "gray"
+    crop: tuple, optional
+        (top, bottom, left, right) pixel bounds to keep, in the un-flipped image
+    resize: tuple, optional
+        (width, height) of the output image, resized with the nearest neighbour
+    unflip: bool, default=True
+        Whether to un-reflect the image along its width, like Simulator.get_image does
+
+    Notes
+    -----
+    The returned image is the pipeline's output buffer, it is overwritten by the next call.
+    Copy it if it has to be kept across frames.
+    """
+
+    CHANNELS = {"rgb": (0, 1, 2), "bgr": (2, 1, 0), "gray": (0, 1, 2)}
+    # ITU-R BT.601 luma weights scaled to 256, the same as OpenCV's RGB2GRAY
+    GRAY_WEIGHTS = np.array([77, 150, 29], dtype=np.uint16)
+
+    def __init__(
+        self,
+        channel_order: str = "rgb",
+        crop: Optional[Sequence[int]] = None,
+        resize: Optional[Sequence[int]] = None,
+        unflip: bool = True,
+    ):
+        if channel_order not in self.CHANNELS:
+            raise ValueError(f"Unknown channel order {channel_order!r}")
+        self.channel_order = channel_order
+        self.crop = tuple(crop) if crop is not None else None
+        self.resize = tuple(resize) if resize is not None else None
+        self.unflip = unflip
+
+        self.resolution = None
+        self.index = None
+        self.out = None
+        self.gray_buffer = None
+        self.gray_sum = None
+
+    def output_shape(self, resolution: Tuple[int, int]) -> Tuple[int, ...]:
+        """
+        Shape of the images produced for a camera resolution
+
+        Parameters
+        ----------
+        resolution : tuple
+            (width, height) of the camera
+
+        Returns
+        -------
+        tuple
+            (height, width, 3) or (height, width) for gray images
+        """
+        top, bottom, left, right = self.crop or (0, resolution[1], 0, resolution[0])
+        width, height = self.resize or (right - left, bottom - top)
+        if self.channel_order == "gray":
+            return height, width
+        return height, width, 3
+
+    def build(self, resolution: Tuple[int, int]) -> None:
+        """
+        Precomputes the gather index and allocates the output buffer
+
+        Parameters
+        ----------
+        resolution : tuple
+            (width, height) of the camera
+        """
+        width, height = resolution
+        top, bottom, left, right = self.crop or (0, height, 0, width)
+        if not (0 <= top < bottom <= height and 0 <= left < right <= width):
+            raise ValueError(f"Crop {self.crop} is outside of the {width}x{height} image")
+        out_width, out_height = self.resize or (right - left, bottom - top)
+
+        # Nearest neighbour sampling of the cropped area
+        rows = top + (np.arange(out_height) * (bottom - top) // out_height)
+        cols = left + (np.arange(out_width) * (right - left) // out_width)
+        if self.unflip:
+            cols = width - 1 - cols
+        channels = np.array(self.CHANNELS[self.channel_order])
+
+        index = (rows[:, None, None] * width + cols[None, :, None]) * 3 + channels
+        self.index = index.astype(np.int32 if index.max() < 2**31 else np.int64)
+        self.resolution = tuple(resolution)
+
+        if self.channel_order == "gray":
+            self.gray_buffer = np.empty((out_height, out_width, 3), dtype=np.uint8)
+            self.gray_sum = np.empty((out_height, out_width), dtype=np.uint16)
+            self.out = np.empty((out_height, out_width), dtype=np.uint8)
+        else:
+            self.out = np.empty((out_height, out_width, 3), dtype=np.uint8)
+
+    def __call__(self, raw: np.ndarray, resolution: Tuple[int, int]) -> np.ndarray:
+        """
+        Applies the pipeline to a raw image
+
+        Parameters
+        ----------
+        raw : np.ndarray
+            The flat uint8 buffer returned by the vision sensor, still reflected along its width
+        resolution : tuple
+            (width, height) of the camera
+
+        Returns
+        -------
+        np.ndarray
+            The preprocessed image, see output_shape
+        """
+        if self.resolution != tuple(resolution):
+            self.build(resolution)
+        raw = raw.reshape(-1)
+
+        if self.channel_order != "gray":
+            np.take(raw, self.index, out=self.out, mode="clip")
+            return self.out
+
+        np.take(raw, self.index, out=self.gray_buffer, mode="clip")
+        np.matmul(self.gray_buffer, self.GRAY_WEIGHTS, out=self.gray_sum)
+        np.add(self.gray_sum, 128, out=self.gray_sum)  # round to the nearest
+        np.right_shift(self.gray_sum, 8, out=self.gray_sum)
+        np.copyto(self.out, self.gray_sum, casting="unsafe")
+        return self.out
@@ -0,0 +1,643 @@
+"""
+Module containing the ScorePublisher class to send the scores to the leaderboard
+in the background and keep the submissions that couldn't be delivered on disk
+until they are
+"""
+import os
+import json
+import time
+import uuid
+import atexit
+import shutil
+import threading
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Set
+
+from .data import Data
+
+if TYPE_CHECKING:
+    import requests
+
+# pylint: disable=import-error,import-outside-toplevel
+
+
+class MultipartStream:
+    """
+    A multipart/form-data request body that is read from disk in chunks
+    instead of being built in memory, so large solutions are streamed to the server
+
+    Parameters
+    ----------
+    fields: dict
+        The form fields to send along with the file
+    file_field: str
+        Name of the form field holding the file
+    file_path: str
+        Path to the file to upload
+    chunk_size: int, default=65536
+        Number of bytes read from the file at a time
+    """
+
+    def __init__(
+        self,
+        fields: Dict[str, str],
+        file_field: str,
+        file_path: str,
+        chunk_size: int = 65536,
+    ):
+        self.boundary = uuid.uuid4().hex
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+
+        preamble = "".join(
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+            f"{value}\r\n"
+            for name, value in fields.items()
+        )
+        preamble += (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{file_field}"; '
+            f'filename="{os.path.basename(file_path)}"\r\n'
+            "Content-Type: application/zip\r\n\r\n"
+        )
+        self.preamble = preamble.encode("utf-8")
+        self.epilogue = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+
+        self.length = (
+            len(self.preamble) + os.path.getsize(file_path) + len(self.epilogue)
+        )
+        self.chunks = None
+        self.pending = b""
+
+    @property
+    def content_type(self) -> str:
+        """
+        The value of the Content-Type header matching this body
+        """
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self.preamble
+        with open(self.file_path, "rb") as file:
+            while True:
+                chunk = file.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        yield self.epilogue
+
+    def read(self, size: int = -1) -> bytes:
+        """
+        File-like read used by the HTTP client to pull the body
+
+        Parameters
+        ----------
+        size : int, default=-1
+            Maximum number of bytes to return, -1 reads everything left
+
+        Returns
+        -------
+        bytes
+            The next part of the body, empty when the body is exhausted
+        """
+        if self.chunks is None:
+            self.chunks = iter(self)
+
+        buffer = [self.pending]
+        n_bytes = len(self.pending)
+        while size < 0 or n_bytes < size:
+            chunk = next(self.chunks, b"")
+            if not chunk:
+                break
+            buffer.append(chunk)
+            n_bytes += len(chunk)
+
+        data = b"".join(buffer)
+        if size < 0:
+            self.pending = b""
+            return data
+        self.pending = data[size:]
+        return data[:size]
+
+
+class ScorePublisher:
+    """
+    Class to publish the scores to the leaderboard from a background thread
+
+    Each submission is first written to the queue directory, then sent through a
+    persistent HTTP session. Submissions that fail because of the network or a
+    server error stay in the queue and are retried with an exponential backoff,
+    including by later runs of the judge.
+
+    The SHA-256 of the solution is sent with every submission. When the server
+    acknowledges having stored it (X-Solution-Sha256 response header), the hash is
+    remembered in the uploaded record, and the next submissions of the same solution
+    only send the hash and the lap times. If the server answers 412 to such a submission,
+    it doesn't have the solution anymore and the zip is uploaded again.
+
+    Several publishers, e.g. of judges running in parallel, can share the queue. A submission
+    is claimed before being sent by moving it to the publisher's own directory in the queue's
+    inflight directory, and moved back if it has to be retried. The claims of the processes
+    that died while sending are moved back by the other publishers.
+
+    Parameters
+    ----------
+    endpoint: str, default=Data.LEADERBOARD_ENDPOINT
+        The URL of the leaderboard
+    queue_dir: str, default=Data.PUBLISH_QUEUE_DIR
+        Directory where the pending submissions are stored
+    verbose: bool, default=True
+        Flag to print messages about the submission status
+    uploaded_record: str, optional, default=Data.UPLOADED_RECORD_PATH
+        JSON file remembering the solutions already stored by each endpoint,
+        None to always upload the zip
+    """
+
+    HASH_HEADER = "X-Solution-Sha256"
+    INFLIGHT_DIR = "inflight"
+    # Names of the claim directories of the publishers of this process
+    live_claims: Set[str] = set()
+
+    def __init__(
+        self,
+        endpoint: str = Data.LEADERBOARD_ENDPOINT,
+        queue_dir: str = Data.PUBLISH_QUEUE_DIR,
+        verbose: bool = True,
+        uploaded_record: Optional[str] = Data.UPLOADED_RECORD_PATH,
+    ):
+        self.endpoint = endpoint
+        self.queue_dir = queue_dir
+        self.verbose = verbose
+        self.uploaded_record = uploaded_record
+        os.makedirs(self.queue_dir, exist_ok=True)
+        # The process id identifies the owner of the claims, the suffix the publisher
+        claim_name = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.claim_dir = os.path.join(self.queue_dir, self.INFLIGHT_DIR, claim_name)
+        os.makedirs(self.claim_dir)
+        self.live_claims.add(claim_name)
+        # Number of submissions sent with and without their zip
+        self.stats = {"uploads": 0, "hash_only": 0}
+
+        # Imported here so that requests is only loaded when a score is published
+        import requests
+
+        self.session = requests.Session()
+        self.session.headers.update(
+            {
+                "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.12; \
+                            rv:55.0) Gecko/20100101 Firefox/55.0"
+            }
+        )
+
+        # Submissions of this process that haven't been tried yet
+        self.unattempted = set()
+        self.condition = threading.Condition()
+        self.stopped = False
+        # Whether the submissions are held back, see pause
+        self.paused = False
+
+        self.thread = threading.Thread(target=self.worker, daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def submit(
+        self,
+        team_code: str,
+        zip_file_path: str,
+        forward_laptime: float,
+        backward_laptime: float,
+        solution_hash: Optional[str] = None,
+    ) -> str:
+        """
+        Add a submission to the queue and wake up the background worker
+
+        Parameters
+        ----------
+        team_code : str
+            The 9-digit team code
+        zip_file_path : str
+            Path to the zip file containing the solution
+        forward_laptime : float
+            Time taken to finish the track by moving in the track's forward direction.
+        backward_laptime : float
+            Time taken to finish the track by moving in the track's backward direction.
+        solution_hash : str, optional
+            SHA-256 of the zip file if it is already known, computed otherwise
+
+        Returns
+        -------
+        str
+            The id of the submission in the queue
+        """
+        from .utils import hash_file
+
+        submission_id = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        # The entry is written in the publisher's claim directory and only moved
+        # to the queue once complete, so that a failed copy leaves nothing behind
+        entry_dir = os.path.join(self.claim_dir, submission_id)
+        os.makedirs(entry_dir)
+        try:
+            # Keep a copy of the solution so the submission can still be sent
+            # if the original zip changes or disappears before it is delivered
+            shutil.copyfile(zip_file_path, os.path.join(entry_dir, "solution.zip"))
+            if solution_hash is None:
+                solution_hash = hash_file(zip_file_path)
+            self.write_entry(
+                entry_dir,
+                {
+                    "data": {
+                        "team_9digit_code": team_code,
+                        "forward_laptime": forward_laptime,
+                        "backward_laptime": backward_laptime,
+                    },
+                    "solution_hash": solution_hash,
+                    "attempts": 0,
+                    "next_attempt": 0,
+                },
+            )
+            self.release(submission_id)
+        except BaseException:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            raise
+
+        with self.condition:
+            self.unattempted.add(submission_id)
+            self.condition.notify_all()
+        return submission_id
+
+    def pending(self) -> List[str]:
+        """
+        Lists the submissions that haven't been delivered yet, oldest first
+
+        Returns
+        -------
+        list
+            Ids of the pending submissions
+        """
+        return sorted(
+            name
+            for name in os.listdir(self.queue_dir)
+            if os.path.isfile(os.path.join(self.queue_dir, name, "submission.json"))
+        )
+
+    @staticmethod
+    def read_entry(entry_dir: str) -> dict:
+        """
+        Reads the submission's metadata file
+
+        Parameters
+        ----------
+        entry_dir : str
+            Directory of the submission in the queue
+
+        Returns
+        -------
+        dict
+            The submission's metadata
+        """
+        with open(os.path.join(entry_dir, "submission.json"), encoding="utf-8") as file:
+            return json.load(file)
+
+    @staticmethod
+    def write_entry(entry_dir: str, entry: dict) -> None:
+        """
+        Atomically writes the submission's metadata file
+
+        Parameters
+        ----------
+        entry_dir : str
+            Directory of the submission in the queue
+        entry : dict
+            The submission's metadata
+        """
+        tmp_path = os.path.join(entry_dir, "submission.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(entry, file)
+        os.replace(tmp_path, os.path.join(entry_dir, "submission.json"))
+
+    def uploaded(self) -> Dict[str, float]:
+        """
+        The solutions the endpoint is known to have stored
+
+        Returns
+        -------
+        dict
+            Time of the upload of each solution, by SHA-256
+        """
+        if self.uploaded_record is None or not os.path.isfile(self.uploaded_record):
+            return {}
+        try:
+            with open(self.uploaded_record, encoding="utf-8") as file:
+                return json.load(file).get(self.endpoint, {})
+        except ValueError:
+            return {}
+
+    def set_uploaded(self, solution_hash: str, uploaded: bool) -> None:
+        """
+        Adds or removes a solution from the uploaded record of the endpoint
+
+        Parameters
+        ----------
+        solution_hash : str
+            SHA-256 of the solution
+        uploaded : bool
+            Whether the endpoint has stored the solution
+        """
+        if self.uploaded_record is None:
+            return
+        record = {}
+        if os.path.isfile(self.uploaded_record):
+            try:
+                with open(self.uploaded_record, encoding="utf-8") as file:
+                    record = json.load(file)
+            except ValueError:
+                pass
+        hashes = record.setdefault(self.endpoint, {})
+        if uploaded:
+            hashes[solution_hash] = time.time()
+        else:
+            hashes.pop(solution_hash, None)
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.uploaded_record)), exist_ok=True)
+        tmp_path = f"{self.uploaded_record}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(record, file)
+        os.replace(tmp_path, self.uploaded_record)
+
+    def post(self, **kwargs) -> Optional["requests.Response"]:
+        """
+        Posts to the leaderboard
+
+        Parameters
+        ----------
+        **kwargs
+            The arguments of requests.Session.post besides the url
+
+        Returns
+        -------
+        requests.Response or None
+            The response, None if the request failed because of the network
+        """
+        import requests
+
+        try:
+            return self.session.post(
+                url=self.endpoint, timeout=Data.PUBLISH_TIMEOUT, **kwargs
+            )
+        except requests.exceptions.RequestException:
+            return None
+
+    def send(self, entry_dir: str, entry: dict) -> Optional[bool]:
+        """
+        Sends a single submission to the leaderboard
+
+        Parameters
+        ----------
+        entry_dir : str
+            Directory of the submission in the queue
+        entry : dict
+            The submission's metadata
+
+        Returns
+        -------
+        bool or None
+            True if the score was published, False if the server rejected it
+            and None if it should be retried later
+        """
+        fields = {key: str(value) for key, value in entry["data"].items()}
+        # Entries queued by older versions of the judge have no hash
+        solution_hash = entry.get("solution_hash")
+        if solution_hash is not None:
+            fields["solution_sha256"] = solution_hash
+
+        response = None
+        if solution_hash is not None and solution_hash in self.uploaded():
+            response = self.post(data=fields)
+            if response is None:
+                return None
+            if response.status_code == 412:
+                # The server doesn't have the solution anymore, upload it again
+                self.set_uploaded(solution_hash, False)
+                response = None
+            else:
+                self.stats["hash_only"] += 1
+
+        if response is None:
+            body = MultipartStream(
+                fields, "solution_code", os.path.join(entry_dir, "solution.zip")
+            )
+            response = self.post(data=body, headers={"Content-Type": body.content_type})
+            if response is None:
+                return None
+            self.stats["uploads"] += 1
+            if response.status_code == 200 and solution_hash is not None:
+                if response.headers.get(self.HASH_HEADER) == solution_hash:
+                    self.set_uploaded(solution_hash, True)
+
+        if response.status_code == 200:
+            return True
+        if response.status_code >= 500:
+            return None
+        if self.verbose:
+            print("Submission Failure, ", response.text)
+        return False
+
+    def process(self, submission_id: str) -> float:
+        """
+        Tries to deliver a submission if it is due and updates the queue accordingly
+
+        Parameters
+        ----------
+        submission_id : str
+            Id of the submission in the queue
+
+        Returns
+        -------
+        float
+            The time at which this submission should be tried again, 0 if it is done
+        """
+        queued_dir = os.path.join(self.queue_dir, submission_id)
+        entry = self.read_entry(queued_dir)
+        if entry["next_attempt"] > time.time():
+            return entry["next_attempt"]
+
+        entry_dir = os.path.join(self.claim_dir, submission_id)
+        try:
+            os.rename(queued_dir, entry_dir)
+        except FileNotFoundError:
+            # Another publisher claimed it first
+            return 0
+        try:
+            # It may have been retried by another publisher since it was read
+            entry = self.read_entry(entry_dir)
+            if entry["next_attempt"] > time.time():
+                self.release(submission_id)
+                return entry["next_attempt"]
+            status = self.send(entry_dir, entry)
+        except BaseException:
+            if os.path.isdir(entry_dir):
+                self.release(submission_id)
+            raise
+
+        if status is None:
+            backoff = min(
+                Data.PUBLISH_RETRY_BACKOFF * 2 ** entry["attempts"],
+                Data.PUBLISH_RETRY_MAX_BACKOFF,
+            )
+            entry["attempts"] += 1
+            entry["next_attempt"] = time.time() + backoff
+            self.write_entry(entry_dir, entry)
+            self.release(submission_id)
+            if self.verbose and entry["attempts"] == 1:
+                print(
+                    "Something went wrong! \nYour score hasn't been submitted yet, "
+                    "it will be retried automatically, please check your internet connection."
+                )
+            return entry["next_attempt"]
+
+        if status and self.verbose:
+            print("Your score has been published on the leaderboard successfully!")
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        return 0
+
+    def release(self, submission_id: str) -> None:
+        """
+        Moves a claimed submission back to the queue
+
+        Parameters
+        ----------
+        submission_id : str
+            Id of the submission in the queue
+        """
+        os.rename(
+            os.path.join(self.claim_dir, submission_id),
+            os.path.join(self.queue_dir, submission_id),
+        )
+
+    def reclaim_stale(self) -> None:
+        """
+        Moves the submissions claimed by publishers whose process died back to the queue
+        """
+        from .utils import pid_alive
+
+        inflight_dir = os.path.join(self.queue_dir, self.INFLIGHT_DIR)
+        for claim_name in os.listdir(inflight_dir):
+            try:
+                pid = int(claim_name.partition("-")[0])
+            except ValueError:
+                continue
+            if claim_name in self.live_claims or (pid != os.getpid() and pid_alive(pid)):
+                continue
+            # A publisher that died, or of an earlier process that had the same id
+            claim_dir = os.path.join(inflight_dir, claim_name)
+            try:
+                for submission_id in os.listdir(claim_dir):
+                    entry_dir = os.path.join(claim_dir, submission_id)
+                    if os.path.isfile(os.path.join(entry_dir, "submission.json")):
+                        os.rename(entry_dir, os.path.join(self.queue_dir, submission_id))
+                    else:
+                        # Its process died while queuing it
+                        shutil.rmtree(entry_dir, ignore_errors=True)
+                os.rmdir(claim_dir)
+            except OSError:
+                # Being reclaimed by another publisher
+                pass
+
+    def worker(self) -> None:
+        """
+        Loop of the background thread delivering the pending submissions
+        """
+        while not self.stopped:
+            try:
+                self.reclaim_stale()
+            except OSError:
+                pass
+            next_wakeup = time.time() + Data.PUBLISH_RETRY_MAX_BACKOFF
+            for submission_id in self.pending():
+                with self.condition:
+                    self.condition.wait_for(lambda: self.stopped or not self.paused)
+                if self.stopped:
+                    return
+                try:
+                    retry_at = self.process(submission_id)
+                except (OSError, ValueError, KeyError):
+                    # The entry is being written or is corrupted, look at it later
+                    retry_at = time.time() + Data.PUBLISH_RETRY_BACKOFF
+                if retry_at:
+                    next_wakeup = min(next_wakeup, retry_at)
+
+                with self.condition:
+                    self.unattempted.discard(submission_id)
+                    self.condition.notify_all()
+
+            with self.condition:
+                if not self.stopped and not self.unattempted:
+                    self.condition.wait(max(0, next_wakeup - time.time()))
+
+    def pause(self) -> None:
+        """
+        Holds back the submissions until resume is called, e.g. during low-jitter laps,
+        the upload in progress is finished
+        """
+        with self.condition:
+            self.paused = True
+
+    def resume(self) -> None:
+        """
+        Delivers the submissions again
+        """
+        with self.condition:
+            self.paused = False
+            self.condition.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until every submission of this process has been tried at least once
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Maximum number of seconds to wait, waits forever by default
+
+        Returns
+        -------
+        bool
+            Whether all the submissions have been tried before the timeout
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.unattempted, timeout)
+
+    def close(self, timeout: Optional[float] = Data.PUBLISH_FLUSH_TIMEOUT) -> None:
+        """
+        Waits a little for the submissions in flight and stops the background thread.
+        Undelivered submissions stay on disk and are retried by the next publisher.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Maximum number of seconds to wait for the submissions not tried yet,
+            default is Data.PUBLISH_FLUSH_TIMEOUT. None waits for all of them.
+        """
+        if self.stopped:
+            return
+        if not self.flush(timeout) and self.verbose:
+            print(
+                "Your score hasn't been submitted yet, "
+                "it will be sent the next time you run the judge."
+            )
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        self.thread.join(timeout=1)
+        self.session.close()
+        atexit.unregister(self.close)
+        if not self.thread.is_alive():
+            # Nothing is being sent anymore, the directory is empty
+            try:
+                os.rmdir(self.claim_dir)
+            except OSError:
+                pass
+            self.live_claims.discard(os.path.basename(self.claim_dir))
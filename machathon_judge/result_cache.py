@@ -0,0 +1,226 @@
+"""
+Module containing the ResultCache class to reuse the lap times of evaluations
+that were already run with the same solution, seed, scene and parameters
+"""
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from .data import Data
+
+
+class ResultCache:
+    """
+    Class to store the lap times of the evaluations by their key in a SQLite database
+
+    The entries older than the time-to-live are dropped, and once there are more
+    than max_entries the least recently used ones are evicted.
+
+    Parameters
+    ----------
+    db_path: str, default=Data.RESULT_CACHE_PATH
+        Path to the SQLite database, it is created if it doesn't exist
+    max_entries: int, default=Data.RESULT_CACHE_MAX_ENTRIES
+        Maximum number of results kept
+    ttl: float, optional, default=Data.RESULT_CACHE_TTL
+        Seconds a result stays valid after it was measured, None keeps it forever
+    """
+
+    # The Data parameters that change the outcome of an evaluation
+    KEY_PARAMS = (
+        "FORWARD_TRACK",
+        "BACKWARD_TRACK",
+        "FTRACK_STARTING_POSITION",
+        "FTRACK_STARTING_ORIENTATION",
+        "BTRACK_STARTING_POSITION",
+        "BTRACK_STARTING_ORIENTATION",
+        "TIMEOUT_DURATION",
+        "CHECKPOINT_PORTS",
+    )
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS results (
+            key TEXT PRIMARY KEY,
+            solution_hash TEXT NOT NULL,
+            seed INTEGER NOT NULL,
+            forward_laptime REAL NOT NULL,
+            backward_laptime REAL NOT NULL,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS results_by_use ON results (last_used_at);
+    """
+
+    def __init__(
+        self,
+        db_path: str = Data.RESULT_CACHE_PATH,
+        max_entries: int = Data.RESULT_CACHE_MAX_ENTRIES,
+        ttl: Optional[float] = Data.RESULT_CACHE_TTL,
+    ):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.lock, self.connection:
+            self.connection.executescript(self.SCHEMA)
+
+    @classmethod
+    def make_key(
+        cls,
+        solution_hash: str,
+        seed: int,
+        scene: str,
+        data: Data,
+        options: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """
+        Identifies an evaluation
+
+        Parameters
+        ----------
+        solution_hash : str
+            SHA-256 of the solution's zip file
+        seed : int
+            The seed choosing the starting direction of the track
+        scene : str
+            Identifier of the CoppeliaSim scene, e.g. the hash of the .ttt file
+        data : Data
+            The parameters of the judge
+        options : dict, optional
+            The settings of the run changing its outcome, e.g. the number of laps
+            and whether the hook is synchronized with the simulation steps
+
+        Returns
+        -------
+        str
+            The hex digest of the key
+        """
+        params = {name: getattr(data, name) for name in cls.KEY_PARAMS}
+        description = json.dumps(
+            {
+                "solution": solution_hash,
+                "seed": seed,
+                "scene": scene,
+                "params": params,
+                "options": options or {},
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(description.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[float, float]]:
+        """
+        Looks up the result of an evaluation
+
+        Parameters
+        ----------
+        key : str
+            The key from make_key
+
+        Returns
+        -------
+        tuple or None
+            (forward_laptime, backward_laptime), None if it isn't cached or expired
+        """
+        now = time.time()
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT forward_laptime, backward_laptime, created_at FROM results WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            if self.ttl is not None and now - row[2] > self.ttl:
+                self.connection.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None
+            self.connection.execute(
+                "UPDATE results SET last_used_at = ? WHERE key = ?", (now, key)
+            )
+        return row[0], row[1]
+
+    def put(
+        self,
+        key: str,
+        solution_hash: str,
+        seed: int,
+        forward_laptime: float,
+        backward_laptime: float,
+    ) -> None:
+        """
+        Stores the result of an evaluation and evicts the stale entries
+
+        Parameters
+        ----------
+        key : str
+            The key from make_key
+        solution_hash : str
+            SHA-256 of the solution's zip file
+        seed : int
+            The seed of the evaluation
+        forward_laptime : float
+            Time taken to finish the track by moving in the track's forward direction.
+        backward_laptime : float
+            Time taken to finish the track by moving in the track's backward direction.
+        """
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, solution_hash, seed, forward_laptime, backward_laptime, now, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        if self.ttl is not None:
+            self.connection.execute(
+                "DELETE FROM results WHERE created_at < ?", (now - self.ttl,)
+            )
+        self.connection.execute(
+            "DELETE FROM results WHERE key IN ("
+            "SELECT key FROM results ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def invalidate(self, solution_hash: Optional[str] = None) -> int:
+        """
+        Removes the results of a solution, or all of them
+
+        Parameters
+        ----------
+        solution_hash : str, optional
+            SHA-256 of the solution, default is every solution
+
+        Returns
+        -------
+        int
+            The number of removed results
+        """
+        with self.lock, self.connection:
+            if solution_hash is None:
+                cursor = self.connection.execute("DELETE FROM results")
+            else:
+                cursor = self.connection.execute(
+                    "DELETE FROM results WHERE solution_hash = ?", (solution_hash,)
+                )
+        return cursor.rowcount
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self) -> None:
+        """
+        Closes the connection to the database
+        """
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,296 @@
+"""
+Module containing the ResultsStore class to keep the history of the lap times
+in a local SQLite database and query it
+
+It can also be used from the command line, for example:
+
+    python -m machathon_judge.results_store summary --team 123456789
+"""
+import os
+import json
+import math
+import sqlite3
+import argparse
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .data import Data
+
+
+@dataclass
+class LapRecord:
+    """
+    A single lap time measured by the judge
+    """
+
+    team_code: str
+    solution_hash: Optional[str]
+    direction: str  # "forward" or "backward"
+    lap_time: float
+    seed: Optional[int]
+    started_at: float  # Unix timestamps
+    finished_at: float
+    profile: Dict = field(default_factory=dict)
+    sectors: List[float] = field(default_factory=list)  # seconds between the checkpoints
+
+
+class ResultsStore:
+    """
+    Class to store the lap times in an embedded SQLite database
+
+    The database is opened in WAL mode, so several judge processes evaluating
+    in parallel can write to the same file while others are reading it.
+
+    Parameters
+    ----------
+    db_path: str, default=Data.RESULTS_DB_PATH
+        Path to the SQLite database, it is created if it doesn't exist
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS laps (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            team_code TEXT NOT NULL,
+            solution_hash TEXT,
+            direction TEXT NOT NULL,
+            lap_time REAL NOT NULL,
+            seed INTEGER,
+            started_at REAL NOT NULL,
+            finished_at REAL NOT NULL,
+            profile TEXT,
+            sectors TEXT
+        );
+        CREATE INDEX IF NOT EXISTS laps_by_team
+            ON laps (team_code, direction, lap_time);
+        CREATE INDEX IF NOT EXISTS laps_by_solution
+            ON laps (solution_hash, direction, lap_time);
+    """
+
+    def __init__(self, db_path: str = Data.RESULTS_DB_PATH):
+        self.db_path = db_path
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            db_path, timeout=30, check_same_thread=False
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.lock, self.connection:
+            self.connection.executescript(self.SCHEMA)
+            # Databases created before the sector splits were recorded
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(laps)")]
+            if "sectors" not in columns:
+                self.connection.execute("ALTER TABLE laps ADD COLUMN sectors TEXT")
+
+    def add_lap(self, record: LapRecord) -> None:
+        """
+        Stores a single lap
+
+        Parameters
+        ----------
+        record : LapRecord
+            The lap to store
+        """
+        self.add_laps([record])
+
+    def add_laps(self, records: Iterable[LapRecord]) -> None:
+        """
+        Stores many laps in a single transaction
+
+        Parameters
+        ----------
+        records : iterable of LapRecord
+            The laps to store, e.g. the results of parallel evaluations
+        """
+        rows = [
+            (
+                record.team_code,
+                record.solution_hash,
+                record.direction,
+                record.lap_time,
+                record.seed,
+                record.started_at,
+                record.finished_at,
+                json.dumps(record.profile) if record.profile else None,
+                json.dumps(record.sectors) if record.sectors else None,
+            )
+            for record in records
+        ]
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT INTO laps (team_code, solution_hash, direction, lap_time, "
+                "seed, started_at, finished_at, profile, sectors) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    @staticmethod
+    def _where(
+        team_code: Optional[str], solution_hash: Optional[str], direction: Optional[str]
+    ) -> Tuple[str, list]:
+        conditions, params = [], []
+        for column, value in (
+            ("team_code", team_code),
+            ("solution_hash", solution_hash),
+            ("direction", direction),
+        ):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        return where, params
+
+    def lap_times(
+        self,
+        team_code: Optional[str] = None,
+        solution_hash: Optional[str] = None,
+        direction: Optional[str] = None,
+    ) -> List[float]:
+        """
+        Fetches the lap times matching the filters, sorted from the fastest
+
+        Parameters
+        ----------
+        team_code : str, optional
+            Only keep the laps of this team
+        solution_hash : str, optional
+            Only keep the laps of this solution
+        direction : str, optional
+            Only keep the laps in this direction, "forward" or "backward"
+
+        Returns
+        -------
+        list
+            The matching lap times in seconds
+        """
+        where, params = self._where(team_code, solution_hash, direction)
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT lap_time FROM laps{where} ORDER BY lap_time", params
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def best_lap(
+        self,
+        team_code: Optional[str] = None,
+        solution_hash: Optional[str] = None,
+        direction: Optional[str] = None,
+    ) -> Optional[float]:
+        """
+        The fastest lap matching the filters of `lap_times`, None if there is none
+        """
+        where, params = self._where(team_code, solution_hash, direction)
+        with self.lock:
+            return self.connection.execute(
+                f"SELECT MIN(lap_time) FROM laps{where}", params
+            ).fetchone()[0]
+
+    def mean_lap(
+        self,
+        team_code: Optional[str] = None,
+        solution_hash: Optional[str] = None,
+        direction: Optional[str] = None,
+    ) -> Optional[float]:
+        """
+        The mean lap time matching the filters of `lap_times`, None if there is none
+        """
+        where, params = self._where(team_code, solution_hash, direction)
+        with self.lock:
+            return self.connection.execute(
+                f"SELECT AVG(lap_time) FROM laps{where}", params
+            ).fetchone()[0]
+
+    def percentile_lap(self, percentile: float, **filters) -> Optional[float]:
+        """
+        The lap time at the given percentile, linearly interpolated between laps
+
+        Parameters
+        ----------
+        percentile : float
+            The percentile between 0 and 100
+        **filters
+            The filters of `lap_times`
+
+        Returns
+        -------
+        float or None
+            The lap time in seconds, None if no lap matches the filters
+        """
+        return self._percentile(self.lap_times(**filters), percentile)
+
+    def summary(self, **filters) -> Dict[str, Optional[float]]:
+        """
+        Count, best, mean, median and 90th percentile of the laps matching the filters of `lap_times`
+        """
+        times = self.lap_times(**filters)
+        return {
+            "count": len(times),
+            "best": times[0] if times else None,
+            "mean": sum(times) / len(times) if times else None,
+            "p50": self._percentile(times, 50),
+            "p90": self._percentile(times, 90),
+        }
+
+    @staticmethod
+    def _percentile(sorted_times: List[float], percentile: float) -> Optional[float]:
+        if not sorted_times:
+            return None
+        rank = (len(sorted_times) - 1) * percentile / 100
+        low, high = math.floor(rank), math.ceil(rank)
+        return sorted_times[low] + (sorted_times[high] - sorted_times[low]) * (
+            rank - low
+        )
+
+    def close(self) -> None:
+        """
+        Closes the connection to the database
+        """
+        with self.lock:
+            self.connection.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Command line interface to query the lap history
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m machathon_judge.results_store",
+        description="Query the lap times recorded by the judge",
+    )
+    parser.add_argument(
+        "query", choices=["best", "mean", "percentile", "summary"], help="Statistic to compute"
+    )
+    parser.add_argument("--db", default=Data.RESULTS_DB_PATH, help="Path to the database")
+    parser.add_argument("--team", dest="team_code", help="Filter by team code")
+    parser.add_argument("--solution", dest="solution_hash", help="Filter by solution hash")
+    parser.add_argument(
+        "--direction", choices=["forward", "backward"], help="Filter by track direction"
+    )
+    parser.add_argument(
+        "-q", "--percentile", type=float, default=50, help="Percentile for the percentile query"
+    )
+    args = parser.parse_args(argv)
+
+    store = ResultsStore(args.db)
+    filters = {
+        "team_code": args.team_code,
+        "solution_hash": args.solution_hash,
+        "direction": args.direction,
+    }
+    if args.query == "best":
+        print(store.best_lap(**filters))
+    elif args.query == "mean":
+        print(store.mean_lap(**filters))
+    elif args.query == "percentile":
+        print(store.percentile_lap(args.percentile, **filters))
+    else:
+        for key, value in store.summary(**filters).items():
+            print(f"{key}: {value}")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,46 @@
 """
 Simulator class as an interface to the Coppelia remote API
 """
-from typing import Tuple, List
+import time
+from typing import TYPE_CHECKING, Optional, Tuple, List
 
-import numpy as np
-from .zmqRemoteApi import RemoteAPIClient
+from .data import Data
+from .utils import wait_until
 
-# pylint: disable=no-member
+if TYPE_CHECKING:
+    import numpy as np
+
+    from .frame_ring import FrameRing
+    from .preprocessing import ImagePipeline
+    from .state_subscriber import StateSubscriber
+
+# pylint: disable=no-member,import-outside-toplevel
 
 
 class Simulator:
     """
     Simulator class as an interface to the Coppelia remote API
+
+    Parameters
+    ----------
+    n_checkpoints: int, optional
+        Number of checkpoint objects /ckpt0, /ckpt1... in the scene,
+        one per port of Data.CHECKPOINT_PORTS by default
     """
 
-    def __init__(self):
-        self.client = RemoteAPIClient()
+    # Car parameters, shared with the kinematic backend
+    wheel_radius = 0.09
+    max_velocity = 40
+    max_steer_angle = 0.5236  # 30 degrees
+    motor_torque = 60
+
+    def __init__(self, n_checkpoints: Optional[int] = None):
+        # Imported here so that importing the package doesn't load zmq and cbor
+        from .zmqRemoteApi import RemoteAPIClient
+
+        # A stalled or restarted CoppeliaSim makes the calls fail after a few retries
+        # instead of hanging the judge
+        self.client = RemoteAPIClient(timeout=Data.RPC_TIMEOUT, retries=Data.RPC_RETRIES)
         self.sim = self.client.getObject("sim")
 
         # Fetch ids for each of the wheels
@@ -29,20 +54,26 @@ class Simulator:
             self.sim.getObject("/Manta/fl_brake_joint"),
         ]
 
-        self.checkpoints = [self.sim.getObject("/ckpt" + str(i)) for i in range(2)]
-
-        # Car parameters
-        self.wheel_radius = 0.09
-        self.max_velocity = 40
-        self.max_steer_angle = 0.5236  # 30 degrees
-        self.motor_torque = 60
+        # One checkpoint object in the scene per checkpoint websocket
+        if n_checkpoints is None:
+            n_checkpoints = len(Data.CHECKPOINT_PORTS)
+        self.checkpoints = [self.sim.getObject("/ckpt" + str(i)) for i in range(n_checkpoints)]
 
         self.steer_angle = 0
         self.motor_velocity = 0
+        # Last (steering, velocity) returned by get_state, None until it's called,
+        # and the time.monotonic() at which it was sampled
+        self.last_state = None
+        self.last_state_time = None
+        # Receiver of the state pushed by the scene, see subscribe_state
+        self.state_subscriber: Optional["StateSubscriber"] = None
+        self.state_max_age = Data.STATE_MAX_AGE
 
         # Fetch id for the camera
         self.camera_handle = self.sim.getObject("/Manta/Camera")
         self.camera_resolution = 640, 480
+        # Ring the fetched frames are shared into, see publish_frames
+        self.frame_ring = None
 
     def start(self) -> None:
         """
@@ -58,6 +89,60 @@ class Simulator:
         """
         self.sim.stopSimulation()
 
+    def is_running(self) -> bool:
+        """
+        Checks whether the simulation is advancing
+
+        Returns
+        -------
+        bool
+            True if the simulation is running
+        """
+        return bool(self.sim.getSimulationState() & self.sim.simulation_advancing)
+
+    def is_stopped(self) -> bool:
+        """
+        Checks whether the simulation is completely stopped
+
+        Returns
+        -------
+        bool
+            True if the simulation is stopped
+        """
+        return self.sim.getSimulationState() == self.sim.simulation_stopped
+
+    def wait_until_stopped(self, timeout: float = Data.READY_TIMEOUT) -> float:
+        """
+        Waits until the simulation has stopped
+
+        Parameters
+        ----------
+        timeout : float, default=Data.READY_TIMEOUT
+            Maximum number of seconds to wait
+
+        Returns
+        -------
+        float
+            The number of seconds it took to stop
+        """
+        return wait_until(self.is_stopped, timeout, "the simulation to stop")
+
+    def wait_until_running(self, timeout: float = Data.READY_TIMEOUT) -> float:
+        """
+        Waits until the simulation is running
+
+        Parameters
+        ----------
+        timeout : float, default=Data.READY_TIMEOUT
+            Maximum number of seconds to wait
+
+        Returns
+        -------
+        float
+            The number of seconds it took to start
+        """
+        return wait_until(self.is_running, timeout, "the simulation to start")
+
     def set_car_velocity(self, velocity: float) -> None:
         """
         Send a velocity command to the car
@@ -85,31 +170,108 @@ class Simulator:
         steering : float
             Steering angle of the car in radians
         """
-        steering = np.clip(steering, -self.max_steer_angle, self.max_steer_angle)
+        steering = min(max(steering, -self.max_steer_angle), self.max_steer_angle)
         if steering != self.steer_angle:
             self.steer_angle = steering
             self.sim.setJointTargetPosition(self.steer_handle, steering)
 
-    def get_image(self) -> np.ndarray:
+    def get_image(self, pipeline: Optional["ImagePipeline"] = None) -> "np.ndarray":
         """
         Get the image from the camera
+
+        Parameters
+        ----------
+        pipeline : ImagePipeline, optional
+            Preprocessing applied in a single pass to the raw image, instead of un-flipping it.
+            The returned image is then the pipeline's reusable output buffer.
+
         Returns
         -------
-        np.ndarray, shape = (640, 480, 3)
-            Image from the camera
+        np.ndarray, shape = (480, 640, 3)
+            Image from the camera, or the output of the pipeline
         """
-        image, _ = self.sim.getVisionSensorImg(self.camera_handle)
-        # This is necessary to handle compatibility issues between different versions of libraries,
-        # which may produce images in different data types.
-        if isinstance(image, str):
-            image = bytes(image, "ascii")
-        image = np.frombuffer(image, dtype=np.uint8)
+        import numpy as np
+
+        image = self.get_raw_image()
+        if self.frame_ring is not None:
+            self.frame_ring.publish(image)
+        if pipeline is not None:
+            return pipeline(image, self.camera_resolution)
         image = image.reshape((self.camera_resolution[1], self.camera_resolution[0], 3))
         image = np.flip(
             image, 1
         )  # Image is reflected along the x-axis (width), so unreflected it
         return image
 
+    def get_raw_image(self) -> "np.ndarray":
+        """
+        Get the image from the camera the way the vision sensor sends it
+
+        Returns
+        -------
+        np.ndarray, shape = (480 * 640 * 3,)
+            Flat uint8 buffer of the image, reflected along its width
+        """
+        import numpy as np
+
+        # The image is decoded as a view into the received frame, it isn't copied
+        image, _ = self.client.call("sim.getVisionSensorImg", [self.camera_handle], view=True)
+        # This is necessary to handle compatibility issues between different versions of libraries,
+        # which may produce images in different data types.
+        if isinstance(image, str):
+            image = bytes(image, "ascii")
+        return np.frombuffer(image, dtype=np.uint8)
+
+    def wait_for_step(self, timeout: Optional[float] = None) -> Optional[int]:
+        """
+        Waits for the simulation to advance, i.e. for new camera frames and states
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Maximum number of seconds to wait, forever by default
+
+        Returns
+        -------
+        int or None
+            The step count, None if the simulation didn't advance within the timeout.
+            Returns immediately if a step happened since the previous call.
+        """
+        return self.client.waitForStep(timeout)
+
+    def publish_frames(
+        self, name: str = Data.FRAME_RING_NAME, n_slots: int = Data.FRAME_RING_SLOTS
+    ) -> "FrameRing":
+        """
+        Shares every frame fetched by get_image with the other local processes,
+        which can read them with FrameRing.attach(name) without calling the simulator
+
+        Parameters
+        ----------
+        name : str, default=Data.FRAME_RING_NAME
+            Name of the shared-memory ring
+        n_slots : int, default=Data.FRAME_RING_SLOTS
+            Number of frames kept in the ring
+
+        Returns
+        -------
+        FrameRing
+            The ring the frames are published into
+        """
+        from .frame_ring import FrameRing
+
+        self.close_frames()
+        self.frame_ring = FrameRing.create(name, self.camera_resolution, n_slots)
+        return self.frame_ring
+
+    def close_frames(self) -> None:
+        """
+        Stops sharing the frames and destroys the ring
+        """
+        if self.frame_ring is not None:
+            self.frame_ring.close()
+            self.frame_ring = None
+
     def get_state(self) -> Tuple[float, float]:
         """
         Gets the current state of the car
@@ -121,6 +283,10 @@ class Simulator:
         linear_velocity : float
             Current linear velocity of the car in m/s
         """
+        state = self.pushed_state()
+        if state is not None:
+            return state
+
         current_steering = self.sim.getJointPosition(self.steer_handle)
 
         bl_wheel_velocity = self.sim.getObjectFloatParam(
@@ -131,8 +297,121 @@ class Simulator:
         )
         rear_wheel_velocity = (bl_wheel_velocity + br_wheel_velocity) / 2
         linear_velocity = rear_wheel_velocity * self.wheel_radius
+        self.last_state = current_steering, linear_velocity
+        self.last_state_time = time.monotonic()
         return current_steering, linear_velocity
 
+    def pushed_state(self) -> Optional[Tuple[float, float]]:
+        """
+        The state pushed by the scene, see subscribe_state
+
+        Returns
+        -------
+        tuple or None
+            The steering angle in radians and linear velocity in m/s of the car,
+            None if the state isn't subscribed or the latest sample is too old
+        """
+        if self.state_subscriber is None:
+            return None
+        state = self.state_subscriber.fresh_state(self.state_max_age)
+        if state is None:
+            return None
+        rear_wheel_velocity = (state.bl_wheel_velocity + state.br_wheel_velocity) / 2
+        self.last_state = state.steering, rear_wheel_velocity * self.wheel_radius
+        self.last_state_time = state.received_at
+        return self.last_state
+
+    def known_state(self) -> Optional[Tuple[float, float]]:
+        """
+        The state of the car if it is known without a remote API call
+
+        Returns
+        -------
+        tuple or None
+            The steering angle in radians and linear velocity in m/s of the car pushed by
+            the scene, or else returned by the last get_state if it isn't older than
+            state_max_age, None if the state is unknown
+        """
+        state = self.pushed_state()
+        if state is not None:
+            return state
+        if self.last_state is None or time.monotonic() - self.last_state_time > self.state_max_age:
+            return None
+        return self.last_state
+
+    def subscribe_state(
+        self,
+        port: int = Data.STATE_PORT,
+        max_age: float = Data.STATE_MAX_AGE,
+        timeout: float = Data.READY_TIMEOUT,
+    ) -> bool:
+        """
+        Installs a helper script in the scene that publishes the car's state every simulation
+        step, so that get_state reads the latest sample locally instead of calling CoppeliaSim.
+        get_state falls back to the remote API calls when the sample is older than max_age.
+        The simulation must be running.
+
+        Parameters
+        ----------
+        port : int, default=Data.STATE_PORT
+            Port the helper script publishes on
+        max_age : float, default=Data.STATE_MAX_AGE
+            Maximum age in seconds of a sample returned by get_state
+        timeout : float, default=Data.READY_TIMEOUT
+            Maximum number of seconds to wait for the first sample
+
+        Returns
+        -------
+        bool
+            Whether the samples are received, get_state keeps using the remote API otherwise
+        """
+        from .state_subscriber import StateSubscriber
+
+        self.unsubscribe_state()
+        subscriber = StateSubscriber(port=port)
+        subscriber.start()
+        subscriber.install(self)
+        if not subscriber.wait_first_sample(timeout):
+            subscriber.uninstall(self)
+            subscriber.stop()
+            return False
+        self.state_subscriber = subscriber
+        self.state_max_age = max_age
+        return True
+
+    def unsubscribe_state(self) -> None:
+        """
+        Removes the helper script and goes back to pulling the state with the remote API
+        """
+        if self.state_subscriber is not None:
+            self.state_subscriber.uninstall(self)
+            self.state_subscriber.stop()
+            self.state_subscriber = None
+
+    def get_car_position(self) -> List[float]:
+        """
+        Gets the position of the car in the world
+
+        Returns
+        -------
+        list
+            The X, Y, Z location of the car
+        """
+        if self.state_subscriber is not None:
+            state = self.state_subscriber.fresh_state(self.state_max_age)
+            if state is not None:
+                return list(state.position)
+        return self.sim.getObjectPosition(self.car_handle, self.sim.handle_world)
+
+    def stop_car(self) -> None:
+        """
+        Brings the car to a halt without restarting the simulation:
+        the commands are reset and the car's model loses its momentum
+        """
+        self.set_car_velocity(0)
+        self.set_car_steering(0)
+        self.sim.resetDynamicObject(self.car_handle | self.sim.handleflag_model)
+
     def reset_car_pose(self, position: List[float], orientation: List[float]):
         """
         Place the car in a specific position and orientation in the world.
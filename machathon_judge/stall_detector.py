@@ -0,0 +1,143 @@
+"""
+Module containing the StallDetector class to end a run early when the car is stuck,
+makes no progress or leaves the track
+"""
+from typing import TYPE_CHECKING, Optional, Sequence
+
+from .data import Data
+
+if TYPE_CHECKING:
+    from .simulator import Simulator
+
+
+class RunAbortedError(TimeoutError):
+    """
+    Raised when a run is ended before the timeout by the stall detection
+
+    Parameters
+    ----------
+    status: str
+        Why the run was aborted, one of StallDetector.STALLED, NO_PROGRESS or OFF_TRACK
+    message: str
+        Human readable description of the abort
+    """
+
+    def __init__(self, status: str, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class StallDetector:
+    """
+    Checks during a lap that the car is still making progress
+
+    The checks are only evaluated every check_interval seconds, so they cost a few
+    remote API calls per second whatever the FPS of the competitor's code.
+    Each check can be disabled by setting its parameter to None.
+
+    Parameters
+    ----------
+    min_velocity: float, default=Data.STALL_MIN_VELOCITY
+        Speed in m/s under which the car is considered stopped
+    stall_duration: float, optional, default=Data.STALL_DURATION
+        Seconds the car may stay stopped before the lap is aborted
+    checkpoint_budget: float, optional, default=Data.CHECKPOINT_BUDGET
+        Seconds allowed between the start of the lap or a checkpoint and the next checkpoint
+    track_bounds: tuple, optional
+        ((x_min, y_min, z_min), (x_max, y_max, z_max)) world box the car must stay in,
+        disabled by default
+    check_interval: float, default=Data.STALL_CHECK_INTERVAL
+        Seconds between two evaluations of the checks
+    """
+
+    STALLED = "stalled"
+    NO_PROGRESS = "no_progress"
+    OFF_TRACK = "off_track"
+
+    def __init__(
+        self,
+        min_velocity: float = Data.STALL_MIN_VELOCITY,
+        stall_duration: Optional[float] = Data.STALL_DURATION,
+        checkpoint_budget: Optional[float] = Data.CHECKPOINT_BUDGET,
+        track_bounds: Optional[Sequence[Sequence[float]]] = None,
+        check_interval: float = Data.STALL_CHECK_INTERVAL,
+    ):
+        self.min_velocity = min_velocity
+        self.stall_duration = stall_duration
+        self.checkpoint_budget = checkpoint_budget
+        self.track_bounds = track_bounds
+        self.check_interval = check_interval
+
+        self.last_progress = 0.0
+        self.last_moving = 0.0
+        self.next_check = 0.0
+
+    def reset(self, now: float) -> None:
+        """
+        Starts watching a new lap
+
+        Parameters
+        ----------
+        now : float
+            time.monotonic() at the start of the lap
+        """
+        self.last_progress = now
+        self.last_moving = now
+        self.next_check = now + self.check_interval
+
+    def progress(self, now: float) -> None:
+        """
+        Records that the car crossed a checkpoint
+
+        Parameters
+        ----------
+        now : float
+            time.monotonic() of the crossing
+        """
+        self.last_progress = now
+
+    def check(self, simulator: "Simulator", now: float) -> None:
+        """
+        Evaluates the checks if check_interval has elapsed since the previous evaluation
+
+        Parameters
+        ----------
+        simulator : Simulator
+            The simulator running the lap
+        now : float
+            The current time.monotonic()
+
+        Raises
+        ------
+        RunAbortedError
+            If the car is stopped, makes no progress or is off the track
+        """
+        if now < self.next_check:
+            return
+        self.next_check = now + self.check_interval
+
+        if self.checkpoint_budget is not None:
+            elapsed = now - self.last_progress
+            if elapsed > self.checkpoint_budget:
+                raise RunAbortedError(
+                    self.NO_PROGRESS, f"No checkpoint was crossed for {elapsed:.1f}s"
+                )
+
+        if self.stall_duration is not None:
+            _, velocity = simulator.get_state()
+            if abs(velocity) >= self.min_velocity:
+                self.last_moving = now
+            elif now - self.last_moving > self.stall_duration:
+                raise RunAbortedError(
+                    self.STALLED,
+                    f"The car has been stopped for {now - self.last_moving:.1f}s",
+                )
+
+        if self.track_bounds is not None:
+            position = simulator.get_car_position()
+            lower, upper = self.track_bounds
+            if not all(low <= value <= high for low, value, high in zip(lower, position, upper)):
+                raise RunAbortedError(
+                    self.OFF_TRACK,
+                    "The car left the track at ({:.2f}, {:.2f}, {:.2f})".format(*position),
+                )
@@ -0,0 +1,223 @@
+"""
+Module containing the StateSubscriber class to receive the car's state pushed by CoppeliaSim
+every simulation step, instead of pulling it with several remote API calls
+"""
+import time
+import struct
+import threading
+from typing import TYPE_CHECKING, NamedTuple, Optional, Tuple
+
+# pylint: disable=import-error
+import zmq
+
+from .data import Data
+
+if TYPE_CHECKING:
+    from .simulator import Simulator
+
+
+# Helper script installed in the scene, it publishes the state at the end of every step
+STATE_PUBLISHER_SCRIPT = """
+simZMQ = simZMQ or require('simZMQ')
+
+function sysCall_init()
+    context = simZMQ.ctx_new()
+    publisher = simZMQ.socket(context, simZMQ.PUB)
+    simZMQ.bind(publisher, 'tcp://*:%(port)d')
+    car = sim.getObject('/Manta')
+    steer = sim.getObject('/Manta/steer_joint')
+    rear_wheels = {sim.getObject('/Manta/bl_brake_joint'), sim.getObject('/Manta/br_brake_joint')}
+end
+
+function sysCall_sensing()
+    local position = sim.getObjectPosition(car, sim.handle_world)
+    local orientation = sim.getObjectOrientation(car, sim.handle_world)
+    simZMQ.send(publisher, sim.packDoubleTable({
+        sim.getSimulationTime(),
+        sim.getJointPosition(steer),
+        sim.getObjectFloatParam(rear_wheels[1], sim.jointfloatparam_velocity),
+        sim.getObjectFloatParam(rear_wheels[2], sim.jointfloatparam_velocity),
+        position[1], position[2], position[3],
+        orientation[1], orientation[2], orientation[3],
+    }), 0)
+end
+
+function sysCall_cleanup()
+    simZMQ.close(publisher)
+    simZMQ.ctx_term(context)
+end
+"""
+
+
+class CarState(NamedTuple):
+    """
+    A state of the car published by the helper script
+    """
+
+    simulation_time: float
+    steering: float  # radians
+    bl_wheel_velocity: float  # rad/s
+    br_wheel_velocity: float
+    position: Tuple[float, float, float]  # world frame
+    orientation: Tuple[float, float, float]  # euler angles
+    received_at: float  # time.monotonic() when the sample was received
+
+
+class StateSubscriber:
+    """
+    Class to keep the latest state of the car published by the helper script
+
+    A background thread receives the samples on a SUB socket and replaces the latest one,
+    reading it is a local attribute access.
+
+    Parameters
+    ----------
+    host: str, default="localhost"
+        Address of CoppeliaSim
+    port: int, default=Data.STATE_PORT
+        Port the helper script publishes on
+    """
+
+    # Simulation time, steering, 2 wheel velocities, position and orientation
+    SAMPLE = struct.Struct("<10d")
+
+    def __init__(self, host: str = "localhost", port: int = Data.STATE_PORT):
+        self.host = host
+        self.port = port
+        self.latest: Optional[CarState] = None
+        self.n_received = 0
+        self.script_handle = None
+
+        self.context = None
+        self.thread = None
+        self.stopped = threading.Event()
+        self.first_sample = threading.Event()
+
+    def install(self, simulator: "Simulator") -> None:
+        """
+        Adds the helper script to the scene
+
+        Parameters
+        ----------
+        simulator : Simulator
+            The simulator whose scene gets the script
+        """
+        sim = simulator.sim
+        code = STATE_PUBLISHER_SCRIPT % {"port": self.port}
+        if hasattr(sim, "createScript"):
+            # CoppeliaSim 4.6 and later
+            self.script_handle = sim.createScript(sim.scripttype_customization, code)
+            sim.setObjectParent(self.script_handle, simulator.car_handle, False)
+        else:
+            self.script_handle = sim.addScript(sim.scripttype_customizationscript)
+            sim.setScriptStringParam(self.script_handle, sim.scriptstringparam_text, code)
+            sim.associateScriptWithObject(self.script_handle, simulator.car_handle)
+
+    def uninstall(self, simulator: "Simulator") -> None:
+        """
+        Removes the helper script from the scene
+
+        Parameters
+        ----------
+        simulator : Simulator
+            The simulator whose scene has the script
+        """
+        if self.script_handle is None:
+            return
+        sim = simulator.sim
+        if hasattr(sim, "removeScript"):
+            sim.removeScript(self.script_handle)
+        else:
+            sim.removeObjects([self.script_handle])
+        self.script_handle = None
+
+    def start(self) -> None:
+        """
+        Starts the background thread receiving the samples
+        """
+        if self.thread is not None:
+            return
+        self.context = zmq.Context()
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.receive_forever, daemon=True)
+        self.thread.start()
+
+    def receive_forever(self) -> None:
+        """
+        Loop of the background thread
+        """
+        socket = self.context.socket(zmq.SUB)
+        socket.setsockopt(zmq.LINGER, 0)
+        # Only the latest sample matters
+        socket.setsockopt(zmq.CONFLATE, 1)
+        socket.setsockopt(zmq.SUBSCRIBE, b"")
+        # Wake up regularly to check whether the subscriber was stopped
+        socket.setsockopt(zmq.RCVTIMEO, 100)
+        socket.connect(f"tcp://{self.host}:{self.port}")
+        while not self.stopped.is_set():
+            try:
+                message = socket.recv()
+            except zmq.Again:
+                continue
+            if len(message) != self.SAMPLE.size:
+                continue
+            values = self.SAMPLE.unpack(message)
+            self.latest = CarState(
+                values[0],
+                values[1],
+                values[2],
+                values[3],
+                values[4:7],
+                values[7:10],
+                time.monotonic(),
+            )
+            self.n_received += 1
+            self.first_sample.set()
+        socket.close()
+
+    def wait_first_sample(self, timeout: float) -> bool:
+        """
+        Waits until a sample is received
+
+        Parameters
+        ----------
+        timeout : float
+            Maximum number of seconds to wait
+
+        Returns
+        -------
+        bool
+            Whether a sample was received
+        """
+        return self.first_sample.wait(timeout)
+
+    def fresh_state(self, max_age: float) -> Optional[CarState]:
+        """
+        The latest sample if it isn't older than max_age
+
+        Parameters
+        ----------
+        max_age : float
+            Maximum age of the sample in seconds
+
+        Returns
+        -------
+        CarState or None
+            The sample, None if there is none or it is too old
+        """
+        state = self.latest
+        if state is None or time.monotonic() - state.received_at > max_age:
+            return None
+        return state
+
+    def stop(self) -> None:
+        """
+        Stops the background thread
+        """
+        if self.thread is None:
+            return
+        self.stopped.set()
+        self.thread.join()
+        self.thread = None
+        self.context.term()
+        self.context = None
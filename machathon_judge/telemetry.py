@@ -0,0 +1,318 @@
+"""
+Module containing the Telemetry class to export live metrics of the judge's control loop
+as a Prometheus text endpoint and/or a JSON-lines stream
+"""
+import json
+import math
+import time
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, TextIO
+
+from .data import Data
+
+
+class Telemetry:
+    """
+    Class to publish counters and gauges about the judge's control loop
+
+    The control loop only appends raw samples to a bounded queue, a background thread
+    aggregates them, writes the JSON lines and renders the Prometheus page,
+    so sampling never waits on I/O.
+
+    Parameters
+    ----------
+    http_port: int, optional
+        Port of the Prometheus text-format endpoint (served at /metrics), disabled by default
+    jsonl_path: str, optional
+        Path of a file where every sample is written as a JSON line, disabled by default
+    host: str, default="localhost"
+        Address the HTTP endpoint listens on
+    interval: float, default=1.0
+        Number of seconds between two aggregations
+    max_samples: int, default=100000
+        Maximum number of samples waiting for the background thread,
+        older samples are dropped when the background thread lags behind
+    """
+
+    def __init__(
+        self,
+        http_port: Optional[int] = None,
+        jsonl_path: Optional[str] = None,
+        host: str = "localhost",
+        interval: float = 1.0,
+        max_samples: int = 100000,
+    ):
+        self.http_port = http_port
+        self.jsonl_path = jsonl_path
+        self.host = host
+        self.interval = interval
+
+        self.samples = deque(maxlen=max_samples)
+        self.n_sampled = 0
+        self.n_consumed = 0
+
+        self.counters = {
+            "ticks_total": 0,
+            "checkpoints_total": 0,
+            "laps_total": 0,
+            "duplicate_frames_avoided_total": 0,
+            "dropped_samples_total": 0,
+            "rpc_calls_total": 0,
+            "rpc_timeouts_total": 0,
+            "rpc_retries_total": 0,
+        }
+        self.gauges = {
+            "loop_rate_hz": 0.0,
+            # NaN while the car's state is unknown, see tick
+            "velocity_mps": math.nan,
+            "steering_rad": math.nan,
+            "commanded_velocity_mps": 0.0,
+            "commanded_steering_rad": 0.0,
+            "next_checkpoint": 0.0,
+            "last_lap_seconds": 0.0,
+        }
+        self.page = b""
+        self.lock = threading.Lock()
+        # Live counters of the simulator's remote API client, read by the aggregator
+        self.rpc_stats: Optional[Dict[str, int]] = None
+
+        self.thread = None
+        self.server = None
+        self.jsonl_file: Optional[TextIO] = None
+        self.stop_event = threading.Event()
+        # Whether the aggregations are spaced out, see pause
+        self.paused = False
+
+    def start(self) -> None:
+        """
+        Starts the background aggregation thread and the HTTP endpoint
+        """
+        if self.thread is not None:
+            return
+
+        if self.jsonl_path is not None:
+            self.jsonl_file = open(self.jsonl_path, "a", encoding="utf-8")
+
+        if self.http_port is not None:
+            telemetry = self
+
+            class MetricsHandler(BaseHTTPRequestHandler):
+                """
+                Serves the latest rendered metrics page
+                """
+
+                def do_GET(self):  # pylint: disable=invalid-name
+                    """
+                    Handles a GET request on /metrics
+                    """
+                    if self.path.split("?")[0] != "/metrics":
+                        self.send_error(404)
+                        return
+                    with telemetry.lock:
+                        page = telemetry.page
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(page)))
+                    self.end_headers()
+                    self.wfile.write(page)
+
+                def log_message(self, *args):  # pylint: disable=arguments-differ
+                    pass
+
+            self.server = ThreadingHTTPServer((self.host, self.http_port), MetricsHandler)
+            self.server.daemon_threads = True
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run_aggregator, daemon=True)
+        self.thread.start()
+
+    def tick(self, simulator, next_ckpt_id: int) -> None:
+        """
+        Records one iteration of the control loop.
+        Only reads the values cached by the simulator, so it doesn't add any RPC: the state
+        pushed by the scene when it is subscribed, otherwise the one read by the last call of
+        get_state if it is recent enough. The measured velocity and steering are unknown
+        otherwise, they are exported as NaN and null in the JSON lines.
+
+        Parameters
+        ----------
+        simulator : Simulator
+            The simulator the competitor's code is controlling
+        next_ckpt_id : int
+            Id of the next checkpoint the car has to cross
+        """
+        # The kinematic simulator has no remote API client, so no RPC counters
+        client = getattr(simulator, "client", None)
+        self.rpc_stats = None if client is None else client.stats
+        self.n_sampled += 1
+        self.samples.append(
+            (
+                "tick",
+                time.time(),
+                simulator.known_state(),
+                simulator.steer_angle,
+                simulator.motor_velocity * simulator.wheel_radius,
+                next_ckpt_id,
+            )
+        )
+
+    def event(self, name: str, value: float = 0.0) -> None:
+        """
+        Records an event of the run
+
+        Parameters
+        ----------
+        name : str
+            "checkpoint" when a checkpoint is crossed, "lap" when a lap is completed
+            or "duplicates_avoided" when the judge waited for a simulation step
+        value : float
+            The checkpoint id, the lap time in seconds or the number of hook calls avoided
+        """
+        self.n_sampled += 1
+        self.samples.append((name, time.time(), value))
+
+    def run_aggregator(self) -> None:
+        """
+        Loop of the background thread
+        """
+        last_time = time.monotonic()
+        while not self.stop_event.wait(
+            max(self.interval, Data.LOW_JITTER_TELEMETRY_INTERVAL) if self.paused else self.interval
+        ):
+            now = time.monotonic()
+            self.aggregate(now - last_time)
+            last_time = now
+        self.aggregate(time.monotonic() - last_time)
+
+    def pause(self) -> None:
+        """
+        Spaces the aggregations out to every Data.LOW_JITTER_TELEMETRY_INTERVAL seconds
+        until resume is called, so that the background thread wakes up less often during
+        low-jitter laps. The samples keep being recorded.
+        """
+        self.paused = True
+
+    def resume(self) -> None:
+        """
+        Aggregates again every interval seconds, from the next aggregation on
+        """
+        self.paused = False
+
+    def aggregate(self, elapsed: float) -> None:
+        """
+        Consumes the pending samples, updates the metrics and writes the JSON lines
+
+        Parameters
+        ----------
+        elapsed : float
+            Seconds since the previous aggregation
+        """
+        lines = []
+        n_consumed = 0
+        n_ticks = 0
+        while True:
+            try:
+                sample = self.samples.popleft()
+            except IndexError:
+                break
+            n_consumed += 1
+
+            if sample[0] == "tick":
+                _, timestamp, state, steering_cmd, velocity_cmd, next_ckpt_id = sample
+                n_ticks += 1
+                if state is not None:
+                    self.gauges["steering_rad"] = float(state[0])
+                    self.gauges["velocity_mps"] = float(state[1])
+                else:
+                    self.gauges["steering_rad"] = self.gauges["velocity_mps"] = math.nan
+                self.gauges["commanded_steering_rad"] = float(steering_cmd)
+                self.gauges["commanded_velocity_mps"] = float(velocity_cmd)
+                self.gauges["next_checkpoint"] = float(next_ckpt_id)
+                record = {
+                    "type": "tick",
+                    "time": timestamp,
+                    "steering": None if state is None else self.gauges["steering_rad"],
+                    "velocity": None if state is None else self.gauges["velocity_mps"],
+                    "commanded_steering": self.gauges["commanded_steering_rad"],
+                    "commanded_velocity": self.gauges["commanded_velocity_mps"],
+                    "next_checkpoint": next_ckpt_id,
+                }
+            else:
+                name, timestamp, value = sample
+                if name == "checkpoint":
+                    self.counters["checkpoints_total"] += 1
+                elif name == "lap":
+                    self.counters["laps_total"] += 1
+                    self.gauges["last_lap_seconds"] = float(value)
+                elif name == "duplicates_avoided":
+                    self.counters["duplicate_frames_avoided_total"] += int(value)
+                record = {"type": name, "time": timestamp, "value": value}
+
+            if self.jsonl_file is not None:
+                lines.append(json.dumps(record))
+
+        self.counters["ticks_total"] += n_ticks
+        # Samples pushed out of the bounded queue before being consumed
+        self.n_consumed += n_consumed
+        self.counters["dropped_samples_total"] = (
+            self.n_sampled - self.n_consumed - len(self.samples)
+        )
+        if elapsed > 0:
+            self.gauges["loop_rate_hz"] = n_ticks / elapsed
+        if self.rpc_stats is not None:
+            for name in ("calls", "timeouts", "retries"):
+                self.counters[f"rpc_{name}_total"] = self.rpc_stats[name]
+
+        if lines:
+            self.jsonl_file.write("\n".join(lines) + "\n")
+            self.jsonl_file.flush()
+
+        page = self.render_prometheus()
+        with self.lock:
+            self.page = page
+
+    def render_prometheus(self) -> bytes:
+        """
+        Renders the current metrics in the Prometheus text exposition format
+
+        Returns
+        -------
+        bytes
+            The metrics page
+        """
+        lines = []
+        for name, value in self.counters.items():
+            lines.append(f"# TYPE machathon_{name} counter")
+            lines.append(f"machathon_{name} {value}")
+        for name, value in self.gauges.items():
+            lines.append(f"# TYPE machathon_{name} gauge")
+            # Python writes "nan", the exposition format expects "NaN"
+            lines.append(f"machathon_{name} {'NaN' if math.isnan(value) else value}")
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Returns the latest aggregated counters and gauges
+        """
+        return {**self.counters, **self.gauges}
+
+    def stop(self) -> None:
+        """
+        Flushes the pending samples and stops the background thread and the HTTP endpoint
+        """
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self.jsonl_file is not None:
+            self.jsonl_file.close()
+            self.jsonl_file = None
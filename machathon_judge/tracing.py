@@ -0,0 +1,234 @@
+"""
+Module containing the Tracer class to record spans of the judge's loop
+and export them in the Chrome trace-event format
+
+The exported file opens in chrome://tracing or https://ui.perfetto.dev, where the remote API
+waits and the checkpoint events show up next to the competitor's code on a timeline:
+
+    tracer = Tracer()
+    judge = Judge(..., tracer=tracer)
+    judge.run()
+    tracer.save("run.trace.json")
+"""
+import os
+import json
+import time
+import functools
+import threading
+import contextlib
+from collections import deque
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+from .data import Data
+
+
+class Tracer:
+    """
+    Bounded in-memory ring of spans and instant events
+
+    Recording is a tuple appended to a deque, which is safe from any thread,
+    and the oldest events are dropped once the ring is full.
+
+    Parameters
+    ----------
+    capacity: int, default=Data.TRACE_CAPACITY
+        Maximum number of events kept
+    """
+
+    def __init__(self, capacity: int = Data.TRACE_CAPACITY):
+        # (phase, name, category, start ns, end ns, thread id, args)
+        self.events = deque(maxlen=capacity)
+        self.n_recorded = 0
+        self.origin = time.perf_counter_ns()
+        self.thread_names: Dict[int, str] = {}
+
+    @staticmethod
+    def now() -> int:
+        """
+        The clock of the spans, in nanoseconds
+        """
+        return time.perf_counter_ns()
+
+    def complete(
+        self,
+        name: str,
+        category: str,
+        start: int,
+        end: Optional[int] = None,
+        args: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        Records a span that already ended
+
+        Parameters
+        ----------
+        name : str
+            Name of the span
+        category : str
+            Category of the span, e.g. "judge", "simulator" or "rpc"
+        start : int
+            Tracer.now() at the start of the span
+        end : int, optional
+            Tracer.now() at the end of the span, default is now
+        args : dict, optional
+            Details shown with the span
+        """
+        end = time.perf_counter_ns() if end is None else end
+        self.n_recorded += 1
+        self.events.append(("X", name, category, start, end, threading.get_ident(), args))
+
+    def instant(self, name: str, category: str, args: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Records an event without duration, e.g. the arrival of a checkpoint event
+
+        Parameters
+        ----------
+        name : str
+            Name of the event
+        category : str
+            Category of the event
+        args : dict, optional
+            Details shown with the event
+        """
+        now = time.perf_counter_ns()
+        self.n_recorded += 1
+        self.events.append(("i", name, category, now, now, threading.get_ident(), args))
+
+    @contextlib.contextmanager
+    def span(
+        self, name: str, category: str, args: Optional[Dict[str, Any]] = None
+    ) -> Iterator[None]:
+        """
+        Records the span of a with block
+        """
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.complete(name, category, start, args=args)
+
+    def instrument(
+        self, obj: Any, category: str, names: Optional[Sequence[str]] = None
+    ) -> None:
+        """
+        Records a span for every call of the methods of an object, until uninstrument is called.
+        Only this object is affected, the methods are wrapped on the instance.
+
+        Parameters
+        ----------
+        obj : object
+            The object, e.g. a Simulator
+        category : str
+            Category of the spans
+        names : sequence, optional
+            Names of the methods, default is all the public methods of the object's class
+        """
+        cls = type(obj)
+        if names is None:
+            names = [
+                name
+                for name in dir(cls)
+                if not name.startswith("_") and callable(getattr(cls, name))
+            ]
+        for name in names:
+            # Wrap the class' method, so that instrumenting twice doesn't nest the spans
+            method = getattr(cls, name).__get__(obj, cls)
+            setattr(obj, name, self.traced(method, f"{cls.__name__}.{name}", category))
+
+    @staticmethod
+    def uninstrument(obj: Any) -> None:
+        """
+        Stops recording the calls of the methods of an object wrapped by instrument
+        """
+        for name, value in list(vars(obj).items()):
+            if getattr(value, "__wrapped__", None) is not None and callable(value):
+                delattr(obj, name)
+
+    def traced(self, function, name: str, category: str):
+        """
+        Wraps a function to record a span for every call
+        """
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.complete(name, category, start)
+
+        return wrapper
+
+    def name_thread(self, name: Optional[str] = None) -> None:
+        """
+        Names the calling thread in the exported trace, default is its Python name
+        """
+        self.thread_names[threading.get_ident()] = name or threading.current_thread().name
+
+    @property
+    def n_dropped(self) -> int:
+        """
+        Number of events dropped because the ring was full
+        """
+        return self.n_recorded - len(self.events)
+
+    def to_chrome(self) -> Dict[str, Any]:
+        """
+        The recorded events in the Chrome trace-event format
+
+        Returns
+        -------
+        dict
+            {"traceEvents": [...]} with the timestamps in microseconds since the tracer was created
+        """
+        pid = os.getpid()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        names.update(self.thread_names)
+        trace_events = [
+            {"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "machathon_judge"}}
+        ]
+        trace_events.extend(
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in names.items()
+        )
+        for phase, name, category, start, end, tid, args in list(self.events):
+            event = {
+                "name": name,
+                "cat": category,
+                "ph": phase,
+                "ts": (start - self.origin) / 1000,
+                "pid": pid,
+                "tid": tid,
+            }
+            if phase == "X":
+                event["dur"] = (end - start) / 1000
+            else:
+                # Drawn across the thread's track
+                event["s"] = "t"
+            if args:
+                event["args"] = args
+            trace_events.append(event)
+        return {
+            "traceEvents": trace_events,
+            "displayTimeUnit": "ms",
+            "otherData": {"dropped_events": self.n_dropped},
+        }
+
+    def save(self, file_path: str) -> None:
+        """
+        Writes the recorded events to a Chrome trace-event JSON file
+
+        Parameters
+        ----------
+        file_path : str
+            Path of the file, e.g. "run.trace.json"
+        """
+        with open(file_path, "w", encoding="utf-8") as file:
+            json.dump(self.to_chrome(), file)
+
+    def clear(self) -> None:
+        """
+        Forgets the recorded events
+        """
+        self.events.clear()
+        self.n_recorded = 0
@@ -0,0 +1,224 @@
+"""
+Module containing the TrajectoryBuffer class to log the car's state every tick
+in preallocated NumPy arrays
+"""
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from numpy.lib import format as npy_format
+
+
+class TrajectoryBuffer:
+    """
+    Fixed-size ring of the latest ticks stored in chunked NumPy structured arrays
+
+    The chunks are allocated on demand up to the capacity and then reused,
+    so the memory stays flat however long the run is. Appending is O(1) and the
+    windowed queries binary search the timestamps instead of scanning every tick.
+
+    Parameters
+    ----------
+    capacity: int, default=65536
+        Maximum number of ticks kept, rounded up to a multiple of chunk_size.
+        The default keeps more than 15 minutes of ticks at 60 FPS in less than 3 MB.
+    chunk_size: int, default=4096
+        Number of ticks per allocated chunk
+    """
+
+    DTYPE = np.dtype(
+        [
+            ("timestamp", np.float64),  # time.monotonic() of the tick
+            ("steering", np.float64),  # from get_state
+            ("velocity", np.float64),  # from get_state
+            ("steering_command", np.float64),
+            ("velocity_command", np.float64),
+            ("checkpoint", np.int32),  # id of the next checkpoint to cross
+        ]
+    )
+
+    def __init__(self, capacity: int = 65536, chunk_size: int = 4096):
+        self.chunk_size = chunk_size
+        self.capacity = -(-capacity // chunk_size) * chunk_size
+        self.chunks: List[np.ndarray] = []
+        self.n_appended = 0
+
+    def __len__(self) -> int:
+        return min(self.n_appended, self.capacity)
+
+    def append(
+        self,
+        timestamp: float,
+        steering: float = np.nan,
+        velocity: float = np.nan,
+        steering_command: float = np.nan,
+        velocity_command: float = np.nan,
+        checkpoint: int = -1,
+    ) -> None:
+        """
+        Records a tick, overwriting the oldest one once the buffer is full
+
+        Parameters
+        ----------
+        timestamp : float
+            time.monotonic() of the tick
+        steering : float, optional
+            Current steering angle of the car in radians
+        velocity : float, optional
+            Current linear velocity of the car in m/s
+        steering_command : float, optional
+            Steering angle sent to the car in radians
+        velocity_command : float, optional
+            Velocity sent to the car in m/s
+        checkpoint : int, optional
+            Id of the next checkpoint to cross
+        """
+        chunk_id, row = divmod(self.n_appended % self.capacity, self.chunk_size)
+        if chunk_id == len(self.chunks):
+            self.chunks.append(np.empty(self.chunk_size, dtype=self.DTYPE))
+        self.chunks[chunk_id][row] = (
+            timestamp,
+            steering,
+            velocity,
+            steering_command,
+            velocity_command,
+            checkpoint,
+        )
+        self.n_appended += 1
+
+    def segments(self) -> List[np.ndarray]:
+        """
+        Views on the stored ticks, from the oldest to the newest, without copying them
+
+        Returns
+        -------
+        list
+            Contiguous structured arrays, their concatenation is the whole history
+        """
+        remaining = len(self)
+        position = (self.n_appended - remaining) % self.capacity
+        segments = []
+        while remaining:
+            chunk_id, row = divmod(position, self.chunk_size)
+            n_rows = min(self.chunk_size - row, remaining)
+            segments.append(self.chunks[chunk_id][row : row + n_rows])
+            remaining -= n_rows
+            position = (position + n_rows) % self.capacity
+        return segments
+
+    def to_array(self) -> np.ndarray:
+        """
+        Copies the stored ticks into a single array, from the oldest to the newest
+
+        Returns
+        -------
+        np.ndarray
+            Structured array with the columns of TrajectoryBuffer.DTYPE
+        """
+        segments = self.segments()
+        if not segments:
+            return np.empty(0, dtype=self.DTYPE)
+        return np.concatenate(segments)
+
+    def window(self, seconds: float, now: Optional[float] = None) -> List[np.ndarray]:
+        """
+        Views on the ticks of the last seconds, without copying them
+
+        Parameters
+        ----------
+        seconds : float
+            Length of the window
+        now : float, optional
+            End of the window, default is time.monotonic()
+
+        Returns
+        -------
+        list
+            Contiguous structured arrays, from the oldest to the newest tick of the window
+        """
+        start = (time.monotonic() if now is None else now) - seconds
+        window = []
+        # The timestamps are sorted, so only the oldest segment of the window
+        # has to be searched
+        for segment in reversed(self.segments()):
+            first = np.searchsorted(segment["timestamp"], start, side="left")
+            window.append(segment[first:])
+            if first > 0:
+                break
+        window.reverse()
+        return window
+
+    def rate(self, seconds: float = 5, now: Optional[float] = None) -> float:
+        """
+        Number of ticks per second over the last seconds, e.g. the FPS of the hook
+
+        Parameters
+        ----------
+        seconds : float, default=5
+            Length of the window
+        now : float, optional
+            End of the window, default is time.monotonic()
+
+        Returns
+        -------
+        float
+            The tick rate in Hz
+        """
+        return sum(len(segment) for segment in self.window(seconds, now)) / seconds
+
+    def stats(
+        self, column: str, seconds: Optional[float] = None, now: Optional[float] = None
+    ) -> Dict[str, float]:
+        """
+        Statistics of a column over the last seconds, ignoring the missing (NaN) values
+
+        Parameters
+        ----------
+        column : str
+            One of the columns of TrajectoryBuffer.DTYPE
+        seconds : float, optional
+            Length of the window, default is the whole history
+        now : float, optional
+            End of the window, default is time.monotonic()
+
+        Returns
+        -------
+        dict
+            count, mean, std, min and max of the column
+        """
+        segments = self.segments() if seconds is None else self.window(seconds, now)
+        values = [segment[column] for segment in segments if len(segment)]
+        values = np.concatenate(values) if values else np.empty(0)
+        values = values[~np.isnan(values)] if values.dtype.kind == "f" else values
+        if len(values) == 0:
+            return {"count": 0, "mean": np.nan, "std": np.nan, "min": np.nan, "max": np.nan}
+        return {
+            "count": len(values),
+            "mean": float(values.mean()),
+            "std": float(values.std()),
+            "min": float(values.min()),
+            "max": float(values.max()),
+        }
+
+    def save(self, file_path: str) -> None:
+        """
+        Writes the stored ticks to a .npy file readable with np.load.
+        The chunks are written directly to the file, without being concatenated first.
+
+        Parameters
+        ----------
+        file_path : str
+            Path of the .npy file
+        """
+        segments = self.segments()
+        with open(file_path, "wb") as file:
+            npy_format.write_array_header_1_0(
+                file,
+                {
+                    "descr": npy_format.dtype_to_descr(self.DTYPE),
+                    "fortran_order": False,
+                    "shape": (len(self),),
+                },
+            )
+            for segment in segments:
+                file.write(memoryview(segment).cast("B"))
@@ -0,0 +1,114 @@
+"""
+Module containing small helper functions shared by the judge's modules
+"""
+import os
+import time
+import hashlib
+from typing import Callable, Optional
+
+
+def hash_file(file_path: str, chunk_size: int = 1 << 20) -> Optional[str]:
+    """
+    Computes the SHA-256 digest of a file by streaming it in chunks
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the file to hash
+    chunk_size : int, default=1MB
+        Number of bytes read from the file at a time
+
+    Returns
+    -------
+    str or None
+        The hex digest of the file's content, None if the file doesn't exist
+    """
+    if not os.path.isfile(file_path):
+        return None
+
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def pid_alive(pid: int) -> bool:
+    """
+    Checks whether a process is running
+
+    Parameters
+    ----------
+    pid : int
+        Id of the process
+
+    Returns
+    -------
+    bool
+        False if no process has this id, True otherwise, including when the process
+        belongs to another user
+    """
+    if os.name == "nt":
+        # os.kill would terminate the process on Windows
+        import ctypes  # pylint: disable=import-outside-toplevel
+
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            # Access denied means the process exists
+            return ctypes.GetLastError() == 5
+        exit_code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        kernel32.CloseHandle(handle)
+        return exit_code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def wait_until(
+    predicate: Callable[[], bool],
+    timeout: float,
+    description: str,
+    initial_delay: float = 0.005,
+    max_delay: float = 0.2,
+) -> float:
+    """
+    Polls a condition with an exponential backoff until it holds
+
+    Parameters
+    ----------
+    predicate : Callable
+        Function returning True once the condition holds
+    timeout : float
+        Maximum number of seconds to wait
+    description : str
+        What is being waited for, used in the error message
+    initial_delay : float, default=0.005
+        Seconds to wait after the first failed check, doubled after each check
+    max_delay : float, default=0.2
+        Maximum number of seconds between two checks
+
+    Returns
+    -------
+    float
+        The number of seconds it took for the condition to hold
+
+    Raises
+    ------
+    TimeoutError
+        The condition didn't hold before the timeout
+    """
+    tic = time.monotonic()
+    delay = initial_delay
+    while not predicate():
+        elapsed = time.monotonic() - tic
+        if elapsed > timeout:
+            raise TimeoutError(f"Timed out after {timeout}s waiting for {description}")
+        time.sleep(min(delay, max(timeout - elapsed, 0)))
+        delay = min(delay * 2, max_delay)
+    return time.monotonic() - tic
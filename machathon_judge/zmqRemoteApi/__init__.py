@@ -4,7 +4,7 @@ import os
 
 import uuid
 
-from time import sleep
+from time import monotonic, sleep
 
 import cbor
 
@@ -12,6 +12,8 @@ import zmq
 
 import math
 
+from . import cbor_view
+
 
 def b64(b):
     import base64
@@ -19,18 +21,44 @@ def b64(b):
     return base64.b64encode(b).decode("ascii")
 
 
+class RemoteAPITimeoutError(TimeoutError):
+    """Raised when the server didn't reply to a call in time, after all the retries."""
+
+
 class RemoteAPIClient:
     """Client to connect to CoppeliaSim's ZMQ Remote API."""
 
-    def __init__(self, host="localhost", port=23000, cntport=None, *, verbose=None):
-        """Create client and connect to the ZMQ Remote API server."""
+    def __init__(
+        self,
+        host="localhost",
+        port=23000,
+        cntport=None,
+        *,
+        verbose=None,
+        timeout=None,
+        retries=0,
+    ):
+        """Create client and connect to the ZMQ Remote API server.
+
+        timeout is the number of seconds to wait for each reply, None waits
+        forever. When it expires the socket is recreated, since a REQ socket
+        can't send again before receiving, and the call is sent again up to
+        retries times before raising RemoteAPITimeoutError.
+        """
         self.verbose = (
             int(os.environ.get("VERBOSE", "0")) if verbose is None else verbose
         )
+        self.timeout = timeout
+        self.retries = retries
+        self.stats = {"calls": 0, "timeouts": 0, "retries": 0, "reconnects": 0}
+        # Tracer recording a span for every call and its encode/wait/decode phases
+        self.tracer = None
+        self.address = f"tcp://{host}:{port}"
         self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.REQ)
+        self.socket = None
+        self._connect()
         self.cntsocket = self.context.socket(zmq.SUB)
-        self.socket.connect(f"tcp://{host}:{port}")
+        self.cntsocket.setsockopt(zmq.LINGER, 0)
         self.cntsocket.setsockopt(zmq.SUBSCRIBE, b"")
         self.cntsocket.setsockopt(zmq.CONFLATE, 1)
         self.cntsocket.connect(f"tcp://{host}:{cntport if cntport else port+1}")
@@ -43,19 +71,61 @@ class RemoteAPIClient:
         self.cntsocket.close()
         self.context.term()
 
+    def _connect(self):
+        # Pending requests are dropped on close, so a hung server can't block term()
+        self.socket = self.context.socket(zmq.REQ)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.connect(self.address)
+        self.rcvtimeo = -1
+
+    def _reconnect(self):
+        # A late reply to the abandoned request is discarded along with the old socket
+        self.socket.close()
+        self._connect()
+        self.stats["reconnects"] += 1
+
     def _send(self, req):
         if self.verbose > 0:
             print("Sending:", req)
+        tracer = self.tracer
+        if tracer is not None:
+            start = tracer.now()
         rawReq = cbor.dumps(req)
+        if tracer is not None:
+            tracer.complete("encode", "rpc", start)
         if self.verbose > 1:
             print(f"Sending raw len={len(rawReq)}, base64={b64(rawReq)}")
         self.socket.send(rawReq)
 
-    def _recv(self):
-        rawResp = self.socket.recv()
+    def _recv(self, timeout=None, view=False):
+        # Returns None if no reply arrived within timeout seconds
+        rcvtimeo = -1 if timeout is None else max(int(timeout * 1000), 0)
+        if rcvtimeo != self.rcvtimeo:
+            # Only changed for the calls overriding the timeout, a poll per call is much slower
+            self.socket.setsockopt(zmq.RCVTIMEO, rcvtimeo)
+            self.rcvtimeo = rcvtimeo
+        tracer = self.tracer
+        if tracer is not None:
+            start = tracer.now()
+        try:
+            # Receive without copying the frame; with view, large replies (e.g. images)
+            # are decoded in place, their byte strings are views into the frame
+            frame = self.socket.recv(copy=False)
+        except zmq.Again:
+            return None
+        finally:
+            if tracer is not None:
+                received = tracer.now()
+                tracer.complete("wait", "rpc", start, received)
+        rawResp = frame.buffer
         if self.verbose > 1:
             print(f"Received raw len={len(rawResp)}, base64={b64(rawResp)}")
-        resp = cbor.loads(rawResp)
+        if view and len(rawResp) >= cbor_view.MIN_VIEW_SIZE:
+            resp = cbor_view.loads(rawResp)
+        else:
+            resp = cbor.loads(frame.bytes)
+        if tracer is not None:
+            tracer.complete("decode", "rpc", received, args={"bytes": len(rawResp)})
         if self.verbose > 0:
             print("Received:", resp)
         return resp
@@ -69,10 +139,47 @@ class RemoteAPIClient:
         if len(ret) > 1:
             return tuple(ret)
 
-    def call(self, func, args):
-        """Call function with specified arguments."""
-        self._send({"func": func, "args": args})
-        return self._process_response(self._recv())
+    def call(self, func, args, *, timeout=None, retries=None, deadline=None, view=False):
+        """Call function with specified arguments.
+
+        timeout and retries override the client's for this call. deadline is
+        a time.monotonic() value after which no attempt is made anymore, the
+        last attempt only waits until then. With view, the byte strings of a
+        large reply are returned as memoryviews into the received frame instead
+        of bytes, which saves copying e.g. images.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+        req = {"func": func, "args": args}
+        self.stats["calls"] += 1
+        if self.tracer is not None:
+            start = self.tracer.now()
+            try:
+                return self._call(req, timeout, retries, deadline, view)
+            finally:
+                self.tracer.complete(func, "rpc", start)
+        return self._call(req, timeout, retries, deadline, view)
+
+    def _call(self, req, timeout, retries, deadline, view=False):
+        attempt = 0
+        while True:
+            wait = timeout
+            if deadline is not None:
+                remaining = deadline - monotonic()
+                wait = remaining if wait is None else min(wait, remaining)
+            self._send(req)
+            resp = self._recv(wait, view)
+            if resp is not None:
+                return self._process_response(resp)
+
+            self.stats["timeouts"] += 1
+            self._reconnect()
+            attempt += 1
+            if attempt > retries or (deadline is not None and monotonic() >= deadline):
+                raise RemoteAPITimeoutError(
+                    f"{req['func']} got no reply from {self.address} after {attempt} attempt(s)"
+                )
+            self.stats["retries"] += 1
 
     def getObject(self, name, _info=None):
         """Retrieve remote object from server."""
@@ -114,11 +221,26 @@ class RemoteAPIClient:
 
     def getStepCount(self, wait):
         if self.threadLocLevel > 0:
+            if wait and self.timeout is not None and not self.cntsocket.poll(self.timeout * 1000):
+                self.stats["timeouts"] += 1
+                raise RemoteAPITimeoutError(f"No simulation step within {self.timeout}s")
             try:
                 self.cntsocket.recv(0 if wait else zmq.NOBLOCK)
             except zmq.ZMQError:
                 pass
 
+    def waitForStep(self, timeout=None):
+        """Wait for a simulation step published on the step-count socket.
+
+        Only the latest step is kept by the socket, so this returns immediately
+        if a step happened since the previous call. Returns the step count, or
+        None if no step happened within timeout seconds.
+        """
+        if timeout is not None and not self.cntsocket.poll(max(timeout, 0) * 1000):
+            return None
+        msg = self.cntsocket.recv()
+        return int.from_bytes(msg[:4], "little")
+
     def _setThreadAutomaticSwitch(self, level):
         newLevel = self.threadLocLevel
         if isinstance(level, bool):
@@ -479,4 +601,4 @@ if __name__ == "__console__":
     sim = client.getObject("sim")
 
 
-__all__ = ["RemoteAPIClient"]
+__all__ = ["RemoteAPIClient", "RemoteAPITimeoutError"]
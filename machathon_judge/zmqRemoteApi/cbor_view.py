@@ -0,0 +1,115 @@
+"""CBOR decoder returning large byte strings as views into the received buffer."""
+
+import struct
+
+# Byte strings at least this long are returned as memoryview slices instead of bytes
+MIN_VIEW_SIZE = 4096
+
+_BREAK = object()
+
+
+class _Decoder:
+    def __init__(self, buffer, min_view_size):
+        self.view = memoryview(buffer).cast("B")
+        self.pos = 0
+        self.min_view_size = min_view_size
+
+    def _read(self, n):
+        start = self.pos
+        self.pos += n
+        if self.pos > len(self.view):
+            raise ValueError("truncated CBOR data")
+        return self.view[start : self.pos]
+
+    def _argument(self, info):
+        if info < 24:
+            return info
+        if info == 24:
+            return self._read(1)[0]
+        if info == 25:
+            return struct.unpack(">H", self._read(2))[0]
+        if info == 26:
+            return struct.unpack(">I", self._read(4))[0]
+        if info == 27:
+            return struct.unpack(">Q", self._read(8))[0]
+        if info == 31:
+            return None  # indefinite length
+        raise ValueError(f"invalid CBOR additional info {info}")
+
+    def _string(self, major, length):
+        if length is None:
+            chunks = []
+            while True:
+                chunk = self.decode()
+                if chunk is _BREAK:
+                    break
+                chunks.append(bytes(chunk) if major == 2 else chunk)
+            return b"".join(chunks) if major == 2 else "".join(chunks)
+        data = self._read(length)
+        if major == 3:
+            return str(data, "utf-8")
+        if length >= self.min_view_size:
+            return data
+        return data.tobytes()
+
+    def decode(self):
+        initial = self._read(1)[0]
+        major, info = initial >> 5, initial & 0x1F
+
+        if major == 7:
+            if info == 20:
+                return False
+            if info == 21:
+                return True
+            if info in (22, 23):
+                return None
+            if info == 25:
+                return struct.unpack(">e", self._read(2))[0]
+            if info == 26:
+                return struct.unpack(">f", self._read(4))[0]
+            if info == 27:
+                return struct.unpack(">d", self._read(8))[0]
+            if info == 31:
+                return _BREAK
+            return self._argument(info)  # other simple values
+
+        value = self._argument(info)
+        if major == 0:
+            return value
+        if major == 1:
+            return -1 - value
+        if major in (2, 3):
+            return self._string(major, value)
+        if major == 4:
+            if value is None:
+                items = []
+                while True:
+                    item = self.decode()
+                    if item is _BREAK:
+                        return items
+                    items.append(item)
+            return [self.decode() for _ in range(value)]
+        if major == 5:
+            result = {}
+            if value is None:
+                while True:
+                    key = self.decode()
+                    if key is _BREAK:
+                        return result
+                    result[key] = self.decode()
+            for _ in range(value):
+                key = self.decode()
+                result[key] = self.decode()
+            return result
+        # major == 6: semantic tag, the tagged item is returned as is
+        return self.decode()
+
+
+def loads(buffer, min_view_size=MIN_VIEW_SIZE):
+    """Decode a CBOR message without copying its large byte strings.
+
+    Byte strings of at least min_view_size bytes are returned as read-only
+    memoryview slices of buffer, which keep the buffer alive. They can be
+    wrapped by np.frombuffer or converted with bytes() when a copy is needed.
+    """
+    return _Decoder(buffer, min_view_size).decode()
@@ -8,25 +8,21 @@ import cv2
 import keyboard
 
 from machathon_judge import Simulator, Judge
+from machathon_judge.preprocessing import ImagePipeline
+from machathon_judge.trajectory import TrajectoryBuffer
 
 
 class FPSCounter:
     def __init__(self):
-        self.frames = []
+        # Keeps a bounded history of the frames, so the memory stays flat during long runs
+        self.frames = TrajectoryBuffer()
 
     def step(self):
         self.frames.append(time.monotonic())
 
     def get_fps(self):
         n_seconds = 5
-
-        count = 0
-        cur_time = time.monotonic()
-        for f in self.frames:
-            if cur_time - f < n_seconds:  # Count frames in the past n_seconds
-                count += 1
-
-        return count / n_seconds
+        return self.frames.rate(n_seconds)  # Count frames in the past n_seconds
 
 
 def run_car(simulator: Simulator) -> None:
@@ -45,9 +41,8 @@ def run_car(simulator: Simulator) -> None:
     """
     fps_counter.step()
 
-    # Get the image and show it
-    img = simulator.get_image()
-    img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+    # Get the image in OpenCV's channel order and show it
+    img = simulator.get_image(bgr_pipeline)
     fps = fps_counter.get_fps()
 
     # draw fps on image
@@ -85,6 +80,9 @@ if __name__ == "__main__":
     # Initialize any variables needed
     cv2.namedWindow("image", cv2.WINDOW_NORMAL)
     fps_counter = FPSCounter()
+    # Un-flips the image and converts it to BGR in a single pass,
+    # crop and resize can be added the same way
+    bgr_pipeline = ImagePipeline("bgr")
 
     # You should modify the value of the parameters to the judge constructor
     # according to your team's info